@@ -4,13 +4,15 @@
 
 from typing import List, Sequence, Union
 
-import requests
+from src import tracing
+from src.resilience import UpstreamError, get_provider, send
+from src.settings import SILICONFLOW_API_BASE_URL, SILICONFLOW_TIMEOUT_SECONDS
 
-SILICONFLOW_API_BASE_URL = "https://api.siliconflow.cn/v1"
 EMBEDDING_URL = f"{SILICONFLOW_API_BASE_URL}/embeddings"
 DEFAULT_EMBEDDING_MODEL = "BAAI/bge-large-zh-v1.5"
 # DEFAULT_EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-8B"
 MAX_EMBED_INPUT_CHARS = 512
+_SILICONFLOW = get_provider("siliconflow")
 
 
 def _normalize_inputs(texts: Union[str, Sequence[str]]) -> List[str]:
@@ -39,20 +41,17 @@ def get_embeddings_from_siliconflow(
     inputs: Union[str, Sequence[str]],
     api_token: str,
     model: str = DEFAULT_EMBEDDING_MODEL,
-    timeout: Union[int, float] = 10,
+    timeout: Union[int, float] = SILICONFLOW_TIMEOUT_SECONDS,
 ) -> dict:
     """
     调用硅基流动嵌入API，返回 embedding 结果
     - 输入文本将被截断至最多 512 字（MAX_EMBED_INPUT_CHARS）
+    - 参数错误抛出 ValueError/TypeError；请求失败（超时、HTTP 错误、熔断）抛出 UpstreamError
     """
     if not api_token:
         raise ValueError("必须提供有效的 API token")
 
-    try:
-        normalized_inputs = _normalize_inputs(inputs)
-    except (TypeError, ValueError) as error:
-        print(f"参数错误: {error}")
-        return {}
+    normalized_inputs = _normalize_inputs(inputs)
 
     # 限制每段文本最多 512 字，超过则截断
     truncated_inputs = [text[:MAX_EMBED_INPUT_CHARS] for text in normalized_inputs]
@@ -67,22 +66,24 @@ def get_embeddings_from_siliconflow(
         "input": truncated_inputs,
     }
 
-    try:
-        response = requests.post(
+    def _post() -> dict:
+        response = send(
+            "siliconflow",
+            "POST",
             EMBEDDING_URL,
+            message="embedding 请求失败",
             json=payload,
             headers=headers,
             timeout=timeout,
         )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as error:
-        print(f"请求失败，状态码 {response.status_code}: {response.text}")
-        print(f"错误详情: {error}")
-    except requests.exceptions.RequestException as error:
-        print(f"网络请求错误: {error}")
-
-    return {}
+        try:
+            return response.json()
+        except ValueError as error:
+            raise UpstreamError(f"siliconflow 返回了无法解析的响应: {response.text[:200]}") from error
+
+    # 每次尝试另有 http.siliconflow 子 span（见 resilience.send）
+    with tracing.span("embedding", model=model, texts=len(truncated_inputs)):
+        return _SILICONFLOW.call(_post)
 
 
 if __name__ == "__main__":
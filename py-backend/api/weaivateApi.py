@@ -1,7 +1,8 @@
 import os
 import sys
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 from uuid import UUID
 
 API_DIR = Path(__file__).resolve().parent
@@ -9,14 +10,24 @@ SRC_DIR = API_DIR.parent / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.append(str(SRC_DIR))
 
+from src import metrics, tracing
+from src.resilience import UpstreamError
 from src.weaviate.weaviateEngine import WeaviateEngine
 from src.settings import (
     DEFAULT_COLLECTION_NAME,
+    VECTOR_BACKEND,
     SILICONFLOW_API_TOKEN as DEFAULT_SILICONFLOW_API_TOKEN,
     WEAVIATE_API_KEY as DEFAULT_WEAVIATE_API_KEY,
 )
 
 
+# 复用的引擎：WeaviateEngine 每次新建都要建立 HTTP / gRPC 连接并检查集合是否存在，
+# 按（后端, 集合, 凭据）缓存后只有首次使用（或启动预热）承担这部分开销。
+# 传入 client_params 的调用（自定义连接）不缓存，用完即关闭。
+_ENGINES: Dict[Tuple[str, str, str, str], Any] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
 def _init_engine(
     collection_name: Optional[str] = None,
     *,
@@ -25,7 +36,8 @@ def _init_engine(
     weaviate_api_key: Optional[str] = None,
 ) -> Optional[WeaviateEngine]:
     """
-    创建 WeaviateEngine 实例，便于上层接口直接使用。
+    返回 WeaviateEngine 实例，便于上层接口直接使用；用完调用 release_engine 而不是 close。
+    VECTOR_BACKEND=memory 时返回进程内的 MemoryEngine（接口与检索结果结构一致）。
     """
     target_collection = collection_name or DEFAULT_COLLECTION_NAME
     token = siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN
@@ -38,8 +50,20 @@ def _init_engine(
         print("错误：未设置 SiliconFlow API Token。")
         return None
 
+    engine_cls = WeaviateEngine
+    if VECTOR_BACKEND == "memory":
+        # 延迟导入：memoryEngine 依赖 src.storage，而 src.storage 会导入本模块
+        from src.weaviate.memoryEngine import MemoryEngine
+        engine_cls = MemoryEngine
+
+    key = (engine_cls.__name__, target_collection, token, api_key or "")
+    if client_params is None:
+        with _ENGINES_LOCK:
+            cached = _ENGINES.get(key)
+        if cached is not None:
+            return cached
     try:
-        return WeaviateEngine(
+        engine = engine_cls(
             collection_name=target_collection,
             siliconflow_api_token=token,
             client_params=client_params,
@@ -48,6 +72,42 @@ def _init_engine(
     except Exception as exc:  # pragma: no cover
         print(f"WeaviateEngine 初始化失败：{exc}")
         return None
+    if client_params is not None:
+        return engine
+    with _ENGINES_LOCK:
+        cached = _ENGINES.setdefault(key, engine)
+    if cached is not engine:
+        # 并发的首次调用各自建了连接，只保留先放入缓存的那个
+        engine.close()
+    return cached
+
+
+def _is_cached(engine: Any) -> bool:
+    with _ENGINES_LOCK:
+        return any(cached is engine for cached in _ENGINES.values())
+
+
+def release_engine(engine: Optional[WeaviateEngine]) -> None:
+    """归还 _init_engine 返回的引擎：缓存中的引擎保持连接，其余的关闭。"""
+    if engine is None or _is_cached(engine):
+        return
+    try:
+        engine.close()
+    except Exception:  # pragma: no cover
+        pass
+
+
+def evict_engines(collection_name: Optional[str] = None) -> int:
+    """关闭并移除缓存的引擎（指定集合或全部），返回数量；集合被删除后与应用退出时调用。"""
+    with _ENGINES_LOCK:
+        keys = [k for k in _ENGINES if collection_name is None or k[1] == collection_name]
+        engines = [_ENGINES.pop(k) for k in keys]
+    for engine in engines:
+        try:
+            engine.close()
+        except Exception:  # pragma: no cover
+            pass
+    return len(engines)
 
 
 def weaviate_index_documents(
@@ -88,7 +148,7 @@ def weaviate_index_documents(
         print(f"Weaviate：写入文档失败，原因：{exc}")
         return 0
     finally:
-        engine.close()
+        release_engine(engine)
 
 
 def weaviate_delete_document(
@@ -119,7 +179,7 @@ def weaviate_delete_document(
         print(f"Weaviate：删除文档时发生异常，原因：{exc}")
         return False
     finally:
-        engine.close()
+        release_engine(engine)
 
 
 def weaviate_search(
@@ -139,9 +199,13 @@ def weaviate_search(
     bm25_properties: Optional[Sequence[str]] = None,
     bm25_search_operator: Optional[int] = None,
     vector: Optional[Sequence[float]] = None,
+    raise_errors: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     在 Weaviate 中搜索内容，支持三种检索方式：关键词（BM25）、混合（Hybrid，默认）、向量（Near Vector）。
+
+    默认检索失败时返回空列表；raise_errors=True 时以 UpstreamError 抛出，
+    调用方据此区分“检索成功但没有结果”与“向量化 / 向量库不可用”。
     """
     engine = _init_engine(
         collection_name,
@@ -150,6 +214,8 @@ def weaviate_search(
         weaviate_api_key=weaviate_api_key,
     )
     if not engine:
+        if raise_errors:
+            raise UpstreamError(f"{VECTOR_BACKEND} 检索引擎初始化失败")
         return []
 
     try:
@@ -157,25 +223,38 @@ def weaviate_search(
         if final_filters is None and filter_conditions:
             final_filters = engine.build_filter(filter_conditions)
 
-        results = engine.search(
-            query,
-            limit=limit,
-            filters=final_filters,
-            search_type=search_type,
-            alpha=alpha,
-            fusion_type=fusion_type,
-            max_vector_distance=max_vector_distance,
-            bm25_properties=bm25_properties,
-            bm25_search_operator=bm25_search_operator,
-            vector=vector,
-        )
+        # 先单独生成查询向量，向量库耗时指标只计检索本身
+        st = (search_type or "hybrid").lower()
+        if vector is None and st != "keyword" and query.strip():
+            with tracing.span("embed_query", chars=len(query)):
+                vector = engine._embed_texts([query])[0]
+        with metrics.time_external(VECTOR_BACKEND, f"search_{st}"), tracing.span(
+            "vector.search", backend=VECTOR_BACKEND, collection=engine.collection_name, search_type=st, limit=limit
+        ) as sp:
+            results = engine.search(
+                query,
+                limit=limit,
+                filters=final_filters,
+                search_type=search_type,
+                alpha=alpha,
+                fusion_type=fusion_type,
+                max_vector_distance=max_vector_distance,
+                bm25_properties=bm25_properties,
+                bm25_search_operator=bm25_search_operator,
+                vector=vector,
+            )
+            sp.set("results", len(results))
         print(f"Weaviate：{(search_type or 'hybrid').lower()} 检索完成，共返回 {len(results)} 条结果。")
         return results
     except Exception as exc:  # pragma: no cover
         print(f"Weaviate：检索失败，原因：{exc}")
-        return []
+        if not raise_errors:
+            return []
+        if isinstance(exc, UpstreamError):
+            raise
+        raise UpstreamError(f"{VECTOR_BACKEND} 检索失败: {exc}") from exc
     finally:
-        engine.close()
+        release_engine(engine)
 
 
 def weaviate_drop_collection(
@@ -199,16 +278,20 @@ def weaviate_drop_collection(
 
     try:
         result = engine.drop_collection()
+        # 缓存中该集合的引擎已确认过集合存在，删除后需重新创建
+        evict_engines(engine.collection_name)
         print(f"Weaviate：删除集合 {'成功' if result else '失败'}，collection={engine.collection_name}")
         return result
     except Exception as exc:  # pragma: no cover
         print(f"Weaviate：删除集合时发生异常，原因：{exc}")
         return False
     finally:
-        engine.close()
+        release_engine(engine)
 
 
 __all__ = [
+    "evict_engines",
+    "release_engine",
     "weaviate_index_documents",
     "weaviate_delete_document",
     "weaviate_search",
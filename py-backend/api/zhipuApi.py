@@ -10,6 +10,10 @@ from src.settings import (
     ZHIPU_RESULT_BASE,
     ZHIPU_API_TOKEN as DEFAULT_ZHIPU_API_TOKEN,
 )
+from src.resilience import get_provider, send
+
+# 上传与结果查询均带超时，可重试错误按重试预算重试，连续失败后熔断
+_ZHIPU = get_provider("zhipu")
 
 def _detect_file_type(file_path: Union[str, os.PathLike]) -> str:
     """
@@ -51,16 +55,20 @@ def zhipu_create_task(
     filename = os.path.basename(str(file_path))
     file_type = _detect_file_type(file_path)
 
-    with open(file_path, "rb") as fp:
-        files = {"file": (filename, fp)}
-        data = {
-            "tool_type": tool_type,
-            "file_type": file_type,
-        }
-        headers = {
-            "Authorization": f"Bearer {token}",
-        }
-        resp = requests.post(ZHIPU_UPLOAD_URL, headers=headers, files=files, data=data)
+    def _upload() -> requests.Response:
+        # 每次重试重新打开文件
+        with open(file_path, "rb") as fp:
+            files = {"file": (filename, fp)}
+            data = {
+                "tool_type": tool_type,
+                "file_type": file_type,
+            }
+            headers = {
+                "Authorization": f"Bearer {token}",
+            }
+            return send("zhipu", "POST", ZHIPU_UPLOAD_URL, message="上传失败", headers=headers, files=files, data=data)
+
+    resp = _ZHIPU.call(_upload)
 
     # 尝试解析 JSON，否则读取文本
     try:
@@ -68,9 +76,6 @@ def zhipu_create_task(
     except ValueError:
         data = {"message": resp.text}
 
-    if not resp.ok:
-        raise RuntimeError(f"上传失败({resp.status_code}): {data.get('message') or resp.reason}")
-
     task_id = data.get("task_id")
     if not task_id:
         raise RuntimeError(f"未返回任务ID: {json.dumps(data, ensure_ascii=False)}")
@@ -90,16 +95,17 @@ def zhipu_get_result(task_id: str, token: str) -> Dict[str, Any]:
 
     url = f"{ZHIPU_RESULT_BASE}/{task_id}/text"
     headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(url, headers=headers)
+
+    def _fetch() -> requests.Response:
+        return send("zhipu", "GET", url, message="结果获取失败", headers=headers)
+
+    resp = _ZHIPU.call(_fetch)
 
     try:
         data = resp.json()
     except ValueError:
         data = {"message": resp.text}
 
-    if not resp.ok:
-        raise RuntimeError(f"结果获取失败({resp.status_code}): {data.get('message') or resp.reason}")
-
     return data
 
 
@@ -6,29 +6,80 @@ BACKEND_DIR = Path(__file__).resolve().parent
 load_dotenv(BACKEND_DIR / ".env", override=False)
 load_dotenv(find_dotenv(), override=False)
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
-from src.settings import APP_HOST, APP_PORT
+from src.settings import APP_HOST, APP_PORT, METRICS_ENABLED, PROFILING_ENABLED, TRACING_ENABLED, WARMUP_ENABLED
 from router.weaviate import router as weaviate_router
 from router.rag import router as rag_router
 from router.compare import router as compare_router
-from src.storage import init_storage_and_db
+from router.system import router as system_router, metrics_router, health_router
+from src.storage import init_storage_and_db, close_pool
+from src.concurrency import configure_threadpool, shutdown_executors
+from src.agents.agents_factory import AgentFactory
+from src.resilience import close_sessions
+from src import warmup
+from api.weaivateApi import evict_engines
+from src.metrics import MetricsMiddleware
+from src.profiling import ProfilingMiddleware
+from src.tracing import TracingMiddleware, instrument_storage
+
+# 初始化SQLite数据库与线程池容量，并在后台预热依赖连接（必需项完成前 /health/ready 返回 503）；
+# 初始化SQLite数据库与线程池容量，并在后台预热依赖连接（完成前 /health/ready 返回 503）；
+# 退出时关闭线程池、向量库引擎、上游 HTTP 连接池、LLM 连接池与 SQLite 连接池
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    db_path = init_storage_and_db()
+    print(f"[startup] storage initialized; sqlite db: {db_path}")
+    configure_threadpool()
+    warmup_task = None
+    if WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(warmup.run_startup())
+    else:
+        warmup.mark_ready()
+    try:
+        yield
+    finally:
+        warmup.mark_stopping()
+        if warmup_task is not None:
+            warmup_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await warmup_task
+        shutdown_executors()
+        evict_engines()
+        close_sessions()
+        await AgentFactory.aclose()
+        close_pool()
+        print("[shutdown] sqlite connection pool closed")
 
 
 app = FastAPI(
     title="一致性检查",
     description="一致性检查后端 API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-# 初始化SQLite数据库
-@app.on_event("startup")
-async def _startup_init():
-    db_path = init_storage_and_db()
-    print(f"[startup] storage initialized; sqlite db: {db_path}")
-
 app.include_router(weaviate_router)
 app.include_router(rag_router)
 app.include_router(compare_router)
+app.include_router(system_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+
+# 按路由模板统计请求数与耗时，见 /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# 请求追踪：span 覆盖处理阶段、SQLite 语句、上游 HTTP、向量检索与 LLM 调用，见 /api/system/traces
+if TRACING_ENABLED:
+    instrument_storage()
+    app.add_middleware(TracingMiddleware)
+
+# 调试用的按请求剖析，需显式开启，见 src/profiling.py
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 
 if __name__ == "__main__":
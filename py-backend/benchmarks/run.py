@@ -0,0 +1,478 @@
+"""端到端吞吐与延迟基准：上传入库、检索、条款对比。
+
+通过 FastAPI 应用驱动三个接口并输出 JSON 报告，便于跨提交对比：
+  1) ingest  ：/api/rag/ingest-and-index，文档/分钟与单次请求延迟；
+  2) search  ：/api/rag/search，QPS 与 p50 / p95 / p99；
+  3) compare ：/api/compare/analyze，条款/分钟、单次请求延迟与分流统计。
+
+后端（--backend）：
+  mock（默认）：自动启动 mock_services 模拟服务，并使用进程内向量库（VECTOR_BACKEND=memory），完全离线；
+  real       ：使用当前环境 / .env 中配置的真实服务。
+应用默认在进程内运行（TestClient）；指定 --base-url 时改为请求已启动的服务（此时后端配置以该服务为准）。
+
+语料（--corpus）：
+  data（默认）：data/国家政策文件 与 data/地方政策文件 中的样例政策（.txt/.md/.docx/.pdf，内容相同的文件只传一次）；
+  synthetic  ：按 --seed 生成合成政策（国家 / 地方各 --national-docs / --local-docs 份，每份 --articles 条），用于放大规模；
+  both       ：两者都上传。
+--corpus-dir 指定目录时额外上传其中的文件（作为地方政策参与对比）。
+
+示例（在 py-backend 目录下）：
+    python -m benchmarks.run
+    python -m benchmarks.run --corpus synthetic --national-docs 2 --local-docs 4 --articles 40 --concurrency 4
+    python -m benchmarks.run --mock-llm-latency-ms 800 --output /tmp/after.json --baseline /tmp/before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+RESULTS_DIR = BACKEND_DIR / "benchmarks" / "results"
+NATIONAL_COLLECTION = "national_policy_documents"
+LOCAL_COLLECTION = "policy_documents"
+CORPUS_SUFFIXES = {".txt", ".md", ".docx", ".pdf"}
+DATA_DIR = BACKEND_DIR / "data"
+DATA_NATIONAL_DIR = DATA_DIR / "国家政策文件"
+DATA_LOCAL_DIR = DATA_DIR / "地方政策文件"
+
+
+# ---------- 统计 ----------
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    def ms(v: Optional[float]) -> Optional[float]:
+        return None if v is None else round(v * 1000, 2)
+
+    return {
+        "count": len(latencies),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies)) if latencies else None,
+    }
+
+
+def run_concurrently(tasks: List[Callable[[], Any]], concurrency: int) -> Tuple[List[Any], List[float], List[str], float]:
+    """并发执行任务，返回 (结果, 每个任务耗时, 错误, 总耗时)。"""
+    results: List[Any] = []
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def _one(task: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            result = task()
+        except Exception as exc:
+            with lock:
+                errors.append(str(exc)[:300])
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            results.append(result)
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(_one, tasks))
+    return results, latencies, errors, time.perf_counter() - started
+
+
+# ---------- 环境 ----------
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10
+        )
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=30
+        )
+        commit = out.stdout.strip() or None
+        return f"{commit}-dirty" if commit and dirty.stdout.strip() else commit
+    except Exception:
+        return None
+
+
+def start_mock(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    import requests
+
+    base = f"http://127.0.0.1:{args.mock_port}"
+    cmd = [
+        sys.executable, "-m", "mock_services.server",
+        "--port", str(args.mock_port),
+        "--seed", str(args.seed),
+        "--latency-ms", str(args.mock_latency_ms),
+        "--jitter-ms", str(args.mock_jitter_ms),
+        "--error-rate", str(args.mock_error_rate),
+    ]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"mock 服务启动失败: {proc.stderr.read().decode(errors='ignore')[-500:]}")
+        try:
+            requests.get(f"{base}/_mock/stats", timeout=1).raise_for_status()
+            break
+        except Exception:
+            time.sleep(0.2)
+    else:
+        proc.terminate()
+        raise RuntimeError("mock 服务启动超时")
+    if args.mock_llm_latency_ms is not None:
+        requests.post(f"{base}/_mock/config", json={"service": "llm", "latency_ms": args.mock_llm_latency_ms}, timeout=5)
+    return proc, base
+
+
+def configure_env(args: argparse.Namespace, mock_base: Optional[str]) -> None:
+    """在导入应用前设置环境变量（src.settings 在导入时读取）。"""
+    if mock_base:
+        os.environ.update({
+            "ZHIPU_UPLOAD_URL": f"{mock_base}/zhipu/files/parser/create",
+            "ZHIPU_RESULT_BASE": f"{mock_base}/zhipu/files/parser/result",
+            "SILICONFLOW_API_BASE_URL": f"{mock_base}/siliconflow/v1",
+            "LLM_BASE_URL": f"{mock_base}/llm/v1",
+            "VECTOR_BACKEND": "memory",
+            "SILICONFLOW_API_TOKEN": "mock",
+            "ZHIPU_API_TOKEN": "mock",
+            "LLM_API_KEY": "mock",
+        })
+    if not args.keep_cache:
+        os.environ["ANALYSIS_CACHE_ENABLED"] = "false"
+    os.environ["STORAGE_ROOT"] = args.storage_root or tempfile.mkdtemp(prefix="bench-storage-")
+
+
+def settings_snapshot() -> Dict[str, Any]:
+    from src import settings
+
+    keys = [
+        "VECTOR_BACKEND", "LLM_MODEL", "LLM_STREAM", "COMPARE_MAX_CONCURRENCY", "COMPARE_CONTEXT_TOKEN_BUDGET",
+        "COMPARE_BATCH_ENABLED", "COMPARE_TRIAGE_ENABLED", "COMPARE_MATCH_MAX_DISTANCE", "ANALYSIS_CACHE_ENABLED",
+        "BLOCKING_IO_MAX_WORKERS", "INGEST_MAX_WORKERS", "SQLITE_POOL_SIZE",
+    ]
+    return {k: getattr(settings, k) for k in keys if hasattr(settings, k)}
+
+
+class _InProcessClient:
+    """TestClient 包装：与 requests.Session 接口一致，可在多线程中并发调用。"""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import app as app_module
+
+        self._client = TestClient(app_module.app)
+        self._client.__enter__()
+
+    def post(self, url: str, **kwargs: Any):
+        kwargs.pop("timeout", None)
+        return self._client.post(url, **kwargs)
+
+    def close(self) -> None:
+        self._client.__exit__(None, None, None)
+
+
+class _RemoteClient:
+    def __init__(self, base_url: str):
+        import requests
+
+        self._session = requests.Session()
+        self._base = base_url.rstrip("/")
+
+    def post(self, url: str, **kwargs: Any):
+        kwargs.setdefault("timeout", 600)
+        return self._session.post(self._base + url, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def _ok_json(resp: Any) -> Dict[str, Any]:
+    if resp.status_code >= 400:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    return resp.json()
+
+
+# ---------- 语料 ----------
+def _read_dir(directory: Path, seen: set) -> List[Tuple[str, bytes]]:
+    """目录中的政策文件；内容相同的文件（如“- 副本”）只保留一份。"""
+    files: List[Tuple[str, bytes]] = []
+    if not directory.is_dir():
+        return files
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in CORPUS_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        files.append((path.name, data))
+    return files
+
+
+def build_corpus(args: argparse.Namespace) -> Tuple[List[Tuple[str, bytes]], List[Tuple[str, bytes]]]:
+    national: List[Tuple[str, bytes]] = []
+    local: List[Tuple[str, bytes]] = []
+    seen: set = set()
+    if args.corpus in ("data", "both"):
+        national += _read_dir(DATA_NATIONAL_DIR, seen)
+        local += _read_dir(DATA_LOCAL_DIR, seen)
+        if not national or not local:
+            raise SystemExit(f"[bench] {DATA_DIR} 中缺少国家或地方政策样例，改用 --corpus synthetic")
+    if args.corpus in ("synthetic", "both"):
+        from mock_services.corpus import synthetic_policy
+
+        national += [
+            (f"bench-national-{i}.txt", synthetic_policy(args.seed + i, args.articles, national=True).encode("utf-8"))
+            for i in range(args.national_docs)
+        ]
+        local += [
+            (f"bench-local-{i}.txt", synthetic_policy(args.seed + i % max(1, args.national_docs), args.articles).encode("utf-8"))
+            for i in range(args.local_docs)
+        ]
+    if args.corpus_dir:
+        local += _read_dir(Path(args.corpus_dir), seen)
+    return national, local
+
+
+# ---------- 阶段 ----------
+def bench_ingest(client: Any, national: List[Tuple[str, bytes]], local: List[Tuple[str, bytes]], concurrency: int) -> Dict[str, Any]:
+    def _task(name: str, data: bytes, collection: str) -> Callable[[], Dict[str, Any]]:
+        def _run() -> Dict[str, Any]:
+            body = _ok_json(client.post(
+                "/api/rag/ingest-and-index",
+                files={"file": (name, data)},
+                data={"collection_name": collection},
+            ))
+            return {"doc_id": body["doc_id"], "collection": collection, "chunks": body.get("chunk_count") or 0,
+                    "failed": (body.get("embedding_stats") or {}).get("failed", 0)}
+        return _run
+
+    tasks = [_task(n, d, NATIONAL_COLLECTION) for n, d in national] + [_task(n, d, LOCAL_COLLECTION) for n, d in local]
+    results, latencies, errors, wall = run_concurrently(tasks, concurrency)
+    chunks = sum(r["chunks"] for r in results)
+    return {
+        "docs": len(results),
+        "chunks": chunks,
+        "embedding_failed": sum(r["failed"] for r in results),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "docs_per_min": round(len(results) / wall * 60, 2) if wall else None,
+        "chunks_per_min": round(chunks / wall * 60, 2) if wall else None,
+        "latency": latency_summary(latencies),
+        "_docs": results,
+    }
+
+
+def bench_search(client: Any, queries: List[str], search_type: str, concurrency: int) -> Dict[str, Any]:
+    def _task(query: str) -> Callable[[], int]:
+        def _run() -> int:
+            body = _ok_json(client.post("/api/rag/search", json={
+                "query": query, "collection_name": NATIONAL_COLLECTION, "limit": 5, "search_type": search_type,
+            }))
+            return int(body.get("count") or 0)
+        return _run
+
+    results, latencies, errors, wall = run_concurrently([_task(q) for q in queries], concurrency)
+    return {
+        "search_type": search_type,
+        "requests": len(results),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "empty_results": sum(1 for r in results if r == 0),
+        "wall_seconds": round(wall, 3),
+        "qps": round(len(results) / wall, 2) if wall else None,
+        "latency": latency_summary(latencies),
+    }
+
+
+def bench_compare(client: Any, local_ids: List[str], national_ids: List[str], concurrency: int, extra: Dict[str, Any]) -> Dict[str, Any]:
+    def _task(doc_id: str) -> Callable[[], Dict[str, Any]]:
+        def _run() -> Dict[str, Any]:
+            return _ok_json(client.post("/api/compare/analyze", json={
+                "local_doc_id": doc_id, "national_doc_ids": national_ids, **extra,
+            }))
+        return _run
+
+    results, latencies, errors, wall = run_concurrently([_task(d) for d in local_ids], concurrency)
+    clauses = sum(len(r.get("clauses") or []) for r in results)
+    routes: Dict[str, int] = {}
+    diff_types: Dict[str, int] = {}
+    llm_calls = 0
+    for r in results:
+        for k, v in (r.get("routes") or {}).items():
+            routes[k] = routes.get(k, 0) + v
+        for c in r.get("clauses") or []:
+            diff_types[c.get("diff_type")] = diff_types.get(c.get("diff_type"), 0) + 1
+        for tier in (r.get("tiers") or {}).values():
+            llm_calls += tier.get("calls", 0)
+    return {
+        "requests": len(results),
+        "clauses": clauses,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "clauses_per_min": round(clauses / wall * 60, 2) if wall else None,
+        "llm_calls": llm_calls,
+        "routes": routes,
+        "diff_types": diff_types,
+        "latency": latency_summary(latencies),
+    }
+
+
+# ---------- 报告 ----------
+_HEADLINE = [
+    ("ingest", "docs_per_min", True),
+    ("ingest", "chunks_per_min", True),
+    ("search", "qps", True),
+    ("search", "latency.p50_ms", False),
+    ("search", "latency.p99_ms", False),
+    ("compare", "clauses_per_min", True),
+    ("compare", "latency.p50_ms", False),
+    ("compare", "llm_calls", False),
+]
+
+
+def _get(report: Dict[str, Any], section: str, dotted: str) -> Optional[float]:
+    value: Any = report.get(section) or {}
+    for part in dotted.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value if isinstance(value, (int, float)) else None
+
+
+def print_summary(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"\n== benchmark {report['meta']['commit']} ({report['meta']['backend']}) ==")
+    for section, key, higher_better in _HEADLINE:
+        value = _get(report, section, key)
+        line = f"{section + '.' + key:<28} {value if value is not None else '-':>12}"
+        if baseline is not None:
+            base = _get(baseline, section, key)
+            if base and value is not None:
+                change = (value - base) / base * 100
+                better = change >= 0 if higher_better else change <= 0
+                line += f"   baseline {base:>10}  {change:+7.1f}% {'better' if better else 'worse'}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="上传入库 / 检索 / 条款对比 端到端基准")
+    parser.add_argument("--backend", choices=["mock", "real"], default="mock")
+    parser.add_argument("--base-url", help="请求已启动的服务，而不是在进程内运行应用")
+    parser.add_argument("--corpus", choices=["data", "synthetic", "both"], default="data",
+                        help="data：data/ 中的样例政策；synthetic：合成政策；both：两者")
+    parser.add_argument("--national-docs", type=int, default=2, help="合成国家政策份数")
+    parser.add_argument("--local-docs", type=int, default=3, help="合成地方政策份数")
+    parser.add_argument("--articles", type=int, default=30, help="每份合成政策的条款数")
+    parser.add_argument("--corpus-dir", help="额外上传该目录中的政策文件（作为地方政策）")
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--search-type", default="hybrid", choices=["hybrid", "keyword", "vector", "local"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--compare-batch", action="store_true", help="对比请求开启批量分析")
+    parser.add_argument("--compare-triage", action="store_true", help="对比请求开启小模型初筛")
+    parser.add_argument("--keep-cache", action="store_true", help="保留分析结果缓存（默认关闭以测量冷启动）")
+    parser.add_argument("--skip", action="append", default=[], choices=["ingest", "search", "compare"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--storage-root", help="默认使用临时目录")
+    parser.add_argument("--mock-port", type=int, default=18900)
+    parser.add_argument("--mock-latency-ms", type=float, default=20.0)
+    parser.add_argument("--mock-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--mock-llm-latency-ms", type=float, default=None)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="报告路径，默认 benchmarks/results/<时间>-<提交>.json")
+    parser.add_argument("--baseline", help="与之前的报告对比并打印变化")
+    args = parser.parse_args(argv)
+
+    mock_proc = None
+    mock_base = None
+    if args.backend == "mock" and not args.base_url:
+        mock_proc, mock_base = start_mock(args)
+    configure_env(args, mock_base)
+
+    commit = git_commit()
+    client: Any = _RemoteClient(args.base_url) if args.base_url else _InProcessClient()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "target": args.base_url or "in-process",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in {"output", "baseline"}},
+            "settings": settings_snapshot() if not args.base_url else None,
+        }
+    }
+    try:
+        national, local = build_corpus(args)
+        docs: List[Dict[str, Any]] = []
+        if "ingest" not in args.skip:
+            print(f"[bench] ingest {len(national)} national + {len(local)} local docs ...")
+            report["ingest"] = bench_ingest(client, national, local, args.concurrency)
+            docs = report["ingest"].pop("_docs")
+
+        if "search" not in args.skip:
+            lines = [ln for _, data in national + local for ln in data.decode("utf-8", errors="ignore").splitlines() if "条" in ln[:8]]
+            queries = [lines[i % len(lines)][:64] for i in range(args.searches)] if lines else []
+            print(f"[bench] search x{len(queries)} ({args.search_type}) ...")
+            report["search"] = bench_search(client, queries, args.search_type, args.concurrency)
+
+        if "compare" not in args.skip:
+            national_ids = [d["doc_id"] for d in docs if d["collection"] == NATIONAL_COLLECTION]
+            local_ids = [d["doc_id"] for d in docs if d["collection"] == LOCAL_COLLECTION]
+            if national_ids and local_ids:
+                extra = {"batch": args.compare_batch, "triage": args.compare_triage}
+                print(f"[bench] compare {len(local_ids)} local docs against {len(national_ids)} national docs ...")
+                report["compare"] = bench_compare(client, local_ids, national_ids, args.concurrency, extra)
+            else:
+                print("[bench] compare skipped: ingest produced no documents")
+
+        if mock_base:
+            import requests
+
+            report["mock"] = requests.get(f"{mock_base}/_mock/stats", timeout=5).json()["stats"]
+    finally:
+        client.close()
+        if mock_proc is not None:
+            mock_proc.terminate()
+            mock_proc.wait(timeout=10)
+            mock_proc.stderr.close()
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    print_summary(report, baseline)
+    print(f"\n[bench] report written to {output}")
+    failed = any((report.get(s) or {}).get("errors") for s in ("ingest", "search", "compare"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""启动耗时基准：在全新的子进程中测量导入应用、启动（lifespan）与首个请求的耗时。
+
+每轮启动一个新解释器（冷的模块缓存由操作系统页缓存决定，不受本进程影响），依次记录：
+  import_ms         import app（路由与依赖模块）
+  lifespan_ms       应用启动钩子（SQLite 初始化、线程池配置等）
+  first_request_ms  首个请求（--probe-path）
+  total_ms          从启动子进程到首个请求返回（含解释器启动）
+  warmup_ms         --warmup 时 POST /api/system/warmup 的耗时（首个对比 / 检索请求原本要承担的导入开销）
+  ready_ms          --wait-ready 时启动完成后到 /health/ready 返回 200 的耗时（后台启动预热）
+另记录启动后已加载的重型模块（agently / weaviate / grpc），用于确认按需导入没有被意外破坏。
+--importtime 额外用 `python -X importtime` 打印累计耗时最高的模块。
+
+示例（在 py-backend 目录下）：
+    python -m benchmarks.startup --runs 5 --warmup
+    python -m benchmarks.startup --wait-ready --probe-path /health/live
+    python -m benchmarks.startup --output /tmp/after.json --baseline /tmp/before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.run import RESULTS_DIR, git_commit, percentile  # noqa: E402
+
+HEAVY_MODULES = ("agently", "weaviate", "grpc")
+METRICS = ("import_ms", "lifespan_ms", "first_request_ms", "total_ms", "warmup_ms", "ready_ms")
+
+_PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import app as app_mod
+imported = time.perf_counter()
+loaded = {{m: m in sys.modules for m in {heavy!r}}}
+from fastapi.testclient import TestClient
+client = TestClient(app_mod.app)
+t = time.perf_counter()
+client.__enter__()
+lifespan = time.perf_counter() - t
+t = time.perf_counter()
+status = client.get({probe!r}).status_code
+first = time.perf_counter() - t
+ready = None
+if {wait_ready!r}:
+    while client.get("/health/ready").status_code != 200:
+        if time.perf_counter() - t > 120:
+            raise SystemExit("/health/ready not ready after 120s")
+        time.sleep(0.01)
+    ready = time.perf_counter() - t
+result = {{
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": lifespan * 1000,
+    "first_request_ms": first * 1000,
+    "probe_status": status,
+    "loaded_at_startup": loaded,
+}}
+if ready is not None:
+    result["ready_ms"] = ready * 1000
+if {warmup!r}:
+    t = time.perf_counter()
+    result["warmup"] = client.post("/api/system/warmup").json().get("modules")
+    result["warmup_ms"] = (time.perf_counter() - t) * 1000
+client.__exit__(None, None, None)
+print("@@RESULT@@" + json.dumps(result))
+"""
+
+
+def run_once(args: argparse.Namespace, env: Dict[str, str]) -> Dict[str, Any]:
+    code = _PROBE.format(
+        backend=str(BACKEND_DIR), heavy=HEAVY_MODULES, probe=args.probe_path, warmup=args.warmup, wait_ready=args.wait_ready
+    )
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300)
+    total_ms = (time.perf_counter() - started) * 1000
+    line = next((ln for ln in proc.stdout.splitlines() if ln.startswith("@@RESULT@@")), None)
+    if proc.returncode != 0 or line is None:
+        raise RuntimeError(f"startup probe failed ({proc.returncode}): {proc.stderr[-2000:]}")
+    result = json.loads(line[len("@@RESULT@@"):])
+    # 子进程在首个请求后还要等待就绪、执行 warmup 与关闭，total 只计到首个请求返回
+    waited_ms = result["ready_ms"] - result["first_request_ms"] if "ready_ms" in result else 0.0
+    result["total_ms"] = total_ms - result.get("warmup_ms", 0.0) - waited_ms
+    return result
+
+
+def import_profile(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    """`python -X importtime -c "import app"` 中累计耗时最高的模块。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300
+    )
+    rows: List[Dict[str, Any]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            rows.append({"module": parts[2].strip(), "self_ms": int(parts[0]) / 1000, "cumulative_ms": int(parts[1]) / 1000})
+        except ValueError:
+            continue
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+    for key in METRICS:
+        values = [r[key] for r in runs if key in r]
+        if values:
+            summary[key] = {
+                "p50": round(percentile(values, 50), 1),
+                "min": round(min(values), 1),
+                "max": round(max(values), 1),
+            }
+    summary["loaded_at_startup"] = runs[0]["loaded_at_startup"] if runs else {}
+    return summary
+
+
+def print_summary(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"\n== startup {report['meta']['commit']} ({report['meta']['params']['runs']} runs, p50) ==")
+    for key in METRICS:
+        value = (report["summary"].get(key) or {}).get("p50")
+        if value is None:
+            continue
+        line = f"{key:<18} {value:>10.1f} ms"
+        base = ((baseline or {}).get("summary", {}).get(key) or {}).get("p50")
+        if base:
+            line += f"   baseline {base:>10.1f} ms  {(value - base) / base * 100:+7.1f}%"
+        print(line)
+    loaded = [m for m, ok in report["summary"]["loaded_at_startup"].items() if ok]
+    print(f"heavy modules loaded at startup: {', '.join(loaded) or 'none'}")
+    for row in report.get("import_profile") or []:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="应用启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--probe-path", default="/api/system/resilience", help="首个请求的路径")
+    parser.add_argument("--warmup", action="store_true", help="首个请求后再测 POST /api/system/warmup")
+    parser.add_argument("--wait-ready", action="store_true", help="首个请求后轮询 /health/ready 直到就绪")
+    parser.add_argument("--vector-backend", choices=["weaviate", "memory"], help="默认沿用环境变量 VECTOR_BACKEND")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="打印累计导入耗时最高的 N 个模块")
+    parser.add_argument("--output", help="报告路径，默认 benchmarks/results/startup-<时间>-<提交>.json")
+    parser.add_argument("--baseline", help="与之前的报告对比并打印变化")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env["STORAGE_ROOT"] = tempfile.mkdtemp(prefix="bench_startup_")
+    if args.vector_backend:
+        env["VECTOR_BACKEND"] = args.vector_backend
+
+    commit = git_commit()
+    runs = []
+    for i in range(max(1, args.runs)):
+        runs.append(run_once(args, env))
+        print(f"[startup] run {i + 1}: import {runs[-1]['import_ms']:.0f} ms, total {runs[-1]['total_ms']:.0f} ms")
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in {"output", "baseline"}},
+        },
+        "summary": summarize(runs),
+        "runs": runs,
+    }
+    if args.importtime:
+        report["import_profile"] = import_profile(env, args.importtime)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    print_summary(report, baseline)
+    print(f"\n[startup] report written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""本地模拟外部服务（智谱文档解析、硅基流动 embedding、OpenAI 兼容对话接口），用于离线压测与基准测试。
+
+启动：python -m mock_services.server --port 18900
+配置方式见 mock_services/server.py 模块说明。
+"""
@@ -0,0 +1,71 @@
+"""确定性的合成政策文本：第X章 / 第X条 结构，可被 build_segments_struct 按传统格式切分。
+
+同一 seed 总是生成相同文本；national=True 时生成“国家”版本，与同 seed 的地方版本大部分条款
+相近、少量条款改写或缺失，便于对比流程产生各种差异类型。
+"""
+
+from __future__ import annotations
+
+import random
+from typing import List
+
+_DIGITS = "零一二三四五六七八九"
+
+_SUBJECTS = ["电力市场成员", "售电公司", "电力交易机构", "电网企业", "发电企业", "电力用户", "市场管理委员会", "调度机构"]
+_ACTIONS = [
+    "应当按照规定向{org}提交{item}",
+    "应当在{days}个工作日内完成{item}的审核",
+    "不得擅自变更{item}，确需变更的应当报{org}备案",
+    "应当建立健全{item}管理制度，并定期向{org}报告",
+    "可以委托第三方机构开展{item}，相关费用由{subject}承担",
+    "应当按月披露{item}，披露内容包括交易价格、交易电量和结算结果",
+]
+_ITEMS = ["履约保函", "交易申报信息", "结算依据", "信用评价结果", "市场注册材料", "偏差考核数据", "信息披露报告", "风险防控预案"]
+_ORGS = ["省级能源主管部门", "国家能源局派出机构", "电力交易机构", "市场管理委员会"]
+_CHAPTERS = ["总则", "市场成员", "交易组织", "价格机制", "计量与结算", "信息披露", "信用管理", "监督管理", "附则"]
+
+
+def cn_number(n: int) -> str:
+    """1..999 转中文数字（第十二条、第一百零五条）。"""
+    if n < 10:
+        return _DIGITS[n]
+    if n < 20:
+        return "十" + (_DIGITS[n % 10] if n % 10 else "")
+    if n < 100:
+        return _DIGITS[n // 10] + "十" + (_DIGITS[n % 10] if n % 10 else "")
+    rest = n % 100
+    tail = "" if rest == 0 else ("零" + cn_number(rest) if rest < 10 else ("一" + cn_number(rest) if rest < 20 else cn_number(rest)))
+    return _DIGITS[n // 100] + "百" + tail
+
+
+def _sentence(rng: random.Random) -> str:
+    action = rng.choice(_ACTIONS).format(
+        org=rng.choice(_ORGS), item=rng.choice(_ITEMS), days=rng.choice([3, 5, 10, 15, 30]), subject=rng.choice(_SUBJECTS)
+    )
+    return f"{rng.choice(_SUBJECTS)}{action}。"
+
+
+def synthetic_policy(seed: int, articles: int = 40, *, national: bool = False, title: str = "") -> str:
+    rng = random.Random(seed)
+    variant = random.Random(seed * 7919 + 1)
+    chapters = max(1, min(len(_CHAPTERS), articles // 5))
+    per_chapter = max(1, articles // chapters)
+    lines: List[str] = [title or f"{'国家' if national else '某省'}电力市场运行规则（样例{seed}）", ""]
+    no = 0
+    printed = 0
+    for ch in range(chapters):
+        lines.append(f"第{cn_number(ch + 1)}章 {_CHAPTERS[ch]}")
+        count = per_chapter if ch < chapters - 1 else articles - no
+        for _ in range(count):
+            no += 1
+            body = "".join(_sentence(rng) for _ in range(rng.randint(1, 3)))
+            if national:
+                roll = variant.random()
+                if roll < 0.1:
+                    continue  # 国家文件无对应条款
+                if roll < 0.3:
+                    body = _sentence(variant) + body  # 改写 / 增加要求
+            printed += 1
+            lines.append(f"第{cn_number(printed)}条 {body}")
+        lines.append("")
+    return "\n".join(lines).strip() + "\n"
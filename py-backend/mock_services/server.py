@@ -0,0 +1,307 @@
+"""本地模拟服务：一个进程同时提供智谱解析、硅基流动 embedding 与 OpenAI 兼容对话接口。
+
+启动：
+    python -m mock_services.server --port 18900 --latency-ms 50 --error-rate 0.02 --seed 7
+
+后端指向模拟服务（.env 或环境变量）：
+    ZHIPU_UPLOAD_URL=http://127.0.0.1:18900/zhipu/files/parser/create
+    ZHIPU_RESULT_BASE=http://127.0.0.1:18900/zhipu/files/parser/result
+    SILICONFLOW_API_BASE_URL=http://127.0.0.1:18900/siliconflow/v1
+    LLM_BASE_URL=http://127.0.0.1:18900/llm/v1
+    VECTOR_BACKEND=memory            # 进程内向量库，替代 Weaviate
+    SILICONFLOW_API_TOKEN=mock ZHIPU_API_TOKEN=mock LLM_API_KEY=mock
+
+延迟与故障注入（每个服务独立配置，随机数由 seed 决定，可复现）：
+- latency_ms / jitter_ms：每次请求的基础延迟与均匀抖动；
+- error_rate / error_status：按比例返回错误状态码（默认 503）；
+- hang_rate / hang_seconds：按比例挂起请求，用于验证超时与对冲；
+- pending_polls（仅 zhipu）：结果查询前几次返回 processing。
+运行时可通过 POST /_mock/config 修改，GET /_mock/stats 查看各服务请求数与注入次数，POST /_mock/reset 清零。
+
+模拟行为：
+- 智谱：.txt/.md 原样返回；.docx 提取 word/document.xml 中的文本；其余格式按文件名生成确定性的合成政策文本。
+- embedding：字符二元组哈希到 256 维并归一化，文本越相近向量距离越小。
+- 对话：按提示词识别初筛 / 单条分析 / 批量分析，返回结构合法、由提示词哈希决定的 JSON，支持 stream。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from mock_services.corpus import synthetic_policy
+
+SERVICES = ("zhipu", "siliconflow", "llm")
+EMBEDDING_DIM = 256
+
+_DIFF_TYPES = ["无差异", "细化", "缺失", "冲突", "超越范围", "无法比较"]
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    hang_rate: float = 0.0
+    hang_seconds: float = 300.0
+    pending_polls: int = 0
+
+
+class MockState:
+    def __init__(self, defaults: FaultConfig, seed: int):
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.configs: Dict[str, FaultConfig] = {s: FaultConfig(**asdict(defaults)) for s in SERVICES}
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.rngs = {s: random.Random(f"{self.seed}:{s}") for s in SERVICES}
+            self.stats = {s: {"requests": 0, "errors": 0, "hangs": 0, "items": 0, "prompt_chars": 0} for s in SERVICES}
+            self.tasks: Dict[str, Dict[str, Any]] = {}
+
+    def plan(self, service: str) -> Dict[str, Any]:
+        """为一次请求抽取延迟与故障（在锁内按顺序抽取，保证同一 seed 下序列可复现）。"""
+        cfg = self.configs[service]
+        with self.lock:
+            rng = self.rngs[service]
+            self.stats[service]["requests"] += 1
+            delay = cfg.latency_ms + (rng.uniform(0, cfg.jitter_ms) if cfg.jitter_ms > 0 else 0.0)
+            roll = rng.random()
+            fault = None
+            if roll < cfg.hang_rate:
+                fault = "hang"
+                self.stats[service]["hangs"] += 1
+            elif roll < cfg.hang_rate + cfg.error_rate:
+                fault = "error"
+                self.stats[service]["errors"] += 1
+        return {"delay": delay / 1000.0, "fault": fault, "cfg": cfg}
+
+    def count(self, service: str, key: str, n: int) -> None:
+        with self.lock:
+            self.stats[service][key] += n
+
+
+async def _inject(state: MockState, service: str) -> None:
+    plan = state.plan(service)
+    if plan["delay"] > 0:
+        await asyncio.sleep(plan["delay"])
+    if plan["fault"] == "hang":
+        await asyncio.sleep(plan["cfg"].hang_seconds)
+    if plan["fault"] == "error":
+        raise HTTPException(status_code=plan["cfg"].error_status, detail=f"injected {service} error")
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    vec = [0.0] * dim
+    chars = [c for c in text if not c.isspace()]
+    grams = [a + b for a, b in zip(chars, chars[1:])] or chars or [""]
+    for gram in grams:
+        h = _digest(gram)
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _extract_text(filename: str, data: bytes) -> str:
+    lower = filename.lower()
+    if lower.endswith((".txt", ".md")):
+        return data.decode("utf-8", errors="ignore")
+    if lower.endswith(".docx"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                xml = zf.read("word/document.xml").decode("utf-8", errors="ignore")
+            paragraphs = re.findall(r"<w:p[ >].*?</w:p>", xml, flags=re.S)
+            return "\n".join("".join(re.findall(r"<w:t[^>]*>([^<]*)</w:t>", p)) for p in paragraphs)
+        except (zipfile.BadZipFile, KeyError):
+            pass
+    return synthetic_policy(_digest(filename) % 100_000, title=filename.rsplit(".", 1)[0])
+
+
+def _analysis(prompt: str, key: str) -> Dict[str, Any]:
+    h = _digest(key)
+    diff_type = _DIFF_TYPES[h % len(_DIFF_TYPES)]
+    refs = [{"候选编号": "1"}] if "[1]" in prompt and diff_type != "无法比较" else []
+    return {
+        "差异类型": diff_type,
+        "差异描述": f"模拟分析结果（{diff_type}）",
+        "差异关键词": "模拟关键词",
+        "相似国家条款": refs,
+    }
+
+
+def chat_content(prompt: str) -> str:
+    """根据提示词特征返回对应的结构化输出。"""
+    if "初筛" in prompt:
+        h = _digest(prompt)
+        passed = h % 3 == 0
+        return json.dumps(
+            {"判定": "无差异" if passed else "需复核", "置信度": 0.95 if passed else 0.5, "理由": "模拟初筛"},
+            ensure_ascii=False,
+        )
+    if "待对比条款列表" in prompt:
+        ids = list(dict.fromkeys(re.findall(r"L-\d{3,}", prompt)))
+        items = [dict(_analysis(prompt, cid + prompt[:64]), 条款编号=cid) for cid in ids]
+        return json.dumps({"分析结果": items}, ensure_ascii=False)
+    return json.dumps(_analysis(prompt, prompt), ensure_ascii=False)
+
+
+def create_app(state: MockState) -> FastAPI:
+    app = FastAPI(title="mock services")
+
+    # ---- 智谱文档解析 ----
+    @app.post("/zhipu/files/parser/create")
+    async def zhipu_create(file: UploadFile = File(...), tool_type: str = Form("lite"), file_type: str = Form("")):
+        await _inject(state, "zhipu")
+        data = await file.read()
+        task_id = uuid.uuid4().hex
+        with state.lock:
+            state.tasks[task_id] = {
+                "content": _extract_text(file.filename or "", data),
+                "polls_left": state.configs["zhipu"].pending_polls,
+            }
+        state.count("zhipu", "items", 1)
+        return {"task_id": task_id, "message": "成功", "success": True}
+
+    @app.get("/zhipu/files/parser/result/{task_id}/{fmt}")
+    async def zhipu_result(task_id: str, fmt: str):
+        await _inject(state, "zhipu")
+        with state.lock:
+            task = state.tasks.get(task_id)
+            if task is None:
+                raise HTTPException(status_code=404, detail="task not found")
+            if task["polls_left"] > 0:
+                task["polls_left"] -= 1
+                return {"status": "processing", "message": "处理中", "task_id": task_id}
+        return {"status": "succeeded", "message": "成功", "task_id": task_id, "content": task["content"]}
+
+    # ---- 硅基流动 embedding ----
+    @app.post("/siliconflow/v1/embeddings")
+    async def embeddings(request: Request):
+        await _inject(state, "siliconflow")
+        body = await request.json()
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        state.count("siliconflow", "items", len(inputs))
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": embed(t)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": sum(len(t) for t in inputs), "total_tokens": sum(len(t) for t in inputs)},
+        }
+
+    # ---- OpenAI 兼容对话 ----
+    @app.post("/llm/v1/chat/completions")
+    async def chat(request: Request):
+        await _inject(state, "llm")
+        body = await request.json()
+        prompt = json.dumps(body.get("messages"), ensure_ascii=False)
+        state.count("llm", "prompt_chars", len(prompt))
+        state.count("llm", "items", 1)
+        content = chat_content(prompt)
+        model = body.get("model") or "mock"
+        usage = {"prompt_tokens": len(prompt), "completion_tokens": len(content), "total_tokens": len(prompt) + len(content)}
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": uuid.uuid4().hex,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def _events():
+            cid = uuid.uuid4().hex
+            for i in range(0, len(content), 32):
+                chunk = {"id": cid, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": content[i:i + 32]}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            last = {"id": cid, "object": "chat.completion.chunk", "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            yield f"data: {json.dumps(last, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_events(), media_type="text/event-stream")
+
+    # ---- 控制接口 ----
+    @app.get("/_mock/stats")
+    def mock_stats():
+        with state.lock:
+            return {"seed": state.seed, "stats": json.loads(json.dumps(state.stats)),
+                    "config": {s: asdict(c) for s, c in state.configs.items()}}
+
+    @app.post("/_mock/config")
+    async def mock_config(request: Request):
+        """body: {"service": "llm" | "all", "latency_ms": 200, "error_rate": 0.1, ...}"""
+        body = await request.json()
+        target = body.pop("service", "all")
+        services = SERVICES if target == "all" else (target,)
+        allowed = {f.name for f in fields(FaultConfig)}
+        unknown = set(body) - allowed
+        if unknown or any(s not in SERVICES for s in services):
+            raise HTTPException(status_code=400, detail=f"unknown service or fields: {target}, {sorted(unknown)}")
+        with state.lock:
+            for s in services:
+                for key, value in body.items():
+                    setattr(state.configs[s], key, type(getattr(state.configs[s], key))(value))
+        return {s: asdict(state.configs[s]) for s in services}
+
+    @app.post("/_mock/reset")
+    def mock_reset():
+        state.reset()
+        return {"success": True}
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地模拟外部服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18900)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--pending-polls", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    defaults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        hang_rate=args.hang_rate,
+        pending_polls=args.pending_polls,
+    )
+    app = create_app(MockState(defaults, args.seed))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,75 @@
 from __future__ import annotations
+import asyncio
+import time
 from typing import Any, Dict, List, Optional
 import json
-from fastapi import APIRouter, HTTPException
+import sqlite3
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from tqdm import tqdm
 from api.weaivateApi import (
     weaviate_search
 )
 # 已移除的旧集成
-from src.agents.policy_agents import get_worklow_analysis_result
-from src.storage import connect, DocumentsRepo, ChunksRepo
+from src.agents.candidate_table import CandidateTable, format_candidates, resolve_candidates
+from src.agents.context_builder import build_clause_context, estimate_tokens, is_definition_chunk, plan_batches
+from src.agents.policy_agents import (
+    ANALYSIS_PROMPT_VERSION,
+    get_batch_analysis_result,
+    get_triage_result,
+    get_worklow_analysis_result,
+)
+from src.agents.retrieval_gate import (
+    ROUTE_CACHE,
+    ROUTE_IDENTICAL,
+    ROUTE_LLM,
+    ROUTE_NO_MATCH,
+    ROUTE_TRIAGE,
+    gate_candidates,
+    identical_analysis,
+    no_match_analysis,
+)
+from src.storage import AnalysisCacheRepo, DocumentsRepo, ChunksRepo, get_db, pooled_connection
 from src.storage.db import get_storage_root
+from src.concurrency import run_blocking
+from src import metrics, tracing
+from src.resilience import UpstreamError
+from src.stages import StageRecorder
+from src.settings import (
+    ANALYSIS_CACHE_ENABLED,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_TTL_SECONDS,
+    COMPARE_BATCH_ENABLED,
+    COMPARE_BATCH_MAX_CLAUSES,
+    COMPARE_BATCH_TOKEN_BUDGET,
+    COMPARE_CONTEXT_NEIGHBORS,
+    COMPARE_CONTEXT_TOKEN_BUDGET,
+    COMPARE_IDENTICAL_MAX_DISTANCE,
+    COMPARE_IDENTICAL_MIN_SIMILARITY,
+    COMPARE_MATCH_MAX_DISTANCE,
+    COMPARE_MATCH_MIN_SCORE,
+    COMPARE_MAX_CONCURRENCY,
+    COMPARE_SEARCH_TYPE,
+    COMPARE_TRIAGE_ENABLED,
+    COMPARE_TRIAGE_MIN_CONFIDENCE,
+    LLM_MODEL,
+    LLM_TRIAGE_MODEL,
+)
 from pathlib import Path
 
 import re
 
 NATIONAL_DEFAULT_COLLECTION_NAME = "national_policy_documents"
 
+if COMPARE_SEARCH_TYPE != "vector" and (COMPARE_MATCH_MAX_DISTANCE > 0 or COMPARE_IDENTICAL_MAX_DISTANCE > 0):
+    print(
+        f"[compare] COMPARE_SEARCH_TYPE={COMPARE_SEARCH_TYPE} 的检索结果没有向量距离，"
+        "距离门控与“无差异”判定不会生效"
+    )
+# 模型分级 -> process_logs 中的阶段名
+_TIER_STAGES = {"triage": "llm_triage", "analysis": "llm_analyze"}
+# 批量分析时每条条款结构化输出的预估 token 开销（差异描述、关键词等）
+_BATCH_OUTPUT_TOKENS_PER_CLAUSE = 200
+
 router = APIRouter(prefix="/api/compare", tags=["compare"])
 
 
@@ -25,6 +78,33 @@ class CompareRequest(BaseModel):
     national_doc_ids: List[str]
     limit: int = 2  # 每个条款最多返回的国家匹配条款数量
     collection_name: Optional[str] = None
+    refresh_cache: bool = False  # 为 True 时跳过缓存读取，重新调用模型并覆盖缓存
+    batch: Optional[bool] = None  # 多条款合并为一次模型请求；不传时取 COMPARE_BATCH_ENABLED
+    triage: Optional[bool] = None  # 小模型初筛后只把需复核的条款交给大模型；不传时取 COMPARE_TRIAGE_ENABLED
+
+
+# 分析结果缓存：各条款并发执行，每次读写从连接池单独取连接
+def _cache_get(cache_key: str) -> Optional[Dict[str, Any]]:
+    with pooled_connection() as conn:
+        return AnalysisCacheRepo(conn).get(cache_key, ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS)
+
+
+def _cache_put(cache_key: str, result: Dict[str, Any], local_doc_id: str) -> None:
+    with pooled_connection() as conn:
+        AnalysisCacheRepo(conn).put(
+            cache_key,
+            result,
+            prompt_version=ANALYSIS_PROMPT_VERSION,
+            model=LLM_MODEL,
+            local_doc_id=local_doc_id,
+        )
+
+
+def _cache_evict() -> int:
+    with pooled_connection() as conn:
+        return AnalysisCacheRepo(conn).evict(
+            ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS, max_entries=ANALYSIS_CACHE_MAX_ENTRIES
+        )
 
 
 def _read_local_content(doc_id: str, doc: Dict[str, Any]) -> str:
@@ -55,8 +135,125 @@ def _read_local_content(doc_id: str, doc: Dict[str, Any]) -> str:
         return ""
 
 
+def _parse_analysis(diff_raw: Any) -> Optional[Dict[str, Any]]:
+    """解析工作流返回（JSON 字符串 or dict）。"""
+    if isinstance(diff_raw, dict):
+        return diff_raw
+    if isinstance(diff_raw, str):
+        text_res = diff_raw.strip()
+        m = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text_res, flags=re.IGNORECASE)
+        if m:
+            text_res = m.group(1).strip()
+        try:
+            parsed = json.loads(text_res)
+        except Exception:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+    return None
+
+
+def _split_batch_result(raw: Any, clause_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """把批量结果按“条款编号”拆回各条款；缺失、重复或格式不对的条款不返回（由调用方逐条重试）。"""
+    parsed = _parse_analysis(raw)
+    items = parsed.get("分析结果") if parsed else None
+    if not isinstance(items, list):
+        return {}
+    wanted = set(clause_ids)
+    results: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        cid = str(item.get("条款编号") or "").strip()
+        if cid in wanted and cid not in results and item.get("差异类型"):
+            results[cid] = {k: v for k, v in item.items() if k != "条款编号"}
+    return results
+
+
+def _triage_analysis(raw: Any) -> Optional[Dict[str, Any]]:
+    """初筛结果为“无差异”且置信度达到阈值时返回对应的分析结果，否则返回 None（升级到大模型）。"""
+    parsed = _parse_analysis(raw)
+    if not parsed or str(parsed.get("判定") or "").strip() != "无差异":
+        return None
+    try:
+        confidence = float(parsed.get("置信度"))
+    except (TypeError, ValueError):
+        return None
+    if confidence < COMPARE_TRIAGE_MIN_CONFIDENCE:
+        return None
+    reason = str(parsed.get("理由") or "").strip()
+    return {
+        "差异类型": "无差异",
+        "差异描述": f"初筛模型判定内容实质一致（置信度 {confidence:.2f}）" + (f"：{reason}" if reason else "。"),
+        "差异关键词": "",
+        "相似国家条款": [],
+    }
+
+
+def _new_tier(model: str, **extra: Any) -> Dict[str, Any]:
+    return {"model": model, "calls": 0, "errors": 0, "latencies": [], **extra}
+
+
+def _tier_summary(tier: Dict[str, Any]) -> Dict[str, Any]:
+    """把各次调用耗时汇总为 total/avg/p50/max（毫秒）。"""
+    latencies = sorted(tier.pop("latencies"))
+    tier["latency_ms"] = {
+        "total": round(sum(latencies), 1),
+        "avg": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "p50": round(latencies[len(latencies) // 2], 1) if latencies else 0.0,
+        "max": round(latencies[-1], 1) if latencies else 0.0,
+    }
+    return tier
+
+
+def _clause_result(job: Dict[str, Any], parsed: Optional[Dict[str, Any]], nation_docs: Dict[str, str]) -> Dict[str, Any]:
+    diff_type = "无法比较"
+    diff_keywords = ""
+    analysis_text = ""
+    national_clauses: List[Dict[str, str]] = []
+
+    if parsed:
+        diff_type = parsed.get("差异类型") or diff_type
+        diff_keywords = parsed.get("差异关键词") or diff_keywords
+        analysis_text = parsed.get("差异描述") or analysis_text
+        sim_list = parsed.get("相似国家条款") or []
+        # 规范化为 { nation_name, clause }
+        for item in sim_list:
+            if isinstance(item, dict):
+                nation_name = item.get("国家政策文件") or ""
+                clause_text = item.get("国家政策条款") or ""
+                if nation_name or clause_text:
+                    national_clauses.append({
+                        "nation_name": nation_name,
+                        "clause": clause_text,
+                    })
+
+    # 若工作流未返回国家条款，使用 weaviate 检索结果兜底
+    if not national_clauses and job["filtered"]:
+        for r in job["filtered"]:
+            nid = str(r.get("metadata", {}).get("doc_id"))
+            national_clauses.append({
+                "nation_name": nation_docs.get(nid, nid),
+                "clause": r.get("text") or "",
+            })
+
+    return {
+        "id": job["clause_id"],
+        "local_clause_title": job["title"],
+        "local_clause": job["text"],
+        "diff_type": diff_type,
+        "diff_keywords": diff_keywords,
+        "analysis": analysis_text,
+        "national_clauses": national_clauses,
+        "route": job["route"],
+        "retrieval": job["retrieval"],
+        "cached": job["cached"],
+        "batched": job["batched"],
+        "context": job["context"],
+    }
+
+
 @router.post("/analyze")
-async def analyze(payload: CompareRequest):
+async def analyze(payload: CompareRequest, conn: sqlite3.Connection = Depends(get_db)):
     """
     针对每个地方条款（chunk），在 Weaviate 中检索相关国家条款，调用内部工作流进行差异分析
     """
@@ -65,123 +262,334 @@ async def analyze(payload: CompareRequest):
     if not payload.national_doc_ids:
         raise HTTPException(status_code=400, detail="national_doc_ids 为必填参数")
 
-    conn = connect()
     d_repo = DocumentsRepo(conn)
     ch_repo = ChunksRepo(conn)
 
-    local_doc = d_repo.get(payload.local_doc_id)
+    # SQLite / 文件读取 / Weaviate 检索均为同步调用，放到线程池执行，避免阻塞事件循环
+    local_doc = await run_blocking(d_repo.get, payload.local_doc_id)
     if not local_doc:
         raise HTTPException(status_code=404, detail="地方政策文档不存在")
 
     local_file_name = local_doc.get("source_filename") or payload.local_doc_id
-    local_file_content = _read_local_content(payload.local_doc_id, local_doc)
+    # 上下文预算 <=0 时沿用旧行为：每个条款都附带整篇原文
+    use_full_text = COMPARE_CONTEXT_TOKEN_BUDGET <= 0
+    local_file_content = ""
+    if use_full_text:
+        local_file_content = await run_blocking(_read_local_content, payload.local_doc_id, local_doc)
 
     # 列出地方条款（chunks）
-    chunks = ch_repo.list_by_doc(payload.local_doc_id) or []
+    chunks = await run_blocking(ch_repo.list_by_doc, payload.local_doc_id) or []
     if not chunks:
         raise HTTPException(status_code=422, detail="地方政策未找到条款分段")
 
-    clauses: List[Dict[str, Any]] = []
     collection_name = payload.collection_name or NATIONAL_DEFAULT_COLLECTION_NAME
+    national_doc_ids = {str(nid) for nid in payload.national_doc_ids}
+    use_batch = COMPARE_BATCH_ENABLED if payload.batch is None else payload.batch
+    use_triage = COMPARE_TRIAGE_ENABLED if payload.triage is None else payload.triage
+    # 每级模型的调用次数与耗时（毫秒，仅计模型调用本身，不含排队）
+    tiers = {
+        "triage": _new_tier(LLM_TRIAGE_MODEL, enabled=use_triage, passed=0, escalated=0),
+        "analysis": _new_tier(LLM_MODEL),
+    }
 
-    for ch in tqdm(chunks, desc="处理条款"):
+    # 国家政策文件名只需查询一次，供所有条款复用
+    def _load_nation_names() -> Dict[str, str]:
+        names: Dict[str, str] = {}
+        for nid in national_doc_ids:
+            doc_rec = d_repo.get(nid)
+            names[nid] = (doc_rec.get("source_filename") if doc_rec else nid)
+        return names
+
+    nation_docs = await run_blocking(_load_nation_names)
+
+    # 定义条款在全文中识别一次，供各条款上下文复用
+    definitions = [c for c in chunks if is_definition_chunk(c)]
+    full_text_tokens = estimate_tokens(local_file_content) if use_full_text else None
+
+    # 条款之间相互独立，检索与模型调用都按 COMPARE_MAX_CONCURRENCY 并发执行，结果保持原顺序
+    semaphore = asyncio.Semaphore(max(1, COMPARE_MAX_CONCURRENCY))
+    # 检索与模型调用耗时按条款写入 process_logs（doc_id 为地方政策文档）
+    recorder = StageRecorder(payload.local_doc_id)
+
+    async def _prepare(position: int, ch: Dict[str, Any]) -> Dict[str, Any]:
         local_clause_text = ch.get("content") or ""
         chunk_index = int(ch.get("chunk_index") or 0)
-        clause_id = f"L-{chunk_index:03d}"
-        clause_title = " ".join(ch.get("section_path",[])) + " " + ch.get("title",f"第{chunk_index}条")
+        job: Dict[str, Any] = {
+            "position": position,
+            "clause_id": f"L-{chunk_index:03d}",
+            "title": " ".join(ch.get("section_path",[])) + " " + ch.get("title",f"第{chunk_index}条"),
+            "text": local_clause_text,
+            "cached": False,
+            "batched": False,
+            "parsed": None,
+            "route": ROUTE_LLM,
+            "retrieval": None,
+            "context": {"tokens": 0, "budget": COMPARE_CONTEXT_TOKEN_BUDGET},
+        }
 
         # 1) 在 Weaviate 中检索相似国家条款
-        search_results = weaviate_search(
-            query=local_clause_text,
-            collection_name=collection_name,
-            limit=max(1, payload.limit),
-        ) or []
-        # 仅保留来自指定国家政策文档的条款
-        filtered = [
-            r for r in search_results
-            if str(r.get("metadata", {}).get("doc_id")) in set(payload.national_doc_ids)
-        ]
-        # 取前 N 条
-        filtered = filtered[: payload.limit]
+        async with semaphore:
+            with recorder.stage("retrieve", input_size=len(local_clause_text), clause_id=job["clause_id"]) as st:
+                search_results = await run_blocking(
+                    weaviate_search,
+                    query=local_clause_text,
+                    collection_name=collection_name,
+                    limit=max(1, payload.limit),
+                    # 门控依赖 _distance，混合检索不返回距离
+                    search_type=COMPARE_SEARCH_TYPE,
+                    # 检索失败必须向上抛出（整体 503），不能当作“没有可比较的国家条款”
+                    raise_errors=True,
+                ) or []
+                st.output_size = len(search_results)
+        # 仅保留来自指定国家政策文档且达到匹配阈值的条款，取前 N 条
+        decision = gate_candidates(
+            local_clause_text,
+            [r for r in search_results if str(r.get("metadata", {}).get("doc_id")) in national_doc_ids],
+            max_distance=COMPARE_MATCH_MAX_DISTANCE,
+            min_score=COMPARE_MATCH_MIN_SCORE,
+            identical_max_distance=COMPARE_IDENTICAL_MAX_DISTANCE,
+            identical_min_similarity=COMPARE_IDENTICAL_MIN_SIMILARITY,
+        )
+        job["filtered"] = decision.candidates[: payload.limit]
+        job["retrieval"] = decision.summary()
 
         # 提供给分析工作流的国家条款原文列表（包含国家文件名与条款）
-        nid_set = {str(r.get("metadata", {}).get("doc_id")) for r in filtered}
-        nation_docs: Dict[str, str] = {}
-        for nid in nid_set:
-            doc_rec = d_repo.get(nid)
-            nation_docs[nid] = (doc_rec.get("source_filename") if doc_rec else nid)
-
-        nations_segments = [
+        job["nations_segments"] = [
             {
                 "nation_name": nation_docs.get(str(r.get("metadata", {}).get("doc_id")), str(r.get("metadata", {}).get("doc_id"))),
                 "clause": r.get("text") or "",
             }
-            for r in filtered
+            for r in job["filtered"]
         ]
 
-        diff_raw = await get_worklow_analysis_result(
-            file_name=local_file_name,
-            file_content=local_file_content,
-            segment=local_clause_text,
-            nations_segments=str(nations_segments),
+        # 2) 无候选 / 近乎相同的条款直接给出确定性结果，不调用模型，也不写入缓存
+        if decision.route == ROUTE_NO_MATCH:
+            job["route"], job["parsed"] = ROUTE_NO_MATCH, no_match_analysis(decision)
+        elif decision.route == ROUTE_IDENTICAL:
+            job["route"] = ROUTE_IDENTICAL
+            best_doc_id = str(decision.candidates[0].get("metadata", {}).get("doc_id"))
+            job["parsed"] = identical_analysis(decision, nation_docs.get(best_doc_id, best_doc_id))
+        if job["route"] != ROUTE_LLM:
+            return job
+
+        # 3) 相同（提示词版本、模型、地方条款、候选国家条款）命中缓存时直接复用结构化结果，不再调用模型
+        job["cache_key"] = AnalysisCacheRepo.make_key(
+            ANALYSIS_PROMPT_VERSION, LLM_MODEL, local_clause_text, job["nations_segments"]
         )
+        if ANALYSIS_CACHE_ENABLED and not payload.refresh_cache:
+            job["parsed"] = _parse_analysis(await run_blocking(_cache_get, job["cache_key"]))
+            job["cached"] = job["parsed"] is not None
+            metrics.ANALYSIS_CACHE_LOOKUPS.inc(1, "hit" if job["cached"] else "miss")
+        if job["cached"]:
+            job["route"] = ROUTE_CACHE
+            return job
 
-        # 3) 解析工作流返回（JSON 字符串 or dict）
-        diff_type = "无法比较"
-        diff_keywords = ""
-        analysis_text = ""
-        national_clauses: List[Dict[str, str]] = []
-
-        parsed: Optional[Dict[str, Any]] = None
-        if isinstance(diff_raw, dict):
-            parsed = diff_raw
-        elif isinstance(diff_raw, str):
-            text_res = diff_raw.strip()
-            m = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text_res, flags=re.IGNORECASE)
-            if m:
-                diff_raw = m.group(1).strip()
+        # 4) 构建条款上下文
+        job["local_context"] = None
+        if use_full_text:
+            job["context"] = {"tokens": full_text_tokens, "budget": 0, "full_text": True}
+        else:
+            clause_context = build_clause_context(
+                chunks,
+                position,
+                token_budget=COMPARE_CONTEXT_TOKEN_BUDGET,
+                neighbor_window=COMPARE_CONTEXT_NEIGHBORS,
+                definitions=definitions,
+            )
+            job["local_context"] = clause_context.text
+            job["context"] = clause_context.summary()
+        return job
+
+    async def _prepare_traced(position: int, ch: Dict[str, Any]) -> Dict[str, Any]:
+        # 每个条款一个 span：检索、缓存查询等子 span 挂在其下，便于定位慢条款
+        with tracing.span("compare.clause", position=position) as sp:
+            job = await _prepare(position, ch)
+            sp.set("clause_id", job["clause_id"])
+            sp.set("route", job["route"])
+            return job
+
+    async def _timed(tier_name: str, coro_factory, clause_ids: List[str]) -> Any:
+        tier = tiers[tier_name]
+        async with semaphore:
+            started = time.perf_counter()
             try:
-                parsed = json.loads(diff_raw)
+                with recorder.stage(
+                    _TIER_STAGES[tier_name], input_size=len(clause_ids), model=tier["model"], clause_ids=clause_ids
+                ) as st:
+                    result = await coro_factory()
+                    st.output_size = len(clause_ids)
+                    return result
             except Exception:
-                parsed = None
-
-        if parsed:
-            diff_type = parsed.get("差异类型") or diff_type
-            diff_keywords = parsed.get("差异关键词") or diff_keywords
-            analysis_text = parsed.get("差异描述") or analysis_text
-            sim_list = parsed.get("相似国家条款") or []
-            # 规范化为 { nation_name, clause }
-            for item in sim_list:
-                if isinstance(item, dict):
-                    nation_name = item.get("国家政策文件") or ""
-                    clause_text = item.get("国家政策条款") or ""
-                    if nation_name or clause_text:
-                        national_clauses.append({
-                            "nation_name": nation_name,
-                            "clause": clause_text,
-                        })
-
-        # 若工作流未返回国家条款，使用 weaviate 检索结果兜底
-        if not national_clauses and filtered:
-            for r in filtered:
-                nid = str(r.get("metadata", {}).get("doc_id"))
-                national_clauses.append({
-                    "nation_name": nation_docs.get(nid, nid),
-                    "clause": r.get("text") or "",
-                })
-
-        clauses.append({
-            "id": clause_id,
-            "local_clause_title": clause_title,
-            "local_clause": local_clause_text,
-            "diff_type": diff_type,
-            "diff_keywords": diff_keywords,
-            "analysis": analysis_text,
-            "national_clauses": national_clauses,
-        })
+                tier["errors"] += 1
+                raise
+            finally:
+                tier["calls"] += 1
+                tier["latencies"].append((time.perf_counter() - started) * 1000)
+
+    async def _triage(job: Dict[str, Any]) -> bool:
+        """小模型初筛；返回 True 表示已判定为无差异，无需大模型。初筛失败按需复核处理。"""
+        try:
+            raw = await _timed("triage", lambda: get_triage_result(
+                segment=job["text"],
+                nations_segments=format_candidates(job["nations_segments"]),
+            ), [job["clause_id"]])
+        except Exception as exc:
+            print(f"[compare] triage failed for {job['clause_id']}, escalating: {exc}")
+            raw = None
+        parsed = _triage_analysis(raw)
+        if parsed is None:
+            tiers["triage"]["escalated"] += 1
+            return False
+        tiers["triage"]["passed"] += 1
+        job["route"], job["parsed"] = ROUTE_TRIAGE, parsed
+        return True
+
+    async def _analyze_single(job: Dict[str, Any]) -> None:
+        diff_raw = await _timed("analysis", lambda: get_worklow_analysis_result(
+            file_name=local_file_name,
+            file_content=local_file_content,
+            segment=job["text"],
+            nations_segments=format_candidates(job["nations_segments"]),
+            local_context=job["local_context"],
+        ), [job["clause_id"]])
+        # 模型只回填候选编号，还原为国家文件名与条款原文后再缓存/返回
+        job["parsed"] = resolve_candidates(_parse_analysis(diff_raw), job["nations_segments"])
+
+    async def _analyze_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """整批请求；返回需要逐条重试的条款。"""
+        items = []
+        # 国家文件编号表在本批内共用
+        table = CandidateTable()
+        for job in batch:
+            item = {
+                "条款编号": job["clause_id"],
+                "地方政策条款": job["text"],
+                "检索到的相似国家政策条款": table.format(job["nations_segments"]),
+            }
+            if job["local_context"] is not None:
+                item["地方政策相关上下文"] = job["local_context"]
+            items.append(item)
+        try:
+            raw = await _timed("analysis", lambda: get_batch_analysis_result(
+                file_name=local_file_name,
+                clauses=items,
+                file_content=local_file_content if use_full_text else None,
+                national_documents=table.documents_text(),
+            ), [job["clause_id"] for job in batch])
+        except Exception as exc:
+            print(f"[compare] batch of {len(batch)} clauses failed, falling back to per-clause calls: {exc}")
+            raw = None
+        split = _split_batch_result(raw, [job["clause_id"] for job in batch])
+        retry: List[Dict[str, Any]] = []
+        for job in batch:
+            parsed = resolve_candidates(split.get(job["clause_id"]), job["nations_segments"])
+            if parsed is None:
+                retry.append(job)
+                continue
+            job["parsed"] = parsed
+            job["batched"] = True
+        return retry
+
+    try:
+        with tracing.span("compare.prepare", clauses=len(chunks)):
+            jobs = await asyncio.gather(*(_prepare_traced(i, ch) for i, ch in enumerate(chunks)))
+        pending = [job for job in jobs if job["route"] == ROUTE_LLM]
+        if use_triage and pending:
+            with tracing.span("compare.triage", clauses=len(pending)):
+                passed = await asyncio.gather(*(_triage(job) for job in pending))
+            pending = [job for job, ok in zip(pending, passed) if not ok]
+
+        batch_stats = {"enabled": use_batch, "batches": 0, "batched_clauses": 0, "fallback_clauses": 0}
+        if use_batch and len(pending) > 1:
+            # 每条预估 token：条款 + 上下文 + 候选表 + 固定输出开销（输出只回填候选编号）
+            job_tokens = [
+                estimate_tokens(job["text"])
+                + (0 if use_full_text else job["context"]["tokens"])
+                + estimate_tokens(format_candidates(job["nations_segments"]))
+                + _BATCH_OUTPUT_TOKENS_PER_CLAUSE
+                for job in pending
+            ]
+            planned = plan_batches(
+                job_tokens,
+                token_budget=COMPARE_BATCH_TOKEN_BUDGET,
+                max_items=COMPARE_BATCH_MAX_CLAUSES,
+                shared_tokens=full_text_tokens or 0,
+            )
+            batches = [[pending[i] for i in group] for group in planned if len(group) > 1]
+            singles = [pending[group[0]] for group in planned if len(group) == 1]
+            batch_stats["batches"] = len(batches)
+            retries = await asyncio.gather(*(_analyze_batch(b) for b in batches))
+            fallback = [job for group in retries for job in group]
+            batch_stats["batched_clauses"] = sum(len(b) for b in batches) - len(fallback)
+            batch_stats["fallback_clauses"] = len(fallback)
+            await asyncio.gather(*(_analyze_single(job) for job in singles + fallback))
+        else:
+            await asyncio.gather(*(_analyze_single(job) for job in pending))
+    except UpstreamError as exc:
+        # 检索（向量化 / 向量库）或模型调用失败、超时 / 熔断：整体返回 503，调用方可稍后重试
+        raise HTTPException(status_code=503, detail=f"上游服务不可用: {exc}") from exc
+    finally:
+        await run_blocking(recorder.flush)
+
+    if ANALYSIS_CACHE_ENABLED:
+        with tracing.span("compare.cache_write", clauses=len(pending)):
+            for job in pending:
+                if job["parsed"]:
+                    await run_blocking(_cache_put, job["cache_key"], job["parsed"], payload.local_doc_id)
+            await run_blocking(_cache_evict)
+
+    clauses = [_clause_result(job, job["parsed"], nation_docs) for job in jobs]
+    context_tokens = [c["context"]["tokens"] for c in clauses if c["route"] == ROUTE_LLM]
+    routes = {route: 0 for route in (ROUTE_LLM, ROUTE_CACHE, ROUTE_NO_MATCH, ROUTE_IDENTICAL, ROUTE_TRIAGE)}
+    for c in clauses:
+        routes[c["route"]] += 1
+    for route, count in routes.items():
+        if count:
+            metrics.COMPARE_CLAUSES.inc(count, route)
 
     return {
         "success": True,
         "local_file": local_file_name,
         "clauses": clauses,
-    }
\ No newline at end of file
+        "cache": {"hits": routes[ROUTE_CACHE], "misses": routes[ROUTE_LLM]},
+        # 各分流路径的条款数：llm / cache / no_match（无候选，判为无法比较）/ identical（判为无差异）/ triage（初筛判为无差异）
+        "routes": routes,
+        "tiers": {name: _tier_summary(tier) for name, tier in tiers.items()},
+        "batch": batch_stats,
+        "context": {
+            "budget": COMPARE_CONTEXT_TOKEN_BUDGET,
+            "total_tokens": sum(context_tokens),
+            "max_tokens": max(context_tokens, default=0),
+        },
+    }
+
+
+@router.get("/cache/stats")
+def analysis_cache_stats(conn: sqlite3.Connection = Depends(get_db)):
+    """分析结果缓存统计：条目数、累计命中次数、按提示词版本/模型分组。"""
+    return {
+        "success": True,
+        "enabled": ANALYSIS_CACHE_ENABLED,
+        "prompt_version": ANALYSIS_PROMPT_VERSION,
+        "model": LLM_MODEL,
+        "ttl_seconds": ANALYSIS_CACHE_TTL_SECONDS,
+        "max_entries": ANALYSIS_CACHE_MAX_ENTRIES,
+        "stats": AnalysisCacheRepo(conn).stats(),
+    }
+
+
+@router.delete("/cache")
+def invalidate_analysis_cache(
+    local_doc_id: Optional[str] = Query(None, description="仅删除该地方政策文档写入的缓存"),
+    prompt_version: Optional[str] = Query(None),
+    model: Optional[str] = Query(None),
+    all: bool = Query(False, description="不带其他条件时需显式指定 all=true 才会清空全部缓存"),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """失效分析结果缓存，条件之间为 AND。"""
+    if not (local_doc_id or prompt_version or model or all):
+        raise HTTPException(status_code=400, detail="请指定 local_doc_id / prompt_version / model，或 all=true 清空全部")
+    deleted = AnalysisCacheRepo(conn).invalidate(
+        local_doc_id=local_doc_id, prompt_version=prompt_version, model=model
+    )
+    return {"success": True, "deleted": deleted}
\ No newline at end of file
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import shutil
+import sqlite3
 import tempfile
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, Query
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile, Query, Response
 from pydantic import BaseModel
 
 from api.zhipuApi import zhipu_get_file_content
@@ -20,12 +22,19 @@ from src.doc_structure_recognition import build_segments_struct
 from src.utils import build_toc
 from src.storage import persist_parsed_document, index_document_chunks, rollback_document_vectors
 from src.pydantic_models import WeaviateSearchRequest
-from src.storage import CollectionsRepo, DocumentsRepo, ChunksRepo, connect
+from src.storage import CollectionsRepo, DocumentsRepo, ChunksRepo, get_db
 from pathlib import Path
 from src.storage.db import get_storage_root
+from src.concurrency import run_ingest
+from src.resilience import UpstreamError
+from src.settings import DOCUMENT_CACHE_MAX_AGE_SECONDS
+from src.stages import StageRecorder, activate, stage
 
 router = APIRouter(prefix="/api/rag", tags=["rag"])
 
+# 说明：查询类路由均为同步 def，由 FastAPI 放入线程池执行（容量见 settings.BLOCKING_IO_MAX_WORKERS），
+# 避免 SQLite / 文件读取 / Weaviate 检索阻塞事件循环；上传解析与向量化走独立的 ingest 线程池。
+
 
 class IndexDocRequest(BaseModel):
     doc_id: str
@@ -61,54 +70,28 @@ async def ingest_and_index(
       embedding_stats: {attempted, uploaded, failed}
     }
     """
-    temp_file_path: Optional[str] = None
-
-    try:
-        allowed_extensions = [".txt", ".pdf", ".docx", ".md"]
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in allowed_extensions:
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件类型: {file_extension}。支持的格式: {', '.join(allowed_extensions)}",
-            )
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file_path = temp_file.name
-            shutil.copyfileobj(file.file, temp_file)
-
-        file_content = zhipu_get_file_content(temp_file_path)
-        key_words = ""
-        if not file_content:
-            raise HTTPException(status_code=500, detail="文档内容提取失败，请检查文件格式或内容提取服务状态。")
-
-        file_struct = build_segments_struct(file_content=file_content, file_name=file.filename)
-        segments = file_struct.get("segments", [])
-        if not segments:
-            raise HTTPException(status_code=422, detail="未能从文档中提取到有效的政策条款，请检查文档格式。")
-
-        toc_tree, _counts = build_toc(segments)
-
-        ingest_result = persist_parsed_document(
-            temp_file_path=temp_file_path,
-            filename=file.filename,
-            original_mime=None,
-            file_content=file_content,
-            segments=segments,
-            toc=toc_tree,
-            keywords=key_words,
-            collection_name=collection_name or DEFAULT_COLLECTION_NAME,
+    allowed_extensions = [".txt", ".pdf", ".docx", ".md"]
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型: {file_extension}。支持的格式: {', '.join(allowed_extensions)}",
         )
 
-        # 解析 client_params（如果存在）
-        client_params_obj: Optional[Dict[str, Any]] = None
-        if client_params:
-            try:
-                client_params_obj = json.loads(client_params)
-            except Exception:
-                raise HTTPException(status_code=400, detail="client_params 需为合法 JSON 字符串")
+    # 解析 client_params（如果存在）
+    client_params_obj: Optional[Dict[str, Any]] = None
+    if client_params:
+        try:
+            client_params_obj = json.loads(client_params)
+        except Exception:
+            raise HTTPException(status_code=400, detail="client_params 需为合法 JSON 字符串")
 
-        stats = index_document_chunks(
-            doc_id=ingest_result["doc_id"],
+    # 解析、落库与向量化全部为同步阻塞调用，放到 ingest 线程池执行
+    try:
+        return await run_ingest(
+            _ingest_and_index_sync,
+            file,
+            file_extension,
             collection_name=collection_name or DEFAULT_COLLECTION_NAME,
             siliconflow_api_token=siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN,
             weaviate_api_key=weaviate_api_key or DEFAULT_WEAVIATE_API_KEY,
@@ -116,6 +99,75 @@ async def ingest_and_index(
             batch_size=batch_size,
             max_retries=max_retries,
         )
+    except HTTPException:
+        raise
+    except UpstreamError as exc:
+        # 上游超时 / 熔断：返回 503 便于调用方稍后重试
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+def _ingest_and_index_sync(
+    file: UploadFile,
+    file_extension: str,
+    *,
+    collection_name: str,
+    siliconflow_api_token: Optional[str],
+    weaviate_api_key: Optional[str],
+    client_params: Optional[Dict[str, Any]],
+    batch_size: int,
+    max_retries: int,
+) -> Dict[str, Any]:
+    temp_file_path: Optional[str] = None
+    # 各阶段耗时写入 process_logs；入库前的阶段在拿到 doc_id 后一并归属该文档
+    recorder = StageRecorder()
+    try:
+        with activate(recorder):
+            with stage("upload", filename=file.filename) as st:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
+                    temp_file_path = temp_file.name
+                    shutil.copyfileobj(file.file, temp_file)
+                st.input_size = st.output_size = os.path.getsize(temp_file_path)
+
+            with stage("parse", input_size=st.output_size) as st:
+                file_content = zhipu_get_file_content(temp_file_path)
+                st.output_size = len(file_content or "")
+            key_words = ""
+            if not file_content:
+                raise HTTPException(status_code=500, detail="文档内容提取失败，请检查文件格式或内容提取服务状态。")
+
+            with stage("segment", input_size=len(file_content)) as st:
+                file_struct = build_segments_struct(file_content=file_content, file_name=file.filename)
+                segments = file_struct.get("segments", [])
+                if not segments:
+                    raise HTTPException(status_code=422, detail="未能从文档中提取到有效的政策条款，请检查文档格式。")
+                toc_tree, _counts = build_toc(segments)
+                st.output_size = _counts.get("articles")
+
+            with stage("persist", input_size=st.output_size) as st:
+                ingest_result = persist_parsed_document(
+                    temp_file_path=temp_file_path,
+                    filename=file.filename,
+                    original_mime=None,
+                    file_content=file_content,
+                    segments=segments,
+                    toc=toc_tree,
+                    keywords=key_words,
+                    collection_name=collection_name,
+                )
+                st.output_size = ingest_result["chunk_count"]
+            recorder.bind(ingest_result["doc_id"])
+
+            stats = index_document_chunks(
+                doc_id=ingest_result["doc_id"],
+                collection_name=collection_name,
+                siliconflow_api_token=siliconflow_api_token,
+                weaviate_api_key=weaviate_api_key,
+                client_params=client_params,
+                batch_size=batch_size,
+                max_retries=max_retries,
+            )
 
         return {
             "success": True,
@@ -125,11 +177,8 @@ async def ingest_and_index(
             "chunk_count": ingest_result["chunk_count"],
             "embedding_stats": stats,
         }
-    except HTTPException:
-        raise
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
     finally:
+        recorder.flush()
         if temp_file_path and os.path.exists(temp_file_path):
             try:
                 os.unlink(temp_file_path)
@@ -139,7 +188,8 @@ async def ingest_and_index(
 
 @router.post("/index-doc-chunks")
 async def index_doc_chunks(payload: IndexDocRequest):
-    stats = index_document_chunks(
+    stats = await run_ingest(
+        index_document_chunks,
         doc_id=payload.doc_id,
         collection_name=payload.collection_name or DEFAULT_COLLECTION_NAME,
         siliconflow_api_token=payload.siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN,
@@ -154,7 +204,8 @@ async def index_doc_chunks(payload: IndexDocRequest):
 
 @router.post("/rollback-doc-chunks")
 async def rollback_doc_chunks(payload: RollbackDocRequest):
-    stats = rollback_document_vectors(
+    stats = await run_ingest(
+        rollback_document_vectors,
         doc_id=payload.doc_id,
         collection_name=payload.collection_name or DEFAULT_COLLECTION_NAME,
         siliconflow_api_token=payload.siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN,
@@ -165,18 +216,42 @@ async def rollback_doc_chunks(payload: RollbackDocRequest):
     return {"success": True, "stats": stats}
 
 
+def _local_doc_filter(conditions: Optional[List[Dict[str, Any]]]) -> Optional[List[str]]:
+    """本地检索仅支持按 doc_id 等值过滤（key 为 doc_id 或 metadata.doc_id）。"""
+    doc_ids: List[str] = []
+    for cond in conditions or []:
+        key = cond.get("key")
+        if key not in ("doc_id", "metadata.doc_id") or cond.get("operator", "Equal") != "Equal":
+            raise HTTPException(status_code=400, detail=f"local 检索不支持的过滤条件: {cond}")
+        doc_ids.append(str(cond.get("match")))
+    return doc_ids or None
+
+
 @router.post("/search")
-async def rag_search(payload: WeaviateSearchRequest):
-    results = weaviate_search(
-        payload.query,
-        collection_name=payload.collection_name or DEFAULT_COLLECTION_NAME,
-        siliconflow_api_token=payload.siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN,
-        weaviate_api_key=payload.weaviate_api_key or DEFAULT_WEAVIATE_API_KEY,
-        client_params=payload.client_params,
-        limit=payload.limit,
-        filter_conditions=payload.filter_conditions,
-        filters=payload.filters,
-    )
+def rag_search(payload: WeaviateSearchRequest, conn: sqlite3.Connection = Depends(get_db)):
+    target_name = payload.collection_name or DEFAULT_COLLECTION_NAME
+    if payload.search_type == "local":
+        collection = CollectionsRepo(conn).get_by_name(target_name)
+        results = []
+        if collection:
+            results = ChunksRepo(conn).search_fulltext(
+                payload.query,
+                collection_id=collection["id"],
+                doc_ids=_local_doc_filter(payload.filter_conditions),
+                limit=payload.limit,
+            )
+    else:
+        results = weaviate_search(
+            payload.query,
+            collection_name=target_name,
+            siliconflow_api_token=payload.siliconflow_api_token or DEFAULT_SILICONFLOW_API_TOKEN,
+            weaviate_api_key=payload.weaviate_api_key or DEFAULT_WEAVIATE_API_KEY,
+            client_params=payload.client_params,
+            limit=payload.limit,
+            filter_conditions=payload.filter_conditions,
+            filters=payload.filters,
+            search_type=payload.search_type or "hybrid",
+        )
 
     return {
         "success": True,
@@ -187,30 +262,133 @@ async def rag_search(payload: WeaviateSearchRequest):
 
 
 # 从SQLite列出文档与分段
+def _split_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()] or None
+
+
+def _document_etag(doc_id: str, validator: Tuple[int, str], variant: str) -> str:
+    """强 ETag：documents.version 在文档或其分段的任何变更时递增（见迁移 v7），再混入 updated_at。"""
+    version, updated_at = validator
+    digest = hashlib.sha256(f"{doc_id}:{version}:{updated_at}:{variant}".encode("utf-8")).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match 按弱比较：忽略 W/ 前缀
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    if DOCUMENT_CACHE_MAX_AGE_SECONDS > 0:
+        cache_control = f"private, max-age={DOCUMENT_CACHE_MAX_AGE_SECONDS}, must-revalidate"
+    else:
+        cache_control = "private, no-cache"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
 @router.get("/documents")
-async def list_documents(collection_name: Optional[str] = Query(None)):
-    """列出指定集合的所有文档。默认集合为 DEFAULT_COLLECTION_NAME。"""
+def list_documents(
+    collection_name: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页条数；不传则返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回列，如 id,source_filename,status,created_at"),
+    status: Optional[str] = Query(None),
+    filename: Optional[str] = Query(None, description="按文件名前缀过滤（区分大小写）"),
+    sort: str = Query("created_at", description="created_at / updated_at / source_filename"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """列出指定集合的文档，支持 keyset 分页、列选择与按状态/文件名过滤。默认集合为 DEFAULT_COLLECTION_NAME。"""
     target_name = collection_name or DEFAULT_COLLECTION_NAME
-    conn = connect()
     c_repo = CollectionsRepo(conn)
     # 确保集集合存在，便于无数据时也能返回合元信息
     collection = c_repo.ensure(name=target_name, provider="weaviate", config=None, is_active=1)
     d_repo = DocumentsRepo(conn)
-    documents = d_repo.list_by_collection(collection_id=collection["id"]) or []
+    try:
+        documents, next_cursor = d_repo.list_page(
+            collection["id"],
+            fields=_split_fields(fields),
+            status=status,
+            filename=filename,
+            sort=sort,
+            order=order,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    total = len(documents) if limit is None else d_repo.count(collection["id"], status=status, filename=filename)
     return {
         "success": True,
         "dataset": {"id": collection["id"], "name": collection["name"], "provider": collection.get("provider")},
         "documents": documents,
-        "total": len(documents),
+        "total": total,
+        "next_cursor": next_cursor,
     }
 
 
+# 分段列表输出字段 -> chunks 表列
+_SEGMENT_FIELD_COLUMNS: Dict[str, List[str]] = {
+    "id": ["id"],
+    "position": ["chunk_index"],
+    "status": ["embedding_status"],
+    "enabled": [],
+    "content": ["content"],
+    "word_count": [],  # 由 content_length 提供
+    "tokens": ["token_count"],
+    "created_at": ["created_at"],
+    "updated_at": ["updated_at"],
+}
+
+_SEGMENT_STATUS_FILTER = {"completed": "embedded", "error": "failed", "processing": "pending"}
+
+
 @router.get("/documents/{doc_id}/chunks")
-async def list_chunks_by_doc(doc_id: str):
-    """按 doc_id 列出分段（chunks），映射为前端 PolicyDetail 所需字段。"""
-    conn = connect()
+def list_chunks_by_doc(
+    doc_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数；不传则返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，如 id,position,status,word_count"),
+    status: Optional[str] = Query(None, description="completed / error / processing"),
+    if_none_match: Optional[str] = Header(None),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """按 doc_id 列出分段（chunks），映射为前端 PolicyDetail 所需字段。
+
+    带 ETag 与 Cache-Control；If-None-Match 命中时只读文档的版本号，直接返回 304。
+    """
+    validator = DocumentsRepo(conn).get_version(doc_id)
+    if validator is not None:
+        headers = _cache_headers(_document_etag(doc_id, validator, "chunks"))
+        if _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    wanted = _split_fields(fields) or list(_SEGMENT_FIELD_COLUMNS)
+    unknown = [f for f in wanted if f not in _SEGMENT_FIELD_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(unknown)}")
+    if status and status not in _SEGMENT_STATUS_FILTER:
+        raise HTTPException(status_code=400, detail=f"unsupported status: {status}")
+    columns = list(dict.fromkeys(col for f in wanted for col in _SEGMENT_FIELD_COLUMNS[f]))
+
     ch_repo = ChunksRepo(conn)
-    chunks = ch_repo.list_by_doc(doc_id) or []
+    try:
+        chunks, next_cursor = ch_repo.list_page(
+            doc_id,
+            fields=columns,
+            embedding_status=_SEGMENT_STATUS_FILTER.get(status) if status else None,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     def _status_map(embedding_status: Optional[str]) -> str:
         if embedding_status == "embedded":
@@ -221,32 +399,101 @@ async def list_chunks_by_doc(doc_id: str):
 
     segments = []
     for ch in chunks:
-        content = ch.get("content") or ""
-        segments.append({
+        segment = {
             "id": ch.get("id"),
             "position": int(ch.get("chunk_index") or 0),
             "status": _status_map(ch.get("embedding_status")),
             "enabled": True,
-            "content": content,
-            "word_count": len(content),
+            "content": ch.get("content") or "",
+            "word_count": int(ch.get("content_length") or 0),
             "tokens": ch.get("token_count") or 0,
             "created_at": ch.get("created_at"),
             "updated_at": ch.get("updated_at"),
-        })
+        }
+        segments.append({k: segment[k] for k in wanted})
 
+    total = len(segments) if limit is None else ch_repo.count_by_doc(
+        doc_id, embedding_status=_SEGMENT_STATUS_FILTER.get(status) if status else None
+    )
     return {
         "success": True,
         "doc_id": doc_id,
         "data": segments,
         "count": len(segments),
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+
+
+def _article_view(ch: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": ch.get("id"),
+        "position": int(ch.get("chunk_index") or 0),
+        "article_no": ch.get("article_no"),
+        "title": ch.get("title"),
+        "section_path": ch.get("section_path") or [],
+        "content": ch.get("content") or "",
+        "embedding_status": ch.get("embedding_status"),
+    }
+
+
+@router.get("/documents/{doc_id}/articles")
+def list_articles_by_range(
+    doc_id: str,
+    start: int = Query(..., ge=0, description="起始条号（含）"),
+    end: int = Query(..., ge=0, description="结束条号（含）"),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """按条号区间返回条款，如 start=20&end=25 返回第二十条至第二十五条。"""
+    if end < start:
+        raise HTTPException(status_code=400, detail="end 不能小于 start")
+    ch_repo = ChunksRepo(conn)
+    articles = [_article_view(ch) for ch in ch_repo.list_by_article_range(doc_id, start, end)]
+    return {
+        "success": True,
+        "doc_id": doc_id,
+        "range": {"start": start, "end": end},
+        "data": articles,
+        "count": len(articles),
+    }
+
+
+@router.get("/documents/{doc_id}/articles/{article_no}")
+def get_article(doc_id: str, article_no: int, conn: sqlite3.Connection = Depends(get_db)):
+    """按 (doc_id, 条号) 定位单条条款，例如 article_no=23 对应“第二十三条”。"""
+    ch_repo = ChunksRepo(conn)
+    chunks = ch_repo.get_by_article(doc_id, article_no)
+    if not chunks:
+        raise HTTPException(status_code=404, detail="article not found")
+    return {
+        "success": True,
+        "doc_id": doc_id,
+        "article_no": article_no,
+        "data": [_article_view(ch) for ch in chunks],
+        "count": len(chunks),
     }
 
 
 @router.get("/documents/{doc_id}/parsed")
-async def get_parsed_document(doc_id: str):
-    """返回指定文档的解析产物：content、toc、counts、keywords。"""
-    conn = connect()
+def get_parsed_document(
+    doc_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """返回指定文档的解析产物：content、toc、counts、keywords。
+
+    带 ETag 与 Cache-Control；If-None-Match 命中时不读取解析文件，直接返回 304。
+    """
     d_repo = DocumentsRepo(conn)
+    validator = d_repo.get_version(doc_id)
+    if validator is None:
+        raise HTTPException(status_code=404, detail="document not found")
+    headers = _cache_headers(_document_etag(doc_id, validator, "parsed"))
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     doc = d_repo.get(doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="document not found")
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+
+from src import metrics, profiling, tracing, warmup
+from src.resilience import providers
+from src.settings import METRICS_ENABLED
+from src.stages import summarize
+from src.storage import ProcessLogsRepo, get_db
+
+router = APIRouter(prefix="/api/system", tags=["system"])
+# Prometheus 约定的抓取路径，不带 /api 前缀
+metrics_router = APIRouter(tags=["system"])
+# 负载均衡 / 编排系统的探针，不带 /api 前缀
+health_router = APIRouter(prefix="/health", tags=["system"])
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """本进程的请求、外部调用、嵌入请求、token 用量与条款对比指标（Prometheus 文本格式）。"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@health_router.get("/live")
+def health_live():
+    """存活探针：进程能处理请求即返回 200，不检查依赖。"""
+    return {"status": "ok"}
+
+
+@health_router.get("/ready")
+def health_ready():
+    """就绪探针：启动预热完成（SQLite、依赖导入、向量库连接）后返回 200，预热中、预热失败或正在退出时返回 503。"""
+    state = warmup.snapshot()
+    return JSONResponse(state, status_code=200 if state["status"] == warmup.READY else 503)
+
+
+@router.get("/resilience")
+def resilience_state():
+    """各上游（zhipu / siliconflow / llm / llm_triage）的熔断状态、重试预算、耗时与调用计数。"""
+    return {
+        "success": True,
+        "providers": {name: provider.snapshot() for name, provider in providers().items()},
+    }
+
+
+@router.post("/resilience/{name}/reset")
+def reset_circuit(name: str):
+    """手动关闭指定上游的熔断（上游恢复后无需等待探测）。"""
+    provider = providers().get(name)
+    if provider is None:
+        raise HTTPException(status_code=404, detail=f"未知的上游: {name}")
+    provider.reset()
+    return {"success": True, "provider": provider.snapshot()}
+
+
+@router.post("/warmup")
+def warmup_modules():
+    """提前导入按需加载的重型依赖（Agently，以及 VECTOR_BACKEND=weaviate 时的 weaviate 客户端），返回各项耗时。"""
+    return {"success": True, "modules": warmup.preload_modules()}
+
+
+@router.get("/stages")
+def stage_timings(
+    since_minutes: int = Query(1440, ge=0, description="统计最近多少分钟的记录，0 表示全部"),
+    stage: Optional[str] = Query(None, description="仅统计该阶段，如 parse / embed_batch / llm_analyze"),
+    doc_id: Optional[str] = Query(None, description="仅统计该文档"),
+    top: int = Query(10, ge=0, le=200, description="返回最慢的记录数与文档数"),
+    conn: sqlite3.Connection = Depends(get_db),
+):
+    """按阶段汇总 process_logs 中的耗时分位数（毫秒），并列出最慢的单次记录与最慢的文档。"""
+    repo = ProcessLogsRepo(conn)
+    filters = {"since_minutes": since_minutes, "stage": stage}
+    return {
+        "success": True,
+        "since_minutes": since_minutes,
+        "stages": summarize(repo.durations(doc_id=doc_id, **filters)),
+        "slowest": repo.slowest(doc_id=doc_id, limit=top, **filters),
+        "slowest_documents": [] if doc_id else repo.slowest_documents(limit=top, **filters),
+    }
+
+
+@router.get("/traces")
+def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0, ge=0, description="只返回耗时不低于该值的请求"),
+    name: Optional[str] = Query(None, description="按根 span 名过滤，如 /api/compare/analyze"),
+    errors_only: bool = Query(False, description="只返回含失败 span 的请求"),
+):
+    """内存环形缓冲中最近的请求 trace 摘要（新的在前）。"""
+    return {
+        "success": True,
+        "traces": tracing.recent(limit, min_duration_ms=min_duration_ms, name=name, errors_only=errors_only),
+    }
+
+
+@router.get("/traces/{trace_id}")
+def get_trace(trace_id: str, format: str = Query("json", pattern="^(json|text)$")):
+    """单条 trace 的全部 span 与关键路径；format=text 返回文本瀑布图（关键路径上的 span 以 * 标记）。"""
+    record = tracing.get_trace(trace_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="trace 不存在或已被新的请求挤出缓冲")
+    if format == "text":
+        return PlainTextResponse(tracing.render_text(record))
+    return {"success": True, "trace": record, "critical_path": tracing.critical_path(record)}
+
+
+def _require_profile_access(request: Request, x_profile_token: Optional[str] = Header(None)) -> None:
+    """剖析结果包含调用栈与请求路径，与开启剖析使用同一校验（令牌或本机请求）。"""
+    client = request.client.host if request.client else None
+    if not profiling.is_authorized(x_profile_token, client):
+        raise HTTPException(status_code=403, detail="无权访问剖析结果")
+
+
+@router.get("/profiles", dependencies=[Depends(_require_profile_access)])
+def list_profiles():
+    """已保存的请求剖析（新的在前），每项为 meta.json 内容。"""
+    return {"success": True, "profiles": profiling.list_profiles()}
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(_require_profile_access)])
+def get_profile(profile_id: str):
+    """单个剖析的元数据与 summary.txt 文本。"""
+    meta_path = profiling.profile_path(profile_id)
+    if meta_path is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    summary_path = profiling.profile_path(profile_id, "summary.txt")
+    return {
+        "success": True,
+        "profile": json.loads(meta_path.read_text(encoding="utf-8")),
+        "summary": summary_path.read_text(encoding="utf-8") if summary_path else None,
+    }
+
+
+@router.get("/profiles/{profile_id}/files/{name}", dependencies=[Depends(_require_profile_access)])
+def download_profile_file(profile_id: str, name: str):
+    """下载原始结果：stacks.collapsed（折叠栈）、profile.pstats、summary.txt 或 meta.json。"""
+    path = profiling.profile_path(profile_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return FileResponse(path, filename=f"{profile_id}-{name}")
+
+
+@router.delete("/profiles/{profile_id}", dependencies=[Depends(_require_profile_access)])
+def delete_profile(profile_id: str):
+    if not profiling.delete_profile(profile_id):
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    return {"success": True, "id": profile_id}
@@ -13,9 +13,11 @@ from src.pydantic_models import WeaviateIndexRequest, WeaviateSearchRequest
 
 router = APIRouter(prefix="/api/weaviate", tags=["weaviate"])
 
+# Weaviate / SiliconFlow 均为同步调用：路由定义为 def，由 FastAPI 在线程池中执行
+
 
 @router.post("/add-documents")
-async def add_documents(payload: WeaviateIndexRequest):
+def add_documents(payload: WeaviateIndexRequest):
     if not payload.documents:
         raise HTTPException(status_code=400, detail="documents policy")
 
@@ -43,7 +45,7 @@ async def add_documents(payload: WeaviateIndexRequest):
 
 
 @router.post("/search")
-async def search(payload: WeaviateSearchRequest):
+def search(payload: WeaviateSearchRequest):
     results = weaviate_search(
         payload.query,
         collection_name=payload.collection_name,
@@ -63,7 +65,7 @@ async def search(payload: WeaviateSearchRequest):
 
 
 @router.delete("/delete-documents")
-async def delete_document(
+def delete_document(
     uuid_value: str,
     collection_name: Optional[str] = Query(None),
     siliconflow_api_token: Optional[str] = Query(None),
@@ -83,7 +85,7 @@ async def delete_document(
 
 
 @router.delete("/delete-collection")
-async def drop_collection(
+def drop_collection(
     collection_name: Optional[str] = Query(None),
     siliconflow_api_token: Optional[str] = Query(None),
     weaviate_api_key: Optional[str] = Query(None),
@@ -1,39 +1,277 @@
-"""Agents构建工厂"""
-from agently import Agently
+"""Agents构建工厂
+
+- Agently 全局配置只在首次使用时设置一次（加锁），不再在每次创建 agent 时修改全局设置。
+- 模型请求走共享的 httpx 连接池（keep-alive）：Agently 每次请求都会新建 AsyncClient 并强制
+  `Connection: close`，这里通过插件的 AsyncClient 工厂注入共享 transport，并去掉该请求头。
+- agent 按名称池化复用：agent 的 input/output 是请求级可变状态，同一时刻只能被一个请求使用，
+  通过 `async with AgentFactory.acquire(name) as agent` 借出，用完归还。
+- 分级模型：acquire 可传入 model_settings（base_url / model / api_key），覆盖该名称 agent 的模型配置，
+  未覆盖的项沿用全局配置。
+- Agently（导入约 0.6s）在首次创建 agent 时才导入，只提供文档库接口的实例不会加载。
+- token 用量：共享 transport 旁路读取响应（含流式响应的最后一个 chunk）中的 usage，计入
+  /metrics 的 llm_tokens_total，不改变 Agently 读到的内容。
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+from src import metrics, tracing
+from src.settings import (
+    LLM_AGENT_POOL_SIZE,
+    LLM_API_KEY,
+    LLM_BASE_URL,
+    LLM_MAX_CONNECTIONS,
+    LLM_MODEL,
+    LLM_STREAM,
+)
+
+
+# 为解析 usage 最多缓存的响应字节数；超出后只保留末尾（usage 位于响应末尾）
+_USAGE_BUFFER_BYTES = 256 * 1024
+
+
+def _extract_usage(body: bytes) -> Optional[Dict[str, Any]]:
+    """从 chat/completions 响应中取 usage：普通 JSON 响应，或 SSE 流中最后一个带 usage 的 data 行。"""
+    text = body.decode("utf-8", errors="ignore").strip()
+    if not text:
+        return None
+    if text.startswith("{"):
+        try:
+            return json.loads(text).get("usage") or None
+        except ValueError:
+            pass
+    for line in reversed(text.splitlines()):
+        line = line.strip()
+        if not line.startswith("data:") or '"usage"' not in line:
+            continue
+        try:
+            usage = json.loads(line[5:].strip()).get("usage")
+        except ValueError:
+            continue
+        if usage:
+            return usage
+    return None
+
+
+def _record_usage(model: str, usage: Optional[Dict[str, Any]]) -> None:
+    if not usage:
+        return
+    prompt = usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+    completion = usage.get("completion_tokens") or usage.get("output_tokens") or 0
+    if prompt:
+        metrics.LLM_TOKENS.inc(prompt, model, "in")
+    if completion:
+        metrics.LLM_TOKENS.inc(completion, model, "out")
+
+
+class _UsageRecordingStream(httpx.AsyncByteStream):
+    """原样转发响应数据，同时保留末尾字节，读完后解析 usage。"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, model: str):
+        self._stream = stream
+        self._model = model
+        self._tail = bytearray()
+        self._recorded = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tail += chunk
+            if len(self._tail) > _USAGE_BUFFER_BYTES:
+                del self._tail[: len(self._tail) - _USAGE_BUFFER_BYTES]
+            yield chunk
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._recorded:
+            return
+        self._recorded = True
+        try:
+            _record_usage(self._model, _extract_usage(bytes(self._tail)))
+        except Exception as exc:
+            print(f"[agents] failed to read LLM usage: {exc}")
+
+    async def aclose(self) -> None:
+        # 流式读取方可能在 [DONE] 后直接关闭而不读完，此时按已收到的内容解析
+        self._finish()
+        await self._stream.aclose()
+
+
+def _request_model(request: httpx.Request) -> Optional[str]:
+    if not request.url.path.endswith("/chat/completions"):
+        return None
+    try:
+        return str(json.loads(request.content or b"{}").get("model") or "unknown")
+    except (ValueError, httpx.RequestNotRead):
+        return "unknown"
+
+
+class _KeepAliveTransport(httpx.AsyncBaseTransport):
+    """包装共享连接池：去掉 Agently 强制的 `Connection: close`，且不随单次请求的 client 关闭。"""
+
+    def __init__(self, pool: httpx.AsyncHTTPTransport):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.headers.get("connection", "").lower() == "close":
+            del request.headers["connection"]
+        model = _request_model(request)
+        parent = tracing.traceparent_for(str(request.url))
+        if parent:
+            request.headers["traceparent"] = parent
+        response = await self._pool.handle_async_request(request)
+        if model is not None and response.status_code < 400:
+            response.stream = _UsageRecordingStream(response.stream, model)
+        return response
+
+    async def aclose(self) -> None:
+        # 共享连接池由 AgentFactory.aclose() 统一关闭
+        pass
+
+
+class _SharedTransport:
+    """每个事件循环一个连接池（httpx 连接绑定创建它的事件循环）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[httpx.AsyncHTTPTransport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._pool is None or self._loop is not loop:
+                limits = httpx.Limits(
+                    max_connections=max(1, LLM_MAX_CONNECTIONS),
+                    max_keepalive_connections=max(1, LLM_MAX_CONNECTIONS),
+                )
+                self._pool = httpx.AsyncHTTPTransport(limits=limits)
+                self._loop = loop
+            return self._pool
+
+    def client(self, **client_options: Any) -> httpx.AsyncClient:
+        client_options.pop("transport", None)
+        return httpx.AsyncClient(transport=_KeepAliveTransport(self.get()), **client_options)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            pool, self._pool, self._loop = self._pool, None, None
+        if pool is not None:
+            await pool.aclose()
+
 
 class AgentFactory:
     _instances = {}
     _config = None
+    _config_lock = threading.Lock()
+    _transport = _SharedTransport()
+    # name -> 空闲 agent
+    _idle: Dict[str, Deque[Any]] = {}
+    _idle_lock = threading.Lock()
+
+    @classmethod
+    def configure(cls):
+        """设置 Agently 全局配置与共享连接池（幂等，仅首次生效）。"""
+        if cls._config is not None:
+            return cls._config
+        with cls._config_lock:
+            if cls._config is not None:
+                return cls._config
+            from agently import Agently
+
+            if not LLM_API_KEY:
+                print("[agents] 警告：未设置 LLM_API_KEY，模型请求将因鉴权失败而报错")
+            config = {
+                "base_url": LLM_BASE_URL,
+                "model": LLM_MODEL,
+                "model_type": "chat",
+                "api_key": LLM_API_KEY,
+                "stream": LLM_STREAM,
+            }
+            Agently.set_settings("response.streaming_parse", True)
+            Agently.set_settings("OpenAICompatible", config)
+            cls._install_client_factory()
+            cls._config = config
+            return config
+
+    @classmethod
+    def _install_client_factory(cls):
+        # OpenAICompatible 插件创建 client 时优先使用其包上的 AsyncClient 属性
+        try:
+            import agently.builtins.plugins.ModelRequester.OpenAICompatible as openai_compatible
+        except ImportError:
+            print("[agents] OpenAICompatible plugin not found, LLM connections will not be pooled")
+            return
+        openai_compatible.AsyncClient = cls._transport.client
 
     @classmethod
     def get_agent(cls, instance_name="default"):
         if instance_name not in cls._instances:
             cls._instances[instance_name] = cls._create_new_instance()
         return cls._instances[instance_name]._get_agent()
-    
+
     @classmethod
     def create_agent_by_name(cls, name):
         instance = cls._create_new_instance()
         return instance._get_agent()
-    
+
+    @classmethod
+    @asynccontextmanager
+    async def acquire(
+        cls,
+        name: str,
+        system_prompt: Optional[str] = None,
+        model_settings: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Any]:
+        """从池中借出一个 agent；system_prompt 与 model_settings 仅在新建实例时设置（同名 agent 应使用相同配置）。"""
+        agent = None
+        with cls._idle_lock:
+            idle = cls._idle.get(name)
+            if idle:
+                agent = idle.pop()
+        if agent is None:
+            agent = cls.create_agent_by_name(name)
+            if model_settings:
+                agent.set_settings("OpenAICompatible", dict(model_settings))
+            if system_prompt:
+                agent.set_agent_prompt("system", system_prompt)
+        # 请求异常时 agent 上可能残留未清理的请求级状态，直接丢弃不归还
+        yield agent
+        with cls._idle_lock:
+            idle = cls._idle.setdefault(name, deque())
+            if len(idle) < max(1, LLM_AGENT_POOL_SIZE):
+                idle.append(agent)
+
+    @classmethod
+    async def ping(cls, timeout: float = 10.0) -> int:
+        """经共享连接池请求 GET {base_url}/models（不消耗 token），预先建立到模型服务的连接，返回 HTTP 状态码。"""
+        async with cls._transport.client(timeout=timeout) as client:
+            response = await client.get(
+                f"{LLM_BASE_URL.rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {LLM_API_KEY}"},
+            )
+        return response.status_code
+
+    @classmethod
+    async def aclose(cls):
+        """关闭共享连接池（应用退出时调用）。"""
+        await cls._transport.aclose()
+
     @classmethod
     def _create_new_instance(cls, ):
         instance = super(AgentFactory, cls).__new__(cls)
         instance._initialize()
         return instance
-    
+
     def _initialize(self):
-        """初始化实例，使用配置文件中的设置"""
-        Agently.set_settings("response.streaming_parse", True)
-        Agently.set_settings(
-                "OpenAICompatible",
-                {
-                    "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
-                    "model": "qwen3-max",
-                    "model_type": "chat",
-                    "api_key": "sk-4a81eb844a224ca284962ee9e900a92a",
-                },
-            )
+        """初始化实例：全局配置只设置一次，这里仅创建 agent"""
+        from agently import Agently
+
+        AgentFactory.configure()
         self.agent = Agently.create_agent()
         return self.agent
 
@@ -0,0 +1,102 @@
+"""候选国家条款的紧凑序列化。
+
+替代 `str(nations_segments)`（Python repr，带引号与转义，每条都重复完整文件名）：
+- 国家政策文件名去重，以短编号 D1、D2… 引用，同一批次共用一张文件表；
+- 候选条款按检索顺序编号 [1]、[2]…（每个地方条款内独立编号），去掉 Markdown 标记与多余空白；
+- 模型输出只回填“候选编号”，由 resolve_candidates 还原为文件名与条款原文。
+
+示例：
+    D1=电力市场运行基本规则
+    [1] D1 第五条 电力市场成员应当……
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+# 行首标题/引用/列表标记，以及行内加粗与代码标记
+_LINE_MARK_RE = re.compile(r"(^|\n)[ \t]*(#{1,6}|>|[-*+](?=\s))")
+_INLINE_MARK_RE = re.compile(r"\*\*|`")
+_CJK = r"　-〿㐀-䶿一-鿿豈-﫿＀-￯"
+# 中文字符两侧的空白（多为 PDF 解析引入）直接去掉，其余空白折叠为单个空格
+_CJK_SPACE_RE = re.compile(rf"(?<=[{_CJK}])\s+|\s+(?=[{_CJK}])")
+_SPACE_RE = re.compile(r"\s+")
+_FILE_EXT_RE = re.compile(r"\.(pdf|docx?|txt|md|html?)$", re.IGNORECASE)
+_REF_RE = re.compile(r"\d+")
+
+
+def compact_clause(text: Optional[str]) -> str:
+    """去掉 Markdown 标记与中文间的空白，其余空白折叠为单个空格。"""
+    text = _LINE_MARK_RE.sub(r"\1", text or "")
+    text = _INLINE_MARK_RE.sub("", text)
+    text = _CJK_SPACE_RE.sub("", text.strip())
+    return _SPACE_RE.sub(" ", text)
+
+
+def compact_doc_name(name: Optional[str]) -> str:
+    return _FILE_EXT_RE.sub("", (name or "").strip()) or "未知文件"
+
+
+@dataclass
+class CandidateTable:
+    """一组地方条款共用的国家文件编号表。"""
+
+    documents: Dict[str, str] = field(default_factory=dict)  # 文件名 -> D 编号
+
+    def doc_ref(self, nation_name: str) -> str:
+        name = compact_doc_name(nation_name)
+        if name not in self.documents:
+            self.documents[name] = f"D{len(self.documents) + 1}"
+        return self.documents[name]
+
+    def format(self, segments: Sequence[Dict[str, Any]]) -> str:
+        """segments: [{"nation_name", "clause"}]，按检索顺序编号。"""
+        if not segments:
+            return "（无）"
+        lines = []
+        for i, seg in enumerate(segments, start=1):
+            lines.append(f"[{i}] {self.doc_ref(seg.get('nation_name') or '')} {compact_clause(seg.get('clause'))}")
+        return "\n".join(lines)
+
+    def documents_text(self) -> str:
+        if not self.documents:
+            return ""
+        return "\n".join(f"{ref}={name}" for name, ref in self.documents.items())
+
+
+def format_candidates(segments: Sequence[Dict[str, Any]]) -> str:
+    """单条款请求：文件表与候选表合并为一段文本。"""
+    table = CandidateTable()
+    body = table.format(segments)
+    header = table.documents_text()
+    return f"{header}\n{body}" if header else body
+
+
+def resolve_candidates(parsed: Optional[Dict[str, Any]], segments: Sequence[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """把输出“相似国家条款”中的候选编号还原为 {国家政策文件, 国家政策条款}。
+
+    已经是完整条款的项原样保留；编号越界或重复的项丢弃。
+    """
+    if not parsed:
+        return parsed
+    items = parsed.get("相似国家条款")
+    if not isinstance(items, list):
+        return parsed
+    resolved: List[Dict[str, str]] = []
+    seen = set()
+    for item in items:
+        ref = item.get("候选编号") if isinstance(item, dict) else item
+        if isinstance(item, dict) and ref is None:
+            if item.get("国家政策文件") or item.get("国家政策条款"):
+                resolved.append(item)
+            continue
+        m = _REF_RE.search(str(ref))
+        idx = int(m.group()) if m else 0
+        if not 1 <= idx <= len(segments) or idx in seen:
+            continue
+        seen.add(idx)
+        seg = segments[idx - 1]
+        resolved.append({"国家政策文件": seg.get("nation_name") or "", "国家政策条款": seg.get("clause") or ""})
+    return {**parsed, "相似国家条款": resolved}
@@ -0,0 +1,171 @@
+"""条款分析上下文构建：只向模型发送当前条款的“邻域”，替代整篇地方政策原文。
+
+上下文由三部分组成，按优先级在 token 预算内依次加入：
+1. 所在章节路径（始终保留）；
+2. 相邻条款（按 chunk_index 由近及远，前后交替）；
+3. 定义条款（“本办法所称……是指……”一类的术语解释条款）。
+紧邻的前后各一条优先于定义条款，更远的相邻条款排在定义条款之后。
+输出按文档顺序组织，并记录实际使用的 token 数。
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+# CJK 统一表意文字、兼容区及全角标点
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_DEFINITION_RE = re.compile(r"(所称|是指|系指|的含义|定义如下|术语)")
+# 单条内容截断后至少保留的 token 数，过短的片段没有意义
+_MIN_PARTIAL_TOKENS = 48
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算 token 数：中文按每字 1 个，其余非空白字符按每 4 个字符 1 个。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(re.sub(r"\s+", "", text)) - cjk
+    return cjk + math.ceil(max(other, 0) / 4)
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """按估算规则截断到不超过 budget 个 token。"""
+    used = 0
+    for i, ch in enumerate(text):
+        used += 1 if _CJK_RE.match(ch) else (0 if ch.isspace() else 0.25)
+        if used > budget:
+            return text[:i].rstrip() + "……"
+    return text
+
+
+def _section_text(section_path: Any) -> str:
+    if isinstance(section_path, (list, tuple)):
+        return " > ".join(str(p) for p in section_path if p)
+    return str(section_path or "")
+
+
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    title = chunk.get("title") or ""
+    content = chunk.get("content") or ""
+    return f"{title} {content}".strip()
+
+
+def is_definition_chunk(chunk: Dict[str, Any]) -> bool:
+    return bool(_DEFINITION_RE.search(chunk.get("content") or ""))
+
+
+@dataclass
+class ClauseContext:
+    text: str
+    tokens: int
+    budget: int
+    chunk_indexes: List[int] = field(default_factory=list)
+    definition_indexes: List[int] = field(default_factory=list)
+    truncated: bool = False
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "chunk_indexes": self.chunk_indexes,
+            "definition_indexes": self.definition_indexes,
+            "truncated": self.truncated,
+        }
+
+
+def build_clause_context(
+    chunks: Sequence[Dict[str, Any]],
+    position: int,
+    *,
+    token_budget: int,
+    neighbor_window: int = 2,
+    definitions: Optional[Sequence[Dict[str, Any]]] = None,
+) -> ClauseContext:
+    """为 chunks[position] 构建上下文。
+
+    chunks 需按 chunk_index 排序；definitions 为空时从 chunks 中识别定义条款。
+    """
+    current = chunks[position]
+    current_index = current.get("chunk_index")
+    if definitions is None:
+        definitions = [c for c in chunks if is_definition_chunk(c)]
+
+    header = f"所在章节：{_section_text(current.get('section_path')) or '（无）'}"
+    used = estimate_tokens(header)
+    truncated = False
+
+    # 候选顺序：紧邻前后各一条 → 定义条款 → 更远的相邻条款
+    near: List[Dict[str, Any]] = []
+    far: List[Dict[str, Any]] = []
+    for distance in range(1, max(0, neighbor_window) + 1):
+        for offset in (-distance, distance):
+            idx = position + offset
+            if 0 <= idx < len(chunks):
+                (near if distance == 1 else far).append(chunks[idx])
+    candidates = near + [d for d in definitions if d.get("chunk_index") != current_index] + far
+
+    picked: Dict[Any, str] = {}
+    definition_keys = {d.get("chunk_index") for d in definitions}
+    for chunk in candidates:
+        key = chunk.get("chunk_index")
+        if key in picked:
+            continue
+        text = _chunk_text(chunk)
+        cost = estimate_tokens(text)
+        remaining = token_budget - used
+        if cost <= remaining:
+            picked[key] = text
+            used += cost
+        elif remaining >= _MIN_PARTIAL_TOKENS:
+            partial = _truncate_to_tokens(text, remaining)
+            picked[key] = partial
+            used += estimate_tokens(partial)
+            truncated = True
+        else:
+            truncated = True
+
+    ordered = sorted(picked, key=lambda k: (k is None, k if k is not None else 0))
+    neighbor_lines = [picked[k] for k in ordered if k not in definition_keys]
+    definition_lines = [picked[k] for k in ordered if k in definition_keys]
+
+    parts = [header]
+    if definition_lines:
+        parts.append("定义条款：\n" + "\n".join(definition_lines))
+    if neighbor_lines:
+        parts.append("相邻条款：\n" + "\n".join(neighbor_lines))
+    return ClauseContext(
+        text="\n\n".join(parts),
+        tokens=used,
+        budget=token_budget,
+        chunk_indexes=[k for k in ordered if k not in definition_keys],
+        definition_indexes=[k for k in ordered if k in definition_keys],
+        truncated=truncated,
+    )
+
+
+def plan_batches(
+    item_tokens: Sequence[int],
+    *,
+    token_budget: int,
+    max_items: int,
+    shared_tokens: int = 0,
+) -> List[List[int]]:
+    """按文档顺序贪心分批：每批 shared_tokens + 各条目 token 之和不超过 token_budget，且条目数不超过 max_items。
+
+    单个条目超出预算时单独成批。返回条目下标的分组。
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = shared_tokens
+    for i, tokens in enumerate(item_tokens):
+        if current and (used + tokens > token_budget or len(current) >= max(1, max_items)):
+            batches.append(current)
+            current, used = [], shared_tokens
+        current.append(i)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
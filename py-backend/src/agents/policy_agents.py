@@ -2,11 +2,33 @@
     所有政策对比相关agents和workflows
 """
 
+from typing import Any, Dict, List, Optional
+
+from src import tracing
 from src.agents.agents_factory import AgentFactory
+from src.resilience import get_provider
+from src.settings import LLM_MODEL, LLM_TRIAGE_API_KEY, LLM_TRIAGE_BASE_URL, LLM_TRIAGE_MODEL
+
+# 提示词或输出结构有实质修改时递增，使旧的分析结果缓存失效
+ANALYSIS_PROMPT_VERSION = "v3"
+
+# 模型调用统一经过容错层：单次超时、重试预算、熔断与（可选）对冲请求
+_LLM = get_provider("llm")
+_LLM_TRIAGE = get_provider("llm_triage")
+
+
+async def _run_agent(name:str, system_prompt:str, inputs:Dict[str, Any], output:Dict[str, Any], model_settings:Optional[Dict[str, Any]]=None):
+    """借出一个 agent 执行一次请求。重试与对冲会多次调用本函数，每次使用独立的 agent（各记一个 span）。"""
+    model = (model_settings or {}).get("model") or LLM_MODEL
+    with tracing.span(f"llm.{name}", model=model):
+        async with AgentFactory.acquire(name, system_prompt=system_prompt, model_settings=model_settings) as agent:
+            return await agent \
+                    .input(inputs) \
+                    .output(output) \
+                    .async_start()
 
-async def get_worklow_analysis_result(file_name:str, file_content:str, segment:str, nations_segments:str):
-    agent = AgentFactory.create_agent_by_name("analysis_agent")
-    system_prompt = """
+
+ANALYSIS_SYSTEM_PROMPT = """
 # 角色  
 你是一名政策与制度对比分析师，擅长对比不同层级（如国家与地方、国际与国内、母法与子法、行业与企业标准）文件中对应条款的差异。能根据统一标准判断差异类型，并结合政策逻辑分析差异原因。
 
@@ -21,7 +43,8 @@ async def get_worklow_analysis_result(file_name:str, file_content:str, segment:s
 | **无法比较** | 条款未针对同一事项，或一方为概述性条款、另一方为细则性条款，无法形成直接对比。 |
 
 # 核心任务
-上传的数据包括一条待对比的地方政策条款、该政策文件原文以及检索到的国家政策条款，你需要根据所有信息对“待对比的地方政策条款”与“国家条款”进行一致性检查。
+上传的数据包括一条待对比的地方政策条款、该政策文件原文或与该条款相关的上下文（所在章节、相邻条款与定义条款）以及检索到的国家政策条款，你需要根据所有信息对“待对比的地方政策条款”与“国家条款”进行一致性检查。
+国家政策条款以候选表给出：先列出国家政策文件及其编号（每行一个，如 D1=文件名），每行一条候选，格式为“[候选编号] 文件编号 条款原文”。
 1. 确认地方与国家条款是否针对**同一具体事项**（非泛泛而谈）。若否，判“无法比较”。
 2. 若是同一事项：  
    - 内容矛盾 → **冲突**
@@ -32,34 +55,121 @@ async def get_worklow_analysis_result(file_name:str, file_content:str, segment:s
 3. 差异描述需紧扣原文，明确指出冲突点、缺失内容或超越之处。
 
 # 输出格式（严格保持）
-输出格式为JSON格式，其中需要输出"差异类型"、"差异描述"、"差异关键词"和相似的国家政策条款，如果有多个需要一一列出。
-注意：不要输出无关的国家条款！仅列出与当前地方条款内容实质相似的条款。不存在相似的国家条款，则置为空列表。
+输出格式为JSON格式，其中需要输出"差异类型"、"差异描述"、"差异关键词"和相似的国家政策条款的候选编号，如果有多个需要一一列出。
+注意：不要输出无关的国家条款！仅列出与当前地方条款内容实质相似的条款，且只输出候选编号，不要复述条款原文。不存在相似的国家条款，则置为空列表。
     """
 
+ANALYSIS_OUTPUT_SCHEMA = {
+    "差异类型": "缺失、冲突、超越范围、细化、无差异、无法比较（可多选），String",
+    "差异描述": "根据差异类型的选择生成相应的差异描述。缺失需列明国家原文要求；冲突需说明矛盾点；超越需指出无依据的新增内容。String",
+    "差异关键词": "从该差异描述中提取一个或两个关键词，如（交易结算与保证金）、（信息披露与报备）、（交易申报）等等。String",
+    "相似国家条款": [
+        {
+            "候选编号": "相似国家条款在候选表中的编号（必须来自输入），如 1。String"
+        }
+    ]
+}
+
+
+async def get_worklow_analysis_result(file_name:str, file_content:str, segment:str, nations_segments:str, local_context:Optional[str]=None):
+    """local_context 不为空时只发送条款邻域上下文（见 context_builder），否则发送整篇原文 file_content。"""
     inputs = {
         "地方政策文件":file_name,
         "地方政策条款":segment,
         "检索到的相似国家政策条款":nations_segments,
-        "地方政策原文全文内容":file_content,
     }
+    if local_context is not None:
+        inputs["地方政策相关上下文"] = local_context
+    else:
+        inputs["地方政策原文全文内容"] = file_content
     
-    agent.set_agent_prompt("system", system_prompt)
-    result = await agent \
-            .input(inputs) \
-            .output(
-            {
-                "差异类型": "缺失、冲突、超越范围、细化、无差异、无法比较（可多选），String",
-                "差异描述": "根据差异类型的选择生成相应的差异描述。缺失需列明国家原文要求；冲突需说明矛盾点；超越需指出无依据的新增内容。String",
-                "差异关键词": "从该差异描述中提取一个或两个关键词，如（交易结算与保证金）、（信息披露与报备）、（交易申报）等等。String",
-                "相似国家条款": [
-                    {
-                        "国家政策文件": "国家文件名称。String",
-                        "国家政策条款": "国家政策原文（必须来自输入），需输出完整的国家条款内容。String"
-                    }
-                ]
-            }
-        ).async_start()
+    # 从池中借出 agent（系统提示词在创建时设置一次），可安全并发调用
+    result = await _LLM.acall(
+        lambda: _run_agent("analysis_agent", ANALYSIS_SYSTEM_PROMPT, inputs, ANALYSIS_OUTPUT_SCHEMA)
+    )
+
+    if result:
+        return result
+    return None
+
+
+ANALYSIS_BATCH_SYSTEM_PROMPT = ANALYSIS_SYSTEM_PROMPT + """
+# 批量分析
+本次输入包含多条待对比的地方政策条款，每条带有“条款编号”、条款原文、相关上下文以及为该条检索到的国家政策条款候选表。
+国家政策文件编号表在本批内共用；候选编号在每条地方条款内独立编号，输出的候选编号指当前条款自己的候选表。
+请逐条独立分析（仅使用该条自己的上下文与国家条款），每条输出一个结果并原样回填“条款编号”，不得遗漏、合并或新增条款。
+    """
+
+ANALYSIS_BATCH_OUTPUT_SCHEMA = {
+    "分析结果": [
+        {
+            "条款编号": "与输入一致的条款编号。String",
+            **ANALYSIS_OUTPUT_SCHEMA,
+        }
+    ]
+}
+
+
+async def get_batch_analysis_result(file_name:str, clauses:List[Dict[str, Any]], file_content:Optional[str]=None, national_documents:Optional[str]=None):
+    """一次请求分析多条地方条款。
+
+    clauses: [{"条款编号", "地方政策条款", "检索到的相似国家政策条款", "地方政策相关上下文"(可选)}]
+    national_documents 为本批共用的国家政策文件编号表（见 candidate_table）。
+    file_content 不为空时整篇原文只随本批发送一次。返回模型原始输出（预期为 {"分析结果": [...]}）。
+    """
+    inputs: Dict[str, Any] = {
+        "地方政策文件":file_name,
+    }
+    if national_documents:
+        inputs["国家政策文件编号"] = national_documents
+    inputs["待对比条款列表"] = clauses
+    if file_content:
+        inputs["地方政策原文全文内容"] = file_content
+
+    result = await _LLM.acall(
+        lambda: _run_agent("batch_analysis_agent", ANALYSIS_BATCH_SYSTEM_PROMPT, inputs, ANALYSIS_BATCH_OUTPUT_SCHEMA)
+    )
+
+    if result:
+        return result
+    return None
+
+
+TRIAGE_SYSTEM_PROMPT = """
+# 角色
+你是政策条款一致性初筛员，只判断地方政策条款与检索到的国家政策条款之间是否可能存在实质差异，不需要给出详细分析。
+
+# 判定标准
+- **无差异**：地方条款与国家条款针对同一事项，内容实质一致，仅为语言改写、引用、编号或非实质性调整。
+- **需复核**：存在任何可能的冲突、缺失、新增、细化，或无法确定是否针对同一事项。
+国家政策条款以候选表给出：文件编号表（每行一个，如 D1=文件名）加每行一条“[候选编号] 文件编号 条款原文”。
+拿不准时一律判“需复核”，并给出较低的置信度。
+    """
+
+TRIAGE_OUTPUT_SCHEMA = {
+    "判定": "无差异 或 需复核。String",
+    "置信度": "对判定结果的把握，0 到 1 之间的小数。Number",
+    "理由": "一句话说明判定依据。String",
+}
+
+# 初筛 agent 使用单独配置的小模型（未配置的项沿用全局配置）
+TRIAGE_MODEL_SETTINGS = {
+    "base_url": LLM_TRIAGE_BASE_URL,
+    "model": LLM_TRIAGE_MODEL,
+    "api_key": LLM_TRIAGE_API_KEY,
+}
+
+
+async def get_triage_result(segment:str, nations_segments:str):
+    """小模型初筛：只发送地方条款与候选国家条款，返回 {"判定", "置信度", "理由"}。"""
+    inputs = {
+        "地方政策条款":segment,
+        "检索到的相似国家政策条款":nations_segments,
+    }
+    result = await _LLM_TRIAGE.acall(
+        lambda: _run_agent("triage_agent", TRIAGE_SYSTEM_PROMPT, inputs, TRIAGE_OUTPUT_SCHEMA, TRIAGE_MODEL_SETTINGS)
+    )
 
     if result:
         return result
-    return None
\ No newline at end of file
+    return None
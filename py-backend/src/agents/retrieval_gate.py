@@ -0,0 +1,150 @@
+"""检索结果门控：在调用模型前，按检索距离/得分对条款做确定性分流。
+
+- no_match：没有检索到候选国家条款，或没有任何候选达到匹配阈值，直接判为“无法比较”，不调用模型；
+- identical：最相近的候选距离极小，且文本相似度（difflib）达到阈值，直接判为“无差异”；
+- llm：其余条款照常交给模型分析。
+
+距离取自 WeaviateEngine.search 返回的 `_distance`（仅向量检索，越小越相近）；
+关键词与混合检索只有 `_score`（越大越相近，混合检索为融合得分），此时只能按 min_score 过滤，
+identical 不会触发。两者都缺失（或对应阈值未启用）的候选无法判断，一律保留。
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+ROUTE_LLM = "llm"
+ROUTE_CACHE = "cache"
+ROUTE_NO_MATCH = "no_match"
+ROUTE_IDENTICAL = "identical"
+# 由初筛小模型判定为无差异（见 compare 分级模型）
+ROUTE_TRIAGE = "triage"
+
+# 比较文本相似度前去掉空白、标点与条款编号，避免“第五条”与“第八条”这类编号差异影响判断
+_NORMALIZE_RE = re.compile(r"[\s　-〿＀-／：-＠［-｀｛-･,.;:!?()\[\]\"'`~\-]+")
+_ARTICLE_NO_RE = re.compile(r"^第[一二三四五六七八九十百千零〇两\d]+条")
+
+
+def _distance(result: Dict[str, Any]) -> Optional[float]:
+    value = result.get("_distance")
+    return float(value) if value is not None else None
+
+
+def _score(result: Dict[str, Any]) -> Optional[float]:
+    value = result.get("_score")
+    return float(value) if value is not None else None
+
+
+def is_within_threshold(result: Dict[str, Any], *, max_distance: float, min_score: float) -> bool:
+    """候选是否达到匹配阈值；阈值 <=0 表示不启用该项判断。"""
+    distance = _distance(result)
+    if distance is not None and max_distance > 0:
+        return distance <= max_distance
+    score = _score(result)
+    if score is not None and min_score > 0:
+        return score >= min_score
+    return True
+
+
+def normalize_clause(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    text = _ARTICLE_NO_RE.sub("", text)
+    return _NORMALIZE_RE.sub("", text)
+
+
+def text_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """规范化后的字符级相似度（0~1）。"""
+    na, nb = normalize_clause(a), normalize_clause(b)
+    if not na or not nb:
+        return 0.0
+    return difflib.SequenceMatcher(None, na, nb, autojunk=False).ratio()
+
+
+@dataclass
+class GateDecision:
+    route: str
+    candidates: List[Dict[str, Any]] = field(default_factory=list)
+    rejected: int = 0
+    best_distance: Optional[float] = None
+    best_score: Optional[float] = None
+    similarity: Optional[float] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "rejected": self.rejected,
+            "best_distance": self.best_distance,
+            "best_score": self.best_score,
+            "similarity": self.similarity,
+        }
+
+
+def gate_candidates(
+    clause_text: str,
+    results: Sequence[Dict[str, Any]],
+    *,
+    max_distance: float,
+    min_score: float,
+    identical_max_distance: float,
+    identical_min_similarity: float,
+) -> GateDecision:
+    """过滤未达阈值的候选，并给出分流结果。results 需已按相关度排序。"""
+    distances = [d for d in (_distance(r) for r in results) if d is not None]
+    scores = [s for s in (_score(r) for r in results) if s is not None]
+    kept = [r for r in results if is_within_threshold(r, max_distance=max_distance, min_score=min_score)]
+    decision = GateDecision(
+        route=ROUTE_LLM,
+        candidates=kept,
+        rejected=len(results) - len(kept),
+        best_distance=min(distances) if distances else None,
+        best_score=max(scores) if scores else None,
+    )
+    # 没有检索结果（或全部未达阈值）时模型也只能判“无法比较”
+    if not kept:
+        decision.route = ROUTE_NO_MATCH
+        return decision
+    if identical_max_distance <= 0:
+        return decision
+
+    best = min(kept, key=lambda r: _distance(r) if _distance(r) is not None else float("inf"))
+    best_distance = _distance(best)
+    if best_distance is None or best_distance > identical_max_distance:
+        return decision
+    # 向量距离很小时再做一次文本核对，只有字面也几乎一致才跳过模型
+    decision.similarity = round(text_similarity(clause_text, best.get("text")), 4)
+    if decision.similarity >= identical_min_similarity:
+        decision.route = ROUTE_IDENTICAL
+        decision.candidates = [best]
+    return decision
+
+
+def no_match_analysis(decision: GateDecision) -> Dict[str, Any]:
+    """no_match 的确定性分析结果（与模型输出结构一致）。"""
+    detail = "未检索到相似度达到阈值的国家政策条款"
+    if decision.best_distance is not None:
+        detail += f"（最近候选距离 {decision.best_distance:.3f}）"
+    elif decision.best_score is not None:
+        detail += f"（最高候选得分 {decision.best_score:.3f}）"
+    return {
+        "差异类型": "无法比较",
+        "差异描述": detail + "，未调用模型分析。",
+        "差异关键词": "",
+        "相似国家条款": [],
+    }
+
+
+def identical_analysis(decision: GateDecision, nation_name: str) -> Dict[str, Any]:
+    """identical 的确定性分析结果（与模型输出结构一致）。"""
+    best = decision.candidates[0]
+    return {
+        "差异类型": "无差异",
+        "差异描述": (
+            f"地方条款与国家条款文本相似度 {decision.similarity:.2f}"
+            f"（向量距离 {decision.best_distance:.3f}），内容实质一致，未调用模型分析。"
+        ),
+        "差异关键词": "",
+        "相似国家条款": [{"国家政策文件": nation_name, "国家政策条款": best.get("text") or ""}],
+    }
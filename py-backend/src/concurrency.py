@@ -0,0 +1,69 @@
+"""阻塞调用（SQLite、文件读写、requests / Weaviate 同步 SDK）卸载到线程池，避免卡住事件循环。
+
+- run_blocking: 使用 AnyIO 默认线程池，与 FastAPI 的同步路由 / 同步依赖共用同一容量上限
+  （启动时由 configure_threadpool 按 BLOCKING_IO_MAX_WORKERS 设置）。
+- run_ingest: 上传解析、向量化、回滚等长耗时任务走独立的有界线程池（INGEST_MAX_WORKERS），
+  超出容量的任务在事件循环中排队等待，不占用请求线程。
+两者都在调用方 contextvars 上下文的副本中执行；请求开启 cProfile 剖析时（src/profiling.py），
+卸载的调用在线程内单独剖析并计入该请求。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+import anyio.to_thread
+
+from src import profiling
+from src.settings import BLOCKING_IO_MAX_WORKERS, INGEST_MAX_WORKERS
+
+T = TypeVar("T")
+
+_ingest_executor: Optional[ThreadPoolExecutor] = None
+_ingest_lock = threading.Lock()
+
+
+def configure_threadpool() -> None:
+    """设置 AnyIO 默认线程池容量；需在事件循环内调用（应用启动时）。"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = max(1, BLOCKING_IO_MAX_WORKERS)
+
+
+def _get_ingest_executor() -> ThreadPoolExecutor:
+    global _ingest_executor
+    if _ingest_executor is None:
+        with _ingest_lock:
+            if _ingest_executor is None:
+                _ingest_executor = ThreadPoolExecutor(
+                    max_workers=max(1, INGEST_MAX_WORKERS), thread_name_prefix="ingest"
+                )
+    return _ingest_executor
+
+
+def _bind(func: Callable[..., T], args: Any, kwargs: Any) -> Callable[[], T]:
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    profile = profiling.current()
+    return profile.wrap(call) if profile is not None else call
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在请求线程池中执行同步函数。"""
+    return await anyio.to_thread.run_sync(_bind(func, args, kwargs))
+
+
+async def run_ingest(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在独立的 ingest 线程池中执行长耗时同步任务。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_ingest_executor(), _bind(func, args, kwargs))
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    global _ingest_executor
+    with _ingest_lock:
+        if _ingest_executor is not None:
+            _ingest_executor.shutdown(wait=wait, cancel_futures=True)
+            _ingest_executor = None
@@ -66,6 +66,9 @@ import os
 import re
 from typing import Any, Dict, List, Optional, Union
 
+from src.stages import stage
+from src.storage.article_no import ARTICLE_NUMERALS
+
 __all__ = ["build_segments_struct", "format_segments_output"]
 
 
@@ -239,14 +242,16 @@ def build_segments_struct(file_content: str, file_name: Optional[str] = None) ->
     if not file_content:
         return {"title": ("" if not file_name else _extract_document_title(file_name, "") or ""), "segments": []}
 
-    content = _normalize_text(file_content)
+    with stage("normalize", input_size=len(file_content)) as st:
+        content = _normalize_text(file_content)
+        st.output_size = len(content)
     title = _extract_document_title(file_name, content) or ""
 
     # === 第二版功能：支持中英文括号的正则表达式 ===
     # 传统格式
     chapter_heading_re = re.compile(r"^\s*第\s*[一二三四五六七八九十百千O0-9０-９]+\s*章[^\n]*", re.M)
     section_heading_re = re.compile(r"^\s*第\s*[一二三四五六七八九十百千O0-9０-９]+\s*节[^\n]*", re.M)
-    article_heading_re = re.compile(r"^\s*第\s*[一二三四五六七八九十百千零O0-9０-９]+\s*条[^\n]*", re.M)
+    article_heading_re = re.compile(rf"^\s*第\s*[{ARTICLE_NUMERALS}]+\s*条[^\n]*", re.M)
 
     # 三级标题格式
     level1_heading_re = re.compile(r"^\s*[一二三四五六七八九十百千]+、[^\n]*", re.M)  # 一、二、三、
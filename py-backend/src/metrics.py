@@ -0,0 +1,319 @@
+"""进程内指标聚合，以 Prometheus 文本格式在 /metrics 输出。
+
+不依赖 prometheus_client：计数器 / 直方图按标签值元组保存在字典中，每次更新只做一次加锁的
+数值累加（直方图再加一次二分查找），渲染时才计算累计桶。多实例部署时由 Prometheus 分别抓取
+每个实例（多 worker 进程时各 worker 的指标相互独立）。
+
+指标：
+  http_requests_total / http_request_duration_seconds       按路由模板与方法、状态码
+  http_requests_in_progress
+  external_request_duration_seconds{dependency,operation,outcome}
+      dependency：zhipu / siliconflow / llm / llm_triage（src/resilience.py 每次尝试）、
+      向量库（VECTOR_BACKEND，检索与写入）
+  upstream_circuit_state{provider}                           0 关闭 / 1 半开 / 2 熔断
+  embedding_batch_size                                       每次向 SiliconFlow 请求的文本条数
+  embeddings_requested_total                                 需要向量的文本条数
+  llm_tokens_total{model,direction}                          上游返回的 usage（in=prompt，out=completion）
+  compare_clauses_analyzed_total{route}                      条款对比分流结果
+  analysis_cache_lookups_total{result}                       对比结果缓存命中 / 未命中
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Sequence[str]) -> Tuple[str, ...]:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(values)}")
+        return tuple(str(v) for v in values)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(_Metric):
+    """数值型或回调型（渲染时调用 fn，返回 {标签值元组: 数值}）。"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        fn: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._fn = fn
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        if self._fn is not None:
+            try:
+                items = sorted((self._key(k), float(v)) for k, v in self._fn().items())
+            except Exception as exc:
+                print(f"[metrics] gauge {self.name} callback failed: {exc}")
+                items = []
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # 标签值 -> [各桶计数（非累计，最后一个为 +Inf）, 总和, 次数]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """清空所有数值（测试用）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+
+def _counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def _histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+def _gauge(name: str, documentation: str, labelnames: Sequence[str] = (), fn=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, fn))  # type: ignore[return-value]
+
+
+HTTP_REQUESTS = _counter("http_requests_total", "HTTP requests by route template, method and status.", ("method", "route", "status"))
+HTTP_LATENCY = _histogram("http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route"))
+HTTP_IN_PROGRESS = _gauge("http_requests_in_progress", "HTTP requests currently being served.")
+EXTERNAL_LATENCY = _histogram(
+    "external_request_duration_seconds",
+    "Latency of calls to external dependencies, one observation per attempt.",
+    ("dependency", "operation", "outcome"),
+)
+EMBEDDING_BATCH_SIZE = _histogram("embedding_batch_size", "Texts per embedding request sent upstream.", (), SIZE_BUCKETS)
+EMBEDDINGS_REQUESTED = _counter("embeddings_requested_total", "Texts that needed an embedding vector.")
+LLM_TOKENS = _counter("llm_tokens_total", "LLM tokens reported by the upstream usage field.", ("model", "direction"))
+COMPARE_CLAUSES = _counter("compare_clauses_analyzed_total", "Compared clauses by route.", ("route",))
+ANALYSIS_CACHE_LOOKUPS = _counter("analysis_cache_lookups_total", "Compare analysis cache lookups.", ("result",))
+STAGE_LOG_DROPPED = _counter("stage_log_rows_dropped_total", "Stage timing rows lost because the process_logs write failed.")
+
+
+def register_gauge(name: str, documentation: str, labelnames: Sequence[str], fn: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+    """注册回调型 gauge（如熔断状态、缓存条目数），渲染时取值。"""
+    return _gauge(name, documentation, labelnames, fn)
+
+
+@contextmanager
+def time_external(dependency: str, operation: str) -> Iterator[None]:
+    """记录一次外部调用耗时；异常时 outcome=error 并继续抛出。"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - started, dependency, operation, outcome)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：按路由模板（而非原始路径，避免标签基数膨胀）统计请求数与耗时。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(1, method, template, str(status["code"]))
+            HTTP_LATENCY.observe(elapsed, method, template)
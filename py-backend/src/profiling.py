@@ -0,0 +1,441 @@
+"""按请求开启的性能剖析（调试用），结果写入 storage/tmp/profiles/<profile-id>/。
+
+开启条件（缺一不可）：
+  1. 管理员设置 PROFILING_ENABLED=true（否则中间件不挂载，请求标记被忽略）；
+  2. 请求带 `X-Profile: 1|sample|cprofile` 头，或 `?profile=1|sample|cprofile` 查询参数；
+  3. 配置了 PROFILING_TOKEN 时须带匹配的 `X-Profile-Token` 头；未配置时仅接受本机（回环地址）请求；
+  4. 仅剖析 /api/ 下的路由，且同时进行的剖析不超过 PROFILING_MAX_CONCURRENT 个（cProfile 模式同一时刻只允许一个）。
+不满足 2 以外的条件时请求照常处理，响应头 `X-Profile-Skipped` 给出原因；开始剖析时响应头带 `X-Profile-Id`。
+
+两种模式：
+  sample   采样（默认）：后台线程每 PROFILING_SAMPLE_INTERVAL_MS 毫秒抓取一次所有线程的调用栈，
+           输出 stacks.collapsed（flamegraph.pl / speedscope 可直接读取的折叠栈）与 summary.txt。
+           采样范围是整个进程（事件循环线程 + 线程池），空闲的线程池线程不计入；同时有其他请求时
+           它们的开销也会出现在结果里。采样线程需要拿到 GIL 才能抓栈，释放 GIL 的位置（I/O、os.urandom
+           等）会被偏多采到，self 计数应结合 inclusive 计数阅读。最多采样 PROFILING_MAX_SECONDS 秒。
+  cprofile 确定性：在事件循环线程上开启 cProfile，并对本请求经 run_blocking / run_ingest 卸载到线程池的
+           调用分别开启 cProfile，结束后合并为 profile.pstats（python -m pstats 或 snakeviz 打开）与
+           summary.txt。FastAPI 的同步路由 / 同步依赖不经过 run_blocking，不在统计范围内。
+
+目录内另有 meta.json（请求方法、路径、状态码、耗时等）；最多保留 PROFILING_MAX_PROFILES 个，超出时删除最旧的。
+查看 / 下载 / 删除见 GET /api/system/profiles。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import pstats
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+import anyio.to_thread
+
+from src.settings import (
+    PROFILING_DEFAULT_MODE,
+    PROFILING_MAX_CONCURRENT,
+    PROFILING_MAX_PROFILES,
+    PROFILING_MAX_SECONDS,
+    PROFILING_SAMPLE_INTERVAL_MS,
+    PROFILING_TOKEN,
+)
+
+MODES = ("sample", "cprofile")
+PROFILE_HEADER = "x-profile"
+TOKEN_HEADER = "x-profile-token"
+FILES = ("meta.json", "summary.txt", "stacks.collapsed", "profile.pstats")
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+_TRUTHY = {"1", "true", "yes", "on"}
+_MAX_STACK_DEPTH = 128
+_SUMMARY_ROWS = 60
+# 空闲线程池线程的最内层帧：(文件名结尾, 函数名)
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("concurrent/futures/thread.py", "_worker"),
+    ("selectors.py", "select"),
+}
+
+_ACTIVE: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+_slots_lock = threading.Lock()
+_running = 0
+_cprofile_running = False
+_BACKEND_ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def profiles_dir() -> Path:
+    from src.storage.db import get_storage_root
+
+    return get_storage_root() / "tmp" / "profiles"
+
+
+def current() -> Optional["RequestProfile"]:
+    return _ACTIVE.get()
+
+
+def is_authorized(token: Optional[str], client_host: Optional[str]) -> bool:
+    """配置了 PROFILING_TOKEN 时比对令牌，否则只接受本机请求。"""
+    if PROFILING_TOKEN:
+        return bool(token) and hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+    return (client_host or "") in _LOOPBACK
+
+
+def requested_mode(headers: Dict[str, str], query_string: str) -> Optional[str]:
+    """解析请求的剖析标记；未请求时返回 None，"1/true" 等取 PROFILING_DEFAULT_MODE。"""
+    value = headers.get(PROFILE_HEADER)
+    if value is None:
+        values = parse_qs(query_string).get("profile")
+        value = values[0] if values else None
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in MODES:
+        return value
+    if value in _TRUTHY:
+        return PROFILING_DEFAULT_MODE if PROFILING_DEFAULT_MODE in MODES else "sample"
+    return None
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_ROOT):
+        filename = filename[len(_BACKEND_ROOT) + 1:]
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages", 1)[1].lstrip("/\\")
+    else:
+        filename = "/".join(Path(filename).parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/")
+    return any(filename.endswith(suffix) and code.co_name == name for suffix, name in _IDLE_FRAMES)
+
+
+class _Sampler(threading.Thread):
+    """定时抓取所有线程调用栈，按折叠栈计数。"""
+
+    def __init__(self, interval: float, max_seconds: float, loop_thread: int):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.loop_thread = loop_thread
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.truncated = False
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop_event.wait(self.interval):
+            if time.monotonic() > deadline:
+                self.truncated = True
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                is_loop = ident == self.loop_thread
+                if not is_loop and _is_idle(frame):
+                    continue
+                labels: List[str] = []
+                while frame is not None and len(labels) < _MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                root = "event_loop" if is_loop else f"thread:{names.get(ident, ident)}"
+                labels.append(root)
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfile:
+    """单个请求的剖析状态；start / stop 在事件循环线程调用，save 可放到线程池。"""
+
+    def __init__(self, profile_id: str, mode: str, method: str, path: str):
+        self.profile_id = profile_id
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_ms: Optional[float] = None
+        self._started = 0.0
+        self._sampler: Optional[_Sampler] = None
+        self._loop_profiler: Optional[cProfile.Profile] = None
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self.mode == "sample":
+            self._sampler = _Sampler(
+                max(0.001, PROFILING_SAMPLE_INTERVAL_MS / 1000.0),
+                PROFILING_MAX_SECONDS,
+                threading.get_ident(),
+            )
+            self._sampler.start()
+        else:
+            self._loop_profiler = cProfile.Profile()
+            self._loop_profiler.enable()
+
+    def stop(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._loop_profiler is not None:
+            self._loop_profiler.disable()
+            with self._lock:
+                self._profilers.insert(0, self._loop_profiler)
+
+    def wrap(self, call: Callable[[], Any]) -> Callable[[], Any]:
+        """cprofile 模式下让卸载到线程池的调用在独立的 cProfile 中执行（采样模式无需处理）。"""
+        if self.mode != "cprofile":
+            return call
+
+        def _run():
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return call()
+            finally:
+                profiler.disable()
+                with self._lock:
+                    self._profilers.append(profiler)
+
+        return _run
+
+    def save(self) -> Path:
+        target = profiles_dir() / self.profile_id
+        target.mkdir(parents=True, exist_ok=True)
+        meta: Dict[str, Any] = {
+            "id": self.profile_id,
+            "mode": self.mode,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "duration_ms": round(self.duration_ms or 0.0, 1),
+        }
+        if self._sampler is not None:
+            meta.update(self._save_samples(target))
+        else:
+            meta.update(self._save_pstats(target))
+        meta["files"] = [name for name in FILES if (target / name).exists() or name == "meta.json"]
+        (target / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        _prune()
+        return target
+
+    def _save_samples(self, target: Path) -> Dict[str, Any]:
+        sampler = self._sampler
+        assert sampler is not None
+        stacks = sampler.stacks.most_common()
+        (target / "stacks.collapsed").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in stacks), encoding="utf-8"
+        )
+        # 按函数统计自身（位于最内层）与累计（出现在栈内）的样本数，每个线程每次采样计一次
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in stacks:
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames[1:]):
+                inclusive[label] += count
+        lines = [
+            f"{self.method} {self.path}  status={self.status}  {self.duration_ms or 0:.1f} ms",
+            f"samples={sampler.samples} interval={sampler.interval * 1000:.1f}ms truncated={sampler.truncated}",
+            "",
+            "inclusive  self  function (top by self)",
+        ]
+        lines += [f"{inclusive[label]:>9}  {n:>4}  {label}" for label, n in own.most_common(_SUMMARY_ROWS)]
+        lines += ["", "inclusive  function (top by inclusive)"]
+        lines += [f"{n:>9}  {label}" for label, n in inclusive.most_common(_SUMMARY_ROWS)]
+        (target / "summary.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return {
+            "samples": sampler.samples,
+            "sample_interval_ms": PROFILING_SAMPLE_INTERVAL_MS,
+            "truncated": sampler.truncated,
+        }
+
+    def _save_pstats(self, target: Path) -> Dict[str, Any]:
+        with self._lock:
+            profilers = list(self._profilers)
+        stats: Optional[pstats.Stats] = None
+        for profiler in profilers:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profiler)
+                else:
+                    stats.add(profiler)
+            except TypeError:
+                # 没有任何调用记录的 profiler
+                continue
+        if stats is None:
+            return {"threads_profiled": len(profilers)}
+        stats.dump_stats(str(target / "profile.pstats"))
+        buffer = io.StringIO()
+        stats.stream = buffer
+        buffer.write(f"{self.method} {self.path}  status={self.status}  {self.duration_ms or 0:.1f} ms\n")
+        stats.sort_stats("cumulative").print_stats(_SUMMARY_ROWS)
+        stats.sort_stats("tottime").print_stats(_SUMMARY_ROWS)
+        (target / "summary.txt").write_text(buffer.getvalue(), encoding="utf-8")
+        return {"threads_profiled": len(profilers)}
+
+
+def _acquire(mode: str) -> bool:
+    global _running, _cprofile_running
+    with _slots_lock:
+        if _running >= max(1, PROFILING_MAX_CONCURRENT):
+            return False
+        # 同一线程上只能有一个 cProfile，事件循环线程是共享的
+        if mode == "cprofile":
+            if _cprofile_running:
+                return False
+            _cprofile_running = True
+        _running += 1
+        return True
+
+
+def _release(mode: str) -> None:
+    global _running, _cprofile_running
+    with _slots_lock:
+        _running -= 1
+        if mode == "cprofile":
+            _cprofile_running = False
+
+
+def _prune() -> None:
+    root = profiles_dir()
+    try:
+        entries = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    except FileNotFoundError:
+        return
+    for stale in entries[max(1, PROFILING_MAX_PROFILES):]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def _new_profile_id(request_id: Optional[str]) -> str:
+    base = request_id if request_id and _ID_RE.match(request_id) else uuid4().hex
+    if (profiles_dir() / base).exists():
+        base = f"{base}-{uuid4().hex[:8]}"
+    return base
+
+
+def valid_profile_id(profile_id: str) -> bool:
+    return bool(_ID_RE.match(profile_id)) and profile_id not in {".", ".."}
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    root = profiles_dir()
+    if not root.exists():
+        return []
+    items: List[Tuple[float, Dict[str, Any]]] = []
+    for entry in root.iterdir():
+        meta_path = entry / "meta.json"
+        if not meta_path.is_file():
+            continue
+        try:
+            items.append((meta_path.stat().st_mtime, json.loads(meta_path.read_text(encoding="utf-8"))))
+        except (OSError, ValueError):
+            continue
+    return [meta for _, meta in sorted(items, key=lambda kv: kv[0], reverse=True)]
+
+
+def profile_path(profile_id: str, name: str = "meta.json") -> Optional[Path]:
+    """返回剖析结果文件路径；id 或文件名非法、文件不存在时返回 None。"""
+    if not valid_profile_id(profile_id) or name not in FILES:
+        return None
+    path = profiles_dir() / profile_id / name
+    return path if path.is_file() else None
+
+
+def delete_profile(profile_id: str) -> bool:
+    if not valid_profile_id(profile_id):
+        return False
+    target = profiles_dir() / profile_id
+    if not target.is_dir():
+        return False
+    shutil.rmtree(target, ignore_errors=True)
+    return True
+
+
+def _add_header(message: Dict[str, Any], name: str, value: str) -> None:
+    message["headers"] = list(message.get("headers") or []) + [(name.encode("latin-1"), value.encode("latin-1"))]
+
+
+class ProfilingMiddleware:
+    """ASGI 中间件：仅在请求显式要求且通过校验时剖析，其余请求只多一次请求头查找。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or []}
+        mode = requested_mode(headers, (scope.get("query_string") or b"").decode("latin-1"))
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        path = scope.get("path", "")
+        skipped: Optional[str] = None
+        if not path.startswith("/api/") or path.startswith("/api/system/profiles"):
+            skipped = "path"
+        elif not is_authorized(headers.get(TOKEN_HEADER), client[0] if client else None):
+            skipped = "forbidden"
+        elif not _acquire(mode):
+            skipped = "busy"
+        if skipped is not None:
+
+            async def _send_skipped(message):
+                if message["type"] == "http.response.start":
+                    _add_header(message, "X-Profile-Skipped", skipped)
+                await send(message)
+
+            await self.app(scope, receive, _send_skipped)
+            return
+
+        profile = RequestProfile(_new_profile_id(headers.get("x-request-id")), mode, scope.get("method", ""), path)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                _add_header(message, "X-Profile-Id", profile.profile_id)
+            await send(message)
+
+        token = _ACTIVE.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profile.stop()
+            _ACTIVE.reset(token)
+            try:
+                await anyio.to_thread.run_sync(profile.save)
+            except Exception as exc:
+                print(f"[profiling] failed to save profile {profile.profile_id}: {exc}")
+            finally:
+                _release(mode)
+
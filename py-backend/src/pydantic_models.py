@@ -68,6 +68,8 @@ class WeaviateSearchRequest(BaseModel):
     client_params: Optional[Dict[str, Any]] = None
     filter_conditions: Optional[List[Dict[str, Any]]] = None
     filters: Optional[Dict[str, Any]] = None
+    # hybrid（默认）/ keyword / vector 走 Weaviate；local 走本地 SQLite FTS5 全文索引
+    search_type: Optional[Literal["hybrid", "keyword", "vector", "local"]] = None
 
 
 class EmbeddingRequest(BaseModel):
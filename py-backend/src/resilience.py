@@ -0,0 +1,434 @@
+"""外部服务调用的统一容错层：单次调用超时、重试预算、熔断与 LLM 对冲请求。
+
+每个上游（zhipu / siliconflow / llm / llm_triage）对应一个 Provider：
+- 超时：同步 HTTP 调用把 provider.timeout 传给 requests；异步调用用 asyncio.wait_for 强制截止。
+- 重试：仅对可重试错误（超时、连接错误、5xx/429）按指数退避重试，且受重试预算限制——
+  每次成功调用只存入 RETRY_BUDGET_RATIO 个重试令牌，上游整体故障时重试不会成倍放大流量。
+- 熔断：连续 CIRCUIT_FAILURE_THRESHOLD 次可重试错误后打开，CIRCUIT_RESET_SECONDS 内直接抛出
+  CircuitOpenError；到期后放行一个探测请求（half_open），成功则关闭。
+- 对冲（仅异步调用，LLM_HEDGE_ENABLED）：首个请求超过近期 p95 耗时仍未返回时再发一个相同请求，
+  取先成功者，另一个取消。对冲同样消耗重试令牌。
+
+同步 HTTP 调用按上游复用 requests.Session（keep-alive 连接池），避免每次调用重新建立 TCP / TLS 连接。
+
+状态与计数通过 /api/system/resilience 查看；每次尝试的耗时另计入 /metrics 的
+external_request_duration_seconds，熔断状态为 upstream_circuit_state。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import metrics, tracing
+from src.settings import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_MAX_ATTEMPTS,
+    LLM_TIMEOUT_SECONDS,
+    RETRY_BUDGET_RATIO,
+    SILICONFLOW_TIMEOUT_SECONDS,
+    UPSTREAM_MAX_ATTEMPTS,
+    ZHIPU_TIMEOUT_SECONDS,
+)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 重试令牌上限与初始值
+_BUDGET_CAPACITY = 10.0
+_BUDGET_INITIAL = 3.0
+_BACKOFF_BASE_SECONDS = 0.5
+_BACKOFF_MAX_SECONDS = 8.0
+# 计算对冲延迟所用的最近成功耗时样本数
+_LATENCY_WINDOW = 200
+_CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# 每个上游 Session 保留的 keep-alive 连接数（与入库 / 对比的并发量同一量级）
+_HTTP_POOL_SIZE = 16
+
+
+def _outcome(exc: Optional[BaseException]) -> str:
+    if exc is None:
+        return "ok"
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, requests.Timeout)):
+        return "timeout"
+    return "error"
+
+
+class UpstreamError(RuntimeError):
+    """上游服务调用失败。retryable 表示可重试（超时、连接错误、5xx/429）。"""
+
+    def __init__(self, message: str, *, retryable: bool = True, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class CircuitOpenError(UpstreamError):
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} 熔断中，{retry_after:.0f}s 后重试", retryable=False)
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamError, TimeoutError):
+    pass
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, UpstreamError):
+        return exc.retryable
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError, requests.Timeout, requests.ConnectionError))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self, now: float) -> Tuple[bool, float]:
+        """返回 (是否放行, 距离下次探测的秒数)。调用方持有 Provider 锁。"""
+        if self.state == CLOSED:
+            return True, 0.0
+        remaining = self.opened_at + self.reset_seconds - now
+        if self.state == OPEN and remaining <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True, 0.0
+        return False, max(remaining, 0.0)
+
+    def on_success(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self, now: float) -> bool:
+        """记录一次可重试错误；返回是否因此打开熔断。"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            opened = self.state != OPEN
+            self.state = OPEN
+            self.opened_at = now
+            return opened
+        return False
+
+    def on_neutral(self) -> None:
+        """不可重试错误（如 4xx）说明上游可达，只释放探测名额，不计入失败。"""
+        self._probe_in_flight = False
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        *,
+        timeout: float,
+        max_attempts: int,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.0,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self._lock = threading.Lock()
+        self._budget = _BUDGET_INITIAL
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.counters: Dict[str, int] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "timeouts": 0,
+            "short_circuited": 0,
+            "circuit_opened": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    # ---- 状态记录（同步调用在线程池中执行，统一加锁） ----
+    def _incr(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def _admit(self) -> None:
+        with self._lock:
+            self.counters["calls"] += 1
+            allowed, retry_after = self.breaker.allow(time.monotonic())
+            if not allowed:
+                self.counters["short_circuited"] += 1
+                raise CircuitOpenError(self.name, retry_after)
+
+    def _observe(self, elapsed: float, exc: Optional[BaseException] = None) -> None:
+        metrics.EXTERNAL_LATENCY.observe(elapsed, self.name, "request", _outcome(exc))
+
+    def _on_success(self, elapsed: float) -> None:
+        self._observe(elapsed)
+        with self._lock:
+            self.counters["successes"] += 1
+            self.breaker.on_success()
+            self._budget = min(_BUDGET_CAPACITY, self._budget + RETRY_BUDGET_RATIO)
+            self._latencies.append(elapsed)
+
+    def _on_failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            if isinstance(exc, (TimeoutError, asyncio.TimeoutError, requests.Timeout)):
+                self.counters["timeouts"] += 1
+            if _is_retryable(exc):
+                if self.breaker.on_failure(time.monotonic()):
+                    self.counters["circuit_opened"] += 1
+            else:
+                self.breaker.on_neutral()
+
+    def _on_abandoned(self) -> None:
+        """调用被取消或以非 Exception 中断（客户端断开、对冲落败、外层超时）：结果未知，只释放探测名额。"""
+        with self._lock:
+            self.breaker.on_neutral()
+
+    def _take_token(self, key: str) -> bool:
+        with self._lock:
+            if self._budget >= 1.0:
+                self._budget -= 1.0
+                self.counters[key] += 1
+                return True
+            if key == "retries":
+                self.counters["retries_denied"] += 1
+            return False
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else 0.0
+        return max(self.hedge_min_delay, p95)
+
+    # ---- 同步调用（requests） ----
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """执行同步调用；func 自行使用 self.timeout 作为请求超时。"""
+        attempt = 0
+        while True:
+            self._admit()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                self._observe(time.monotonic() - started, exc)
+                self._on_failure(exc)
+                attempt += 1
+                if not _is_retryable(exc) or attempt >= self.max_attempts or not self._take_token("retries"):
+                    raise
+                time.sleep(self._backoff(attempt - 1))
+                continue
+            except BaseException:
+                self._on_abandoned()
+                raise
+            self._on_success(time.monotonic() - started)
+            return result
+
+    # ---- 异步调用（LLM） ----
+    async def _attempt(self, factory: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(factory(), timeout=self.timeout)
+        except asyncio.TimeoutError as exc:
+            err = DeadlineExceeded(f"{self.name} 调用超过 {self.timeout:.0f}s 未返回")
+            self._observe(time.monotonic() - started, err)
+            self._on_failure(err)
+            raise err from exc
+        except Exception as exc:
+            self._observe(time.monotonic() - started, exc)
+            self._on_failure(exc)
+            raise
+        except BaseException:
+            # 取消（CancelledError）不代表上游故障，但必须释放半开状态下的探测名额，否则熔断永远无法恢复
+            self._on_abandoned()
+            raise
+        self._on_success(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]]) -> T:
+        primary = asyncio.ensure_future(self._attempt(factory))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if done or not self._take_token("hedges"):
+            return await primary
+        backup = asyncio.ensure_future(self._attempt(factory))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._incr("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """执行异步调用；factory 每次调用都需返回一个新的协程（重试与对冲会多次调用）。"""
+        attempt = 0
+        while True:
+            self._admit()
+            try:
+                if self.hedge:
+                    return await self._hedged(factory)
+                return await self._attempt(factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                attempt += 1
+                if not _is_retryable(exc) or attempt >= self.max_attempts or not self._take_token("retries"):
+                    raise
+            await asyncio.sleep(self._backoff(attempt - 1))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.breaker.on_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            breaker = self.breaker
+            state = breaker.state
+            retry_after = max(0.0, breaker.opened_at + breaker.reset_seconds - now) if state == OPEN else 0.0
+            samples = sorted(self._latencies)
+            return {
+                "state": state,
+                "retry_after_seconds": round(retry_after, 1),
+                "consecutive_failures": breaker.consecutive_failures,
+                "timeout_seconds": self.timeout,
+                "max_attempts": self.max_attempts,
+                "retry_budget": round(self._budget, 2),
+                "hedge": self.hedge,
+                "latency_p50_ms": round(samples[len(samples) // 2] * 1000, 1) if samples else None,
+                "latency_p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 1) if len(samples) >= 20 else None,
+                "counters": dict(self.counters),
+            }
+
+
+_PROVIDERS: Dict[str, Provider] = {
+    "zhipu": Provider("zhipu", timeout=ZHIPU_TIMEOUT_SECONDS, max_attempts=UPSTREAM_MAX_ATTEMPTS),
+    "siliconflow": Provider("siliconflow", timeout=SILICONFLOW_TIMEOUT_SECONDS, max_attempts=UPSTREAM_MAX_ATTEMPTS),
+    "llm": Provider(
+        "llm",
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_attempts=LLM_MAX_ATTEMPTS,
+        hedge=LLM_HEDGE_ENABLED,
+        hedge_min_delay=LLM_HEDGE_MIN_DELAY_SECONDS,
+    ),
+    # 初筛小模型单独熔断，避免其故障影响大模型调用
+    "llm_triage": Provider("llm_triage", timeout=LLM_TIMEOUT_SECONDS, max_attempts=1),
+}
+
+
+metrics.register_gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half open, 2 open).",
+    ("provider",),
+    lambda: {(name,): _CIRCUIT_STATE_VALUES[p.breaker.state] for name, p in _PROVIDERS.items()},
+)
+
+
+def get_provider(name: str) -> Provider:
+    return _PROVIDERS[name]
+
+
+def providers() -> Dict[str, Provider]:
+    return dict(_PROVIDERS)
+
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _session(provider: str) -> requests.Session:
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+
+def close_sessions() -> None:
+    """关闭各上游的连接池（应用退出时调用）。"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def send(provider: str, method: str, url: str, *, message: str, **kwargs: Any) -> requests.Response:
+    """发送一次 HTTP 请求（超时取 provider.timeout），失败统一转换为 UpstreamError。
+
+    超时 → DeadlineExceeded；连接错误与 5xx/429 可重试；其余非 2xx 不可重试。
+    需配合 get_provider(provider).call 使用才有重试与熔断。
+    """
+    kwargs.setdefault("timeout", _PROVIDERS[provider].timeout)
+    with tracing.span(f"http.{provider}", method=method, url=url.split("?", 1)[0]) as sp:
+        parent = tracing.traceparent_for(url)
+        if parent:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "traceparent": parent}
+        try:
+            resp = _session(provider).request(method, url, **kwargs)
+        except requests.Timeout as exc:
+            raise DeadlineExceeded(f"{provider} {message}: 请求超时") from exc
+        except requests.RequestException as exc:
+            raise UpstreamError(f"{provider} {message}: {exc}") from exc
+        sp.set("status", resp.status_code)
+    if not resp.ok:
+        raise UpstreamError(
+            f"{provider} {message}({resp.status_code}): {resp.text[:200]}",
+            retryable=is_retryable_status(resp.status_code),
+            status_code=resp.status_code,
+        )
+    return resp
+
+
+__all__ = [
+    "CircuitOpenError",
+    "DeadlineExceeded",
+    "Provider",
+    "UpstreamError",
+    "close_sessions",
+    "get_provider",
+    "providers",
+    "send",
+]
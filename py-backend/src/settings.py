@@ -23,6 +23,7 @@ DEFAULT_COLLECTION_NAME: str = os.getenv("DEFAULT_COLLECTION_NAME", "policy_docu
 
 # SiliconFlow
 SILICONFLOW_API_TOKEN: str | None = os.getenv("SILICONFLOW_API_TOKEN")
+SILICONFLOW_API_BASE_URL: str = os.getenv("SILICONFLOW_API_BASE_URL", "https://api.siliconflow.cn/v1")
 
 # Weaviate defaults
 WEAVIATE_HTTP_HOST: str = os.getenv("WEAVIATE_HTTP_HOST", "115.190.118.177")
@@ -35,6 +36,9 @@ WEAVIATE_GRPC_SECURE: bool = _env_bool("WEAVIATE_GRPC_SECURE", False)
 
 WEAVIATE_API_KEY: str = os.getenv("WEAVIATE_API_KEY", "key_kunkun")
 
+# Vector store backend: "weaviate" (default) or "memory" (in-process store for offline runs / load tests)
+VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "weaviate").strip().lower()
+
 # Zhipu BigModel
 ZHIPU_API_TOKEN: str | None = os.getenv("ZHIPU_API_TOKEN")
 ZHIPU_UPLOAD_URL: str = os.getenv(
@@ -48,4 +52,123 @@ ZHIPU_RESULT_BASE: str = os.getenv(
 
 # Storage root (optional). Defaults to <project>/storage
 DEFAULT_STORAGE_ROOT: Path = (Path(__file__).resolve().parents[1] / "storage").resolve()
-STORAGE_ROOT: Path = Path(os.getenv("STORAGE_ROOT", str(DEFAULT_STORAGE_ROOT))).resolve()
\ No newline at end of file
+STORAGE_ROOT: Path = Path(os.getenv("STORAGE_ROOT", str(DEFAULT_STORAGE_ROOT))).resolve()
+# 文档解析产物与分段列表的 HTTP 缓存：浏览器无需校验即可复用的秒数；0 表示每次用 ETag 校验（未变化时返回 304）
+DOCUMENT_CACHE_MAX_AGE_SECONDS: int = int(os.getenv("DOCUMENT_CACHE_MAX_AGE_SECONDS", "0"))
+
+# Thread pools for blocking work (SQLite, file I/O, requests/Weaviate SDK calls)
+# 同步路由与 run_blocking 共用的请求线程池大小（AnyIO 默认 40）
+BLOCKING_IO_MAX_WORKERS: int = int(os.getenv("BLOCKING_IO_MAX_WORKERS", "16"))
+# 上传解析 / 向量化等长耗时任务使用独立线程池，避免占满请求线程池
+INGEST_MAX_WORKERS: int = int(os.getenv("INGEST_MAX_WORKERS", "2"))
+
+# LLM (OpenAI-compatible endpoint used by Agently)
+LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+LLM_MODEL: str = os.getenv("LLM_MODEL", "qwen3-max")
+# 必须通过环境变量 / .env 提供，不在源码中保留默认密钥
+LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
+# 流式响应会被 Agently 提前中断读取，连接无法复用；默认关闭以启用 keep-alive
+LLM_STREAM: bool = _env_bool("LLM_STREAM", False)
+# 共享 HTTP 连接池上限（keep-alive 连接数）
+LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# 每类 agent 最多保留的空闲实例数
+LLM_AGENT_POOL_SIZE: int = int(os.getenv("LLM_AGENT_POOL_SIZE", "8"))
+
+# Compare: 同时分析的条款数
+COMPARE_MAX_CONCURRENCY: int = int(os.getenv("COMPARE_MAX_CONCURRENCY", "4"))
+
+# LLM 对比结果缓存（storage/db.sqlite3 中的 analysis_cache 表）
+ANALYSIS_CACHE_ENABLED: bool = _env_bool("ANALYSIS_CACHE_ENABLED", True)
+# 缓存有效期（秒），0 表示不过期；默认 30 天
+ANALYSIS_CACHE_TTL_SECONDS: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# 最多保留条目数（按最近访问淘汰），0 表示不限制
+ANALYSIS_CACHE_MAX_ENTRIES: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "50000"))
+
+# 分阶段耗时记录（process_logs 表，见 src/stages.py）与保留天数（<=0 表示不清理）；删除文档不会删除其耗时记录
+STAGE_LOG_ENABLED: bool = _env_bool("STAGE_LOG_ENABLED", True)
+STAGE_LOG_RETENTION_DAYS: int = int(os.getenv("STAGE_LOG_RETENTION_DAYS", "14"))
+
+# Compare: 每个条款发送给模型的地方政策上下文
+# token 预算（估算值）；<=0 时退回发送整篇原文
+COMPARE_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("COMPARE_CONTEXT_TOKEN_BUDGET", "1500"))
+# 前后各取的相邻条款数
+COMPARE_CONTEXT_NEIGHBORS: int = int(os.getenv("COMPARE_CONTEXT_NEIGHBORS", "2"))
+# 批量分析：多条款合并为一次模型请求（请求可用 batch 字段覆盖）
+COMPARE_BATCH_ENABLED: bool = _env_bool("COMPARE_BATCH_ENABLED", False)
+# 每批预估 token 上限（输入 + 预估输出）与最多条款数
+COMPARE_BATCH_TOKEN_BUDGET: int = int(os.getenv("COMPARE_BATCH_TOKEN_BUDGET", "8000"))
+COMPARE_BATCH_MAX_CLAUSES: int = int(os.getenv("COMPARE_BATCH_MAX_CLAUSES", "8"))
+
+# Compare: 检索国家条款的方式。门控依赖向量距离，而 Weaviate 混合检索只返回融合得分、不返回距离，
+# 设为 hybrid 时距离门控与“无差异”判定不生效，只能用 COMPARE_MATCH_MIN_SCORE 按得分过滤
+COMPARE_SEARCH_TYPE: str = os.getenv("COMPARE_SEARCH_TYPE", "vector").strip().lower()
+# Compare: 检索结果门控（距离为余弦距离，越小越相近；<=0 表示不启用）
+# 没有任何候选的距离 <= 该值时，条款直接判为“无法比较”，不调用模型
+COMPARE_MATCH_MAX_DISTANCE: float = float(os.getenv("COMPARE_MATCH_MAX_DISTANCE", "0.5"))
+# 检索结果只有 _score（关键词 / 混合检索）时使用的最低得分，需按检索方式校准
+COMPARE_MATCH_MIN_SCORE: float = float(os.getenv("COMPARE_MATCH_MIN_SCORE", "0"))
+# 最相近候选距离 <= 该值且文本相似度 >= COMPARE_IDENTICAL_MIN_SIMILARITY 时直接判为“无差异”
+COMPARE_IDENTICAL_MAX_DISTANCE: float = float(os.getenv("COMPARE_IDENTICAL_MAX_DISTANCE", "0.05"))
+COMPARE_IDENTICAL_MIN_SIMILARITY: float = float(os.getenv("COMPARE_IDENTICAL_MIN_SIMILARITY", "0.95"))
+
+# Compare: 分级模型。小模型先对每个条款做初筛，只有“需复核”的条款再交给 LLM_MODEL 做完整差异分析
+COMPARE_TRIAGE_ENABLED: bool = _env_bool("COMPARE_TRIAGE_ENABLED", False)
+# 初筛判定“无差异”且置信度不低于该值时直接采用，否则升级到大模型
+COMPARE_TRIAGE_MIN_CONFIDENCE: float = float(os.getenv("COMPARE_TRIAGE_MIN_CONFIDENCE", "0.85"))
+LLM_TRIAGE_BASE_URL: str = os.getenv("LLM_TRIAGE_BASE_URL", LLM_BASE_URL)
+LLM_TRIAGE_MODEL: str = os.getenv("LLM_TRIAGE_MODEL", "qwen-flash")
+LLM_TRIAGE_API_KEY: str = os.getenv("LLM_TRIAGE_API_KEY", LLM_API_KEY)
+
+# 外部服务容错（src/resilience.py）：单次调用超时（秒）与最多尝试次数
+ZHIPU_TIMEOUT_SECONDS: float = float(os.getenv("ZHIPU_TIMEOUT_SECONDS", "60"))
+SILICONFLOW_TIMEOUT_SECONDS: float = float(os.getenv("SILICONFLOW_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+UPSTREAM_MAX_ATTEMPTS: int = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+LLM_MAX_ATTEMPTS: int = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+# 每次成功调用存入的重试令牌数（重试/对冲各消耗 1 个）
+RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+# 连续失败多少次后熔断，熔断多少秒后放行探测请求
+CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# LLM 对冲请求：超过近期 p95 耗时（且不少于最小延迟）仍未返回时再发一个相同请求
+LLM_HEDGE_ENABLED: bool = _env_bool("LLM_HEDGE_ENABLED", False)
+LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "15"))
+
+# /metrics（Prometheus 文本格式，见 src/metrics.py）
+METRICS_ENABLED: bool = _env_bool("METRICS_ENABLED", True)
+
+# 请求追踪（src/tracing.py）：最近的 trace 保存在内存环形缓冲中，见 /api/system/traces
+TRACING_ENABLED: bool = _env_bool("TRACING_ENABLED", True)
+TRACING_BUFFER_SIZE: int = int(os.getenv("TRACING_BUFFER_SIZE", "200"))
+# 单条 trace 最多保留的 span 数（超出的只计数）
+TRACING_MAX_SPANS: int = int(os.getenv("TRACING_MAX_SPANS", "5000"))
+# 短于该耗时（毫秒）的请求不保留
+TRACING_MIN_DURATION_MS: float = float(os.getenv("TRACING_MIN_DURATION_MS", "0"))
+# 非空时每条 trace 另追加一行 JSON 到该文件
+TRACING_FILE: str = os.getenv("TRACING_FILE", "")
+# 向哪些上游主机透传 W3C traceparent（逗号分隔的主机名）；默认只有本机（模拟服务），不发给第三方 API
+TRACING_PROPAGATE_HOSTS: str = os.getenv("TRACING_PROPAGATE_HOSTS", "localhost,127.0.0.1,::1")
+
+# 启动预热（src/warmup.py）：后台打开 SQLite 连接、导入重型依赖并建立向量库连接；SQLite 就绪前 /health/ready 返回 503
+WARMUP_ENABLED: bool = _env_bool("WARMUP_ENABLED", True)
+# 向量库连接是否为就绪的必需项；默认只尽力预热，向量库故障不摘除只提供文档库接口的实例
+WARMUP_REQUIRE_VECTOR: bool = _env_bool("WARMUP_REQUIRE_VECTOR", False)
+# 预热时建立连接并确认存在的集合（逗号分隔）
+WARMUP_COLLECTIONS: str = os.getenv("WARMUP_COLLECTIONS", f"{DEFAULT_COLLECTION_NAME},national_policy_documents")
+# 可选：发一次极小的 embedding 请求、请求一次 LLM 的 /models，预先建立 TLS 连接（结果不影响就绪状态）
+WARMUP_EMBEDDING: bool = _env_bool("WARMUP_EMBEDDING", False)
+WARMUP_LLM: bool = _env_bool("WARMUP_LLM", False)
+# 单项检查的超时；必需项失败后每隔多少秒重试（至少 1 秒）
+WARMUP_TIMEOUT_SECONDS: float = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+WARMUP_RETRY_SECONDS: float = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+# 按请求剖析（src/profiling.py，调试用）：管理员开关 + X-Profile 头或 ?profile=1，结果见 /api/system/profiles
+PROFILING_ENABLED: bool = _env_bool("PROFILING_ENABLED", False)
+# 非空时请求须带匹配的 X-Profile-Token 头；为空时只接受本机请求
+PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")
+# sample（采样，折叠栈）或 cprofile（确定性，pstats）
+PROFILING_DEFAULT_MODE: str = os.getenv("PROFILING_DEFAULT_MODE", "sample").strip().lower()
+PROFILING_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+PROFILING_MAX_SECONDS: float = float(os.getenv("PROFILING_MAX_SECONDS", "300"))
+PROFILING_MAX_CONCURRENT: int = int(os.getenv("PROFILING_MAX_CONCURRENT", "1"))
+PROFILING_MAX_PROFILES: int = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
@@ -0,0 +1,236 @@
+"""流水线分阶段耗时记录，写入 SQLite 的 process_logs 表。
+
+用法：
+    with recording(doc_id) as rec:          # 同步代码：退出时一次性写库
+        with stage("parse", input_size=n) as st:
+            ...
+            st.output_size = len(text)
+
+    recorder = StageRecorder(doc_id)        # 异步代码：写库放到线程池
+    with activate(recorder):
+        ...
+    await run_blocking(recorder.flush)
+
+process_logs 与 documents 没有外键：删除文档不会删除其耗时记录，记录只按 STAGE_LOG_RETENTION_DAYS 清理。
+写库失败不影响业务请求，丢弃的行数计入 stage_log_rows_dropped_total（src/metrics.py）。
+
+当前记录器保存在 contextvars 中，run_blocking / run_ingest 会复制上下文，因此深层函数（分段、
+向量化批次）直接调用 stage() 即可；没有活动记录器时 stage() 只计时、不记录。嵌套阶段的
+extra.parent 为外层阶段名，聚合时外层耗时包含内层。每个阶段同时记录为一个追踪 span（src/tracing.py）。
+
+阶段与尺寸含义（input_size → output_size）：
+  upload        上传字节数 → 字节数
+  parse         文件字节数 → 文本字符数
+  normalize     字符数 → 字符数（嵌套在 segment 内）
+  segment       字符数 → 条款数
+  persist       条款数 → 写入的 chunk 数
+  embed_batch   文本条数 → 向量条数
+  upsert_batch  对象条数 → 写入条数
+  retrieve      查询字符数 → 检索结果数
+  llm_triage / llm_analyze  条款数 → 条款数
+"""
+
+from __future__ import annotations
+
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from src import metrics, tracing
+from src.settings import STAGE_LOG_ENABLED, STAGE_LOG_RETENTION_DAYS
+
+_CURRENT: contextvars.ContextVar[Optional["StageRecorder"]] = contextvars.ContextVar("stage_recorder", default=None)
+_PARENT: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("stage_parent", default=None)
+
+# 过期记录每个进程每小时最多清理一次
+_PRUNE_INTERVAL_SECONDS = 3600
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+class StageRecord:
+    """单个阶段的记录；在 with 块内可补充 output_size / extra，异常时自动标记为 error。"""
+
+    __slots__ = ("stage", "status", "message", "input_size", "output_size", "extra", "duration_ms")
+
+    def __init__(self, stage: str, input_size: Optional[int] = None, extra: Optional[Dict[str, Any]] = None):
+        self.stage = stage
+        self.status = "ok"
+        self.message: Optional[str] = None
+        self.input_size = input_size
+        self.output_size: Optional[int] = None
+        self.extra: Dict[str, Any] = dict(extra or {})
+        self.duration_ms: Optional[float] = None
+
+    def fail(self, message: Any) -> None:
+        self.status = "error"
+        self.message = str(message)[:500]
+
+
+class StageRecorder:
+    """收集一次处理（一次上传入库或一次对比）中各阶段的耗时，flush 时批量写入 process_logs。"""
+
+    def __init__(self, doc_id: Optional[str] = None, *, run_id: Optional[str] = None):
+        self.doc_id = doc_id
+        # 同一次处理的记录共用 run_id，便于关联入库前（尚无 doc_id）的阶段
+        self.run_id = run_id or uuid4().hex
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def bind(self, doc_id: str) -> None:
+        """入库后得到 doc_id，之前与之后的记录都归属该文档。"""
+        self.doc_id = doc_id
+
+    def add(self, record: StageRecord) -> None:
+        extra = dict(record.extra)
+        extra["run_id"] = self.run_id
+        row = {
+            "stage": record.stage,
+            "status": record.status,
+            "message": record.message,
+            "duration_ms": round(record.duration_ms or 0.0, 3),
+            "input_size": record.input_size,
+            "output_size": record.output_size,
+            "extra": extra,
+        }
+        with self._lock:
+            self.records.append(row)
+
+    @contextmanager
+    def stage(self, name: str, *, input_size: Optional[int] = None, **extra: Any) -> Iterator[StageRecord]:
+        record = StageRecord(name, input_size, extra)
+        parent = _PARENT.get()
+        if parent:
+            record.extra.setdefault("parent", parent)
+        token = _PARENT.set(name)
+        started = time.perf_counter()
+        try:
+            with tracing.span(name, input_size=input_size, **extra) as sp:
+                try:
+                    yield record
+                finally:
+                    sp.set("output_size", record.output_size)
+        except BaseException as exc:
+            if record.status == "ok":
+                record.fail(exc)
+            raise
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+            _PARENT.reset(token)
+            self.add(record)
+
+    def flush(self) -> int:
+        """写入已收集的记录；写库失败不影响业务请求，丢弃的行数计入 STAGE_LOG_DROPPED。"""
+        with self._lock:
+            rows, self.records = self.records, []
+        if not rows or not STAGE_LOG_ENABLED:
+            return 0
+        for row in rows:
+            row["doc_id"] = self.doc_id
+        try:
+            from src.storage import ProcessLogsRepo, pooled_connection
+
+            with pooled_connection() as conn:
+                repo = ProcessLogsRepo(conn)
+                written = repo.bulk_create(rows)
+                if _should_prune():
+                    repo.prune(retention_days=STAGE_LOG_RETENTION_DAYS)
+            return written
+        except Exception as exc:
+            metrics.STAGE_LOG_DROPPED.inc(len(rows))
+            print(f"[stages] failed to write {len(rows)} process_logs rows: {exc}")
+            return 0
+
+
+def _should_prune() -> bool:
+    global _last_prune
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_prune and now - _last_prune < _PRUNE_INTERVAL_SECONDS:
+            return False
+        _last_prune = now
+        return True
+
+
+def current() -> Optional[StageRecorder]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def activate(recorder: StageRecorder) -> Iterator[StageRecorder]:
+    """将 recorder 设为当前上下文的记录器（不写库）。"""
+    token = _CURRENT.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def recording(doc_id: Optional[str] = None) -> Iterator[StageRecorder]:
+    """同步代码使用：已有活动记录器时直接复用（由外层负责写库），否则新建并在退出时写库。"""
+    existing = _CURRENT.get()
+    if existing is not None:
+        if doc_id and not existing.doc_id:
+            existing.bind(doc_id)
+        yield existing
+        return
+    recorder = StageRecorder(doc_id)
+    try:
+        with activate(recorder):
+            yield recorder
+    finally:
+        recorder.flush()
+
+
+@contextmanager
+def stage(name: str, *, input_size: Optional[int] = None, **extra: Any) -> Iterator[StageRecord]:
+    """在当前记录器上记录一个阶段；没有活动记录器时只计时。"""
+    recorder = _CURRENT.get()
+    if recorder is None:
+        record = StageRecord(name, input_size, extra)
+        started = time.perf_counter()
+        try:
+            with tracing.span(name, input_size=input_size, **extra) as sp:
+                try:
+                    yield record
+                finally:
+                    sp.set("output_size", record.output_size)
+        finally:
+            record.duration_ms = (time.perf_counter() - started) * 1000
+        return
+    with recorder.stage(name, input_size=input_size, **extra) as record:
+        yield record
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def summarize(rows: Iterable[Tuple[str, str, float]]) -> Dict[str, Dict[str, Any]]:
+    """按阶段汇总 (stage, status, duration_ms)：次数、失败数、平均值与 p50 / p95 / p99 / 最大值（毫秒）。"""
+    grouped: Dict[str, List[Tuple[str, float]]] = {}
+    for name, status, duration in rows:
+        grouped.setdefault(name, []).append((status, duration))
+    summary: Dict[str, Dict[str, Any]] = {}
+    for name in sorted(grouped):
+        durations = [d for _, d in grouped[name]]
+        summary[name] = {
+            "count": len(durations),
+            "errors": sum(1 for s, _ in grouped[name] if s == "error"),
+            "total_ms": round(sum(durations), 1),
+            "avg_ms": round(sum(durations) / len(durations), 1),
+            "p50_ms": round(percentile(durations, 50), 1),
+            "p95_ms": round(percentile(durations, 95), 1),
+            "p99_ms": round(percentile(durations, 99), 1),
+            "max_ms": round(max(durations), 1),
+        }
+    return summary
@@ -0,0 +1,22 @@
+from .db import (
+    init_storage_and_db,
+    ensure_storage_dirs,
+    get_storage_root,
+    get_db_path,
+    connect,
+    initialize_schema,
+    run_migrations,
+    get_schema_version,
+    SCHEMA_VERSION,
+    ConnectionPool,
+    get_pool,
+    close_pool,
+    pooled_connection,
+    get_db,
+    StorageConnection,
+    transaction,
+)
+from .article_no import parse_article_no, chinese_numeral_to_int
+from .repositories import CollectionsRepo, DocumentsRepo, ChunksRepo, AnalysisCacheRepo, ProcessLogsRepo
+from .pipeline import persist_parsed_document
+from .embedding_pipeline import index_document_chunks, rollback_document_vectors
\ No newline at end of file
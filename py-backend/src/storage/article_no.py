@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+# “第X条”中条号可用的字符（O 为 OCR 误识别的零）；入库拆分、目录与结构识别共用，保证能解析的条号也能被拆出
+ARTICLE_NUMERALS = "一二三四五六七八九十百千零〇O0-9０-９"
+ARTICLE_LABEL_RE = re.compile(rf"^\s*第(?P<num>[{ARTICLE_NUMERALS}]+)条")
+
+_CN_DIGITS = {
+    "零": 0, "〇": 0, "O": 0,
+    "一": 1, "二": 2, "三": 3, "四": 4, "五": 5,
+    "六": 6, "七": 7, "八": 8, "九": 9,
+}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+_FULLWIDTH_DIGITS = str.maketrans("０１２３４５６７８９", "0123456789")
+
+
+def chinese_numeral_to_int(text: str) -> Optional[int]:
+    """将中文/阿拉伯/全角数字混写的序号转换为整数，无法识别时返回 None。
+
+    支持：二十三、十、一百零五、一〇五（逐位写法）、23、２３、二十3 等。
+    """
+    s = (text or "").strip().translate(_FULLWIDTH_DIGITS)
+    if not s:
+        return None
+    if s.isdigit():
+        return int(s)
+
+    # 逐位写法（无“十百千”单位），如 一〇五 / 1O5
+    if not any(ch in _CN_UNITS for ch in s):
+        digits = []
+        for ch in s:
+            if ch.isdigit():
+                digits.append(int(ch))
+            elif ch in _CN_DIGITS:
+                digits.append(_CN_DIGITS[ch])
+            else:
+                return None
+        value = 0
+        for d in digits:
+            value = value * 10 + d
+        return value
+
+    total = 0
+    current: Optional[int] = None
+    for ch in s:
+        if ch.isdigit():
+            current = (current or 0) * 10 + int(ch)
+        elif ch in _CN_DIGITS:
+            digit = _CN_DIGITS[ch]
+            # “零”仅作占位，不参与累加
+            current = digit if digit else current
+        elif ch in _CN_UNITS:
+            total += (1 if current is None else current) * _CN_UNITS[ch]
+            current = None
+        else:
+            return None
+    return total + (current or 0)
+
+
+def parse_article_no(label: Optional[str]) -> Optional[int]:
+    """从“第二十三条 ...”形式的标题/条款文本中解析条号。"""
+    if not label:
+        return None
+    m = ARTICLE_LABEL_RE.match(label)
+    if not m:
+        return None
+    return chinese_numeral_to_int(m.group("num"))
@@ -0,0 +1,627 @@
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, List, Optional, Tuple
+
+from . import fulltext
+from .article_no import parse_article_no
+
+# Environment variables
+ENV_STORAGE_ROOT = "STORAGE_ROOT"  # root directory for storage/, defaults to <py-backend>/storage
+ENV_DB_FILE = "DB_FILE"            # optional absolute path to sqlite db file; defaults to storage/db.sqlite3
+ENV_POOL_SIZE = "SQLITE_POOL_SIZE"              # max pooled connections, default 8
+ENV_POOL_TIMEOUT = "SQLITE_POOL_TIMEOUT"        # seconds to wait for a free pooled connection, default 30
+ENV_BUSY_TIMEOUT_MS = "SQLITE_BUSY_TIMEOUT_MS"  # how long a writer waits on a locked db, default 5000
+ENV_MMAP_SIZE = "SQLITE_MMAP_SIZE"              # bytes of the db file to memory-map, default 256MB
+ENV_CACHE_SIZE_KB = "SQLITE_CACHE_SIZE_KB"      # page cache per connection in KiB, default 64MB
+
+DEFAULT_STORAGE_DIRNAME = "storage"
+
+
+def _backend_root() -> Path:
+    """Return the py-backend directory path."""
+    return Path(__file__).resolve().parent.parent.parent
+
+
+def get_storage_root() -> Path:
+    """Resolve storage root using ENV or default to <py-backend>/storage."""
+    env = os.getenv(ENV_STORAGE_ROOT)
+    if env:
+        return Path(env).resolve()
+    return _backend_root() / DEFAULT_STORAGE_DIRNAME
+
+
+def ensure_storage_dirs(storage_root: Optional[Path] = None) -> Path:
+    """Create required storage directories: storage/, storage/docs/, storage/tmp/."""
+    root = storage_root or get_storage_root()
+    (root).mkdir(parents=True, exist_ok=True)
+    (root / "docs").mkdir(parents=True, exist_ok=True)
+    (root / "tmp").mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def get_db_path(storage_root: Optional[Path] = None) -> Path:
+    """Return sqlite db path; ENV override via DB_FILE, else <storage>/db.sqlite3."""
+    override = os.getenv(ENV_DB_FILE)
+    if override:
+        path = Path(override).resolve()
+    else:
+        root = storage_root or get_storage_root()
+        path = root / "db.sqlite3"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
+    """WAL lets readers run alongside a writer; NORMAL sync is durable enough under WAL."""
+    busy_ms = _env_int(ENV_BUSY_TIMEOUT_MS, 5000)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {busy_ms}")
+    conn.execute(f"PRAGMA mmap_size = {_env_int(ENV_MMAP_SIZE, 256 * 1024 * 1024)}")
+    # negative cache_size is interpreted by sqlite as KiB
+    conn.execute(f"PRAGMA cache_size = -{_env_int(ENV_CACHE_SIZE_KB, 64 * 1024)}")
+
+
+# Optional per-statement hook: called with the SQL text, returns a context manager wrapped
+# around the statement or None. Installed by the tracing layer (src/tracing.py).
+StatementHook = Callable[[str], Optional[ContextManager[Any]]]
+_statement_hook: Optional[StatementHook] = None
+
+
+def set_statement_hook(hook: Optional[StatementHook]) -> None:
+    global _statement_hook
+    _statement_hook = hook
+
+
+class StorageCursor(sqlite3.Cursor):
+    """Cursor that runs statements inside the statement hook, if one is installed."""
+
+    def execute(self, sql, parameters=()):
+        scope = _statement_hook(sql) if _statement_hook is not None else None
+        if scope is None:
+            return super().execute(sql, parameters)
+        with scope:
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        scope = _statement_hook(sql) if _statement_hook is not None else None
+        if scope is None:
+            return super().executemany(sql, seq_of_parameters)
+        with scope:
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        scope = _statement_hook(sql_script) if _statement_hook is not None else None
+        if scope is None:
+            return super().executescript(sql_script)
+        with scope:
+            return super().executescript(sql_script)
+
+
+class StorageConnection(sqlite3.Connection):
+    """sqlite3 connection that tracks explicit transaction nesting (see transaction()).
+
+    Cursors (including the implicit ones behind execute()) are StorageCursor instances.
+    """
+
+    tx_depth: int = 0
+    fts_enabled: Optional[bool] = None
+
+    def cursor(self, factory=StorageCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(db_path: Optional[Path] = None, *, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open sqlite3 connection with row_factory and performance pragmas configured."""
+    path = db_path or get_db_path()
+    busy_s = _env_int(ENV_BUSY_TIMEOUT_MS, 5000) / 1000.0
+    conn = sqlite3.connect(
+        str(path),
+        timeout=busy_s,
+        check_same_thread=check_same_thread,
+        factory=StorageConnection,
+    )
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
+    return conn
+
+
+def commit(conn: sqlite3.Connection) -> None:
+    """Commit unless an enclosing transaction() block owns the commit."""
+    if getattr(conn, "tx_depth", 0) == 0:
+        conn.commit()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run the block as one atomic write transaction; nested blocks join the outer one.
+
+    Repository methods commit through commit(), which is a no-op inside this block,
+    so several repo calls can be grouped and rolled back together.
+    """
+    if not isinstance(conn, StorageConnection):
+        raise TypeError("transaction() requires a connection opened by storage.db.connect()")
+    depth = conn.tx_depth
+    if depth == 0 and not conn.in_transaction:
+        # take the write lock up front instead of upgrading mid-transaction
+        conn.execute("BEGIN IMMEDIATE")
+    conn.tx_depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        conn.tx_depth = depth
+        if depth == 0:
+            conn.rollback()
+        raise
+    conn.tx_depth = depth
+    if depth == 0:
+        conn.commit()
+
+
+class ConnectionPool:
+    """Bounded pool of sqlite connections shared across threads.
+
+    A connection is only ever used by one borrower at a time, so connections are
+    opened with check_same_thread=False and can move between the event loop and
+    worker threads.
+    """
+
+    def __init__(self, db_path: Path, size: int = 8, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = connect(self.db_path, check_same_thread=False)
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"sqlite connection pool exhausted ({self.size} connections busy for {self.timeout}s)"
+            ) from None
+
+    def prefill(self, count: Optional[int] = None) -> int:
+        """Open idle connections up front (default: up to pool size); returns how many are open."""
+        target = self.size if count is None else min(self.size, max(0, int(count)))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("connection pool is closed")
+            while len(self._all) < target:
+                conn = connect(self.db_path, check_same_thread=False)
+                self._all.append(conn)
+                self._idle.put(conn)
+            return len(self._all)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if self._closed:
+            conn.close()
+            return
+        # never hand out a connection with a dangling transaction
+        if conn.in_transaction:
+            conn.rollback()
+        conn.tx_depth = 0
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_db_path(),
+                    size=_env_int(ENV_POOL_SIZE, 8),
+                    timeout=float(_env_int(ENV_POOL_TIMEOUT, 30)),
+                )
+    return _pool
+
+
+def close_pool() -> None:
+    """Close every pooled connection; called from the FastAPI lifespan on shutdown."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+@contextmanager
+def pooled_connection() -> Iterator[sqlite3.Connection]:
+    """Borrow a pooled connection for the duration of the with-block."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def get_db() -> Iterator[sqlite3.Connection]:
+    """FastAPI dependency: one pooled connection per request, returned when the response is done."""
+    with pooled_connection() as conn:
+        yield conn
+
+
+def initialize_schema(conn: sqlite3.Connection) -> None:
+    """Create the base tables and bring the schema up to date via migrations (idempotent)."""
+    cur = conn.cursor()
+    cur.executescript(
+        """
+        PRAGMA foreign_keys = ON;
+
+        -- 3.1 collections
+        CREATE TABLE IF NOT EXISTS collections (
+          id TEXT PRIMARY KEY,
+          name TEXT,
+          description TEXT,
+          provider TEXT,
+          config TEXT,
+          is_active INTEGER DEFAULT 1,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- 3.2 documents
+        CREATE TABLE IF NOT EXISTS documents (
+          id TEXT PRIMARY KEY,
+          collection_id TEXT,
+          source_filename TEXT,
+          storage_path TEXT,
+          original_mime TEXT,
+          status TEXT,
+          page_count INTEGER,
+          word_count INTEGER,
+          summary TEXT,
+          keywords TEXT,
+          parsing_payload TEXT,
+          last_error TEXT,
+          version INTEGER DEFAULT 1,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          FOREIGN KEY (collection_id) REFERENCES collections(id) ON DELETE CASCADE
+        );
+
+        -- 3.4 chunks
+        CREATE TABLE IF NOT EXISTS chunks (
+          id TEXT PRIMARY KEY,
+          doc_id TEXT,
+          collection_id TEXT,
+          chunk_index INTEGER,
+          title TEXT,
+          section_path TEXT,
+          content TEXT,
+          token_count INTEGER,
+          metadata TEXT,
+          weaviate_id TEXT,
+          embedding_status TEXT,
+          last_error TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_chunks_weaviate ON chunks(weaviate_id);
+
+        -- 3.5 keywords (optional)
+        CREATE TABLE IF NOT EXISTS keywords (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          doc_id TEXT,
+          term TEXT,
+          weight REAL,
+          source TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE
+        );
+
+        -- 3.6 process_logs (optional); no FK: timings outlive their document, see _migrate_process_logs_detach
+        CREATE TABLE IF NOT EXISTS process_logs (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          doc_id TEXT,
+          stage TEXT,
+          status TEXT,
+          message TEXT,
+          extra TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    conn.commit()
+    run_migrations(conn)
+
+
+# ---------------------------------------------------------------------------
+# Schema migrations
+#
+# The schema version lives in PRAGMA user_version. Each migration runs in its own
+# write transaction together with the version bump, so a crash leaves the db at the
+# last fully applied version. Migrations must be idempotent: databases created by
+# earlier builds may already contain some of the objects while still at version 0.
+# Append new steps to MIGRATIONS; never renumber or edit an already shipped step.
+# ---------------------------------------------------------------------------
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add a column if missing. Returns True when the column was added."""
+    cols = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column in cols:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def _backfill_article_no(conn: sqlite3.Connection) -> None:
+    """Parse article numbers from chunks.title for rows written before the column existed."""
+    rows = conn.execute("SELECT id, title FROM chunks WHERE title IS NOT NULL").fetchall()
+    updates = [(no, row[0]) for row in rows if (no := parse_article_no(row[1])) is not None]
+    if updates:
+        conn.executemany("UPDATE chunks SET article_no = ? WHERE id = ?", updates)
+
+
+def _migrate_article_no(conn: sqlite3.Connection) -> None:
+    if _ensure_column(conn, "chunks", "article_no", "INTEGER"):
+        _backfill_article_no(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_article ON chunks(doc_id, article_no)")
+
+
+def _migrate_listing_indexes(conn: sqlite3.Connection) -> None:
+    # keyset pagination / filters for the document library and chunk listings
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_collection_created ON documents(collection_id, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_collection_updated ON documents(collection_id, updated_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_collection_filename ON documents(collection_id, source_filename, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_collection_status ON documents(collection_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_index ON chunks(doc_id, chunk_index)")
+    # single-column indexes that are now left prefixes of the composites above
+    conn.execute("DROP INDEX IF EXISTS idx_documents_collection")
+    conn.execute("DROP INDEX IF EXISTS idx_chunks_doc")
+
+
+def _migrate_fulltext(conn: sqlite3.Connection) -> None:
+    # populate the local full-text index from existing chunks the first time it is created
+    if not fulltext.is_enabled(conn) and fulltext.create_table(conn):
+        fulltext.rebuild(conn)
+
+
+def _dedupe_collections(conn: sqlite3.Connection) -> int:
+    """Merge collections sharing a name into the oldest one so the name can be made unique."""
+    dupes = conn.execute(
+        "SELECT name FROM collections WHERE name IS NOT NULL GROUP BY name HAVING COUNT(*) > 1"
+    ).fetchall()
+    merged = 0
+    for (name,) in dupes:
+        ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM collections WHERE name = ? ORDER BY created_at, id", (name,)
+            )
+        ]
+        keep, drop = ids[0], ids[1:]
+        for old in drop:
+            # repoint children before deleting, documents cascade on collection delete
+            conn.execute("UPDATE documents SET collection_id = ? WHERE collection_id = ?", (keep, old))
+            conn.execute("UPDATE chunks SET collection_id = ? WHERE collection_id = ?", (keep, old))
+            if fulltext.is_enabled(conn):
+                conn.execute(
+                    f"UPDATE {fulltext.FTS_TABLE} SET collection_id = ? WHERE collection_id = ?", (keep, old)
+                )
+            conn.execute("DELETE FROM collections WHERE id = ?", (old,))
+            merged += 1
+    if merged:
+        print(f"[storage] merged {merged} duplicate collection row(s) before adding unique name index")
+    return merged
+
+
+def _migrate_lookup_indexes(conn: sqlite3.Connection) -> None:
+    _dedupe_collections(conn)
+    # CollectionsRepo.ensure looks collections up by name on every request
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_collections_name ON collections(name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status)")
+    # per-document status filters keep chunk_index order for the segment listing
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chunks_doc_status ON chunks(doc_id, embedding_status, chunk_index)"
+    )
+
+
+def _migrate_analysis_cache(conn: sqlite3.Connection) -> None:
+    # structured LLM compare results keyed by sha256(prompt version, model, clause, candidates)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+          cache_key TEXT PRIMARY KEY,
+          prompt_version TEXT,
+          model TEXT,
+          local_doc_id TEXT,
+          result TEXT,
+          hit_count INTEGER DEFAULT 0,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          accessed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_accessed ON analysis_cache(accessed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_created ON analysis_cache(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_doc ON analysis_cache(local_doc_id)")
+
+
+def _migrate_process_logs(conn: sqlite3.Connection) -> None:
+    # per-stage timings written by src.stages.StageRecorder; sizes are stage-specific units
+    _ensure_column(conn, "process_logs", "duration_ms", "REAL")
+    _ensure_column(conn, "process_logs", "input_size", "INTEGER")
+    _ensure_column(conn, "process_logs", "output_size", "INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_stage_created ON process_logs(stage, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_doc_created ON process_logs(doc_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_created ON process_logs(created_at)")
+
+
+def _migrate_document_version(conn: sqlite3.Connection) -> None:
+    # documents.version is the HTTP validator (ETag) of a document's artifacts: bump it on every
+    # document update that does not set it explicitly. updated_at alone has one-second resolution.
+    # Chunk changes (chunk listings expose embedding status) are bumped by ChunksRepo, once per
+    # statement, not by row-level triggers; see _migrate_drop_chunk_version_triggers.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_documents_version AFTER UPDATE ON documents
+        WHEN NEW.version IS OLD.version
+        BEGIN
+          UPDATE documents SET version = COALESCE(version, 1) + 1 WHERE id = NEW.id;
+        END
+        """
+    )
+
+
+def _migrate_drop_chunk_version_triggers(conn: sqlite3.Connection) -> None:
+    # v7 as first shipped bumped documents.version from row-level chunk triggers: one extra
+    # write per chunk row, which turned every batched chunk write into N documents updates.
+    for event in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_chunks_{event}_doc_version")
+
+
+def _migrate_process_logs_detach(conn: sqlite3.Connection) -> None:
+    # process_logs is an operational log: its retention is STAGE_LOG_RETENTION_DAYS, not the
+    # document's lifetime. The original doc_id FK (ON DELETE CASCADE, enforced since foreign_keys
+    # is on for every connection) dropped a document's timing history with the document and
+    # rejected the whole flush when the document was deleted first. SQLite cannot drop a
+    # constraint in place, so rebuild the table when the FK is still there.
+    if not conn.execute("PRAGMA foreign_key_list(process_logs)").fetchall():
+        return
+    columns = (
+        "id, doc_id, stage, status, message, extra, created_at, updated_at, duration_ms, input_size, output_size"
+    )
+    conn.execute(
+        """
+        CREATE TABLE process_logs_detached (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          doc_id TEXT,
+          stage TEXT,
+          status TEXT,
+          message TEXT,
+          extra TEXT,
+          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+          duration_ms REAL,
+          input_size INTEGER,
+          output_size INTEGER
+        )
+        """
+    )
+    conn.execute(f"INSERT INTO process_logs_detached ({columns}) SELECT {columns} FROM process_logs")
+    conn.execute("DROP TABLE process_logs")
+    conn.execute("ALTER TABLE process_logs_detached RENAME TO process_logs")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_stage_created ON process_logs(stage, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_doc_created ON process_logs(doc_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_created ON process_logs(created_at)")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "chunks.article_no", _migrate_article_no),
+    (2, "listing indexes", _migrate_listing_indexes),
+    (3, "chunks_fts full-text index", _migrate_fulltext),
+    (4, "unique collection names and status indexes", _migrate_lookup_indexes),
+    (5, "analysis_cache table", _migrate_analysis_cache),
+    (6, "process_logs timing columns", _migrate_process_logs),
+    (7, "document version triggers", _migrate_document_version),
+    (8, "drop row-level chunk version triggers", _migrate_drop_chunk_version_triggers),
+    (9, "process_logs without document FK", _migrate_process_logs_detach),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations in order. Returns the versions applied by this call."""
+    if conn.in_transaction:
+        conn.commit()
+    applied: List[int] = []
+    for version, description, migrate in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have migrated while we waited for the write lock
+            if get_schema_version(conn) < version:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append(version)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if applied and applied[-1] == version:
+            print(f"[storage] schema migrated to v{version}: {description}")
+    return applied
+
+
+def init_storage_and_db() -> Path:
+    """Ensure storage tree exists and initialize sqlite schema. Returns db file path."""
+    root = ensure_storage_dirs()
+    db_path = get_db_path(root)
+    conn = connect(db_path)
+    try:
+        initialize_schema(conn)
+    finally:
+        conn.close()
+    return db_path
+
+# if __name__ == "__main__":
+#     print(init_storage_and_db())
\ No newline at end of file
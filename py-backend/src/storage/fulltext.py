@@ -0,0 +1,225 @@
+"""SQLite FTS5 full-text index over chunks (chunks_fts).
+
+Python's sqlite3 module cannot register custom FTS5 tokenizers, so CJK text is
+pre-tokenized here into overlapping character bigrams and stored in the FTS table
+with the stock unicode61 tokenizer. A query is converted the same way and matched
+as an FTS5 phrase, which gives exact-substring semantics: "住房公积金贷款额度"
+becomes the phrase "住房 房公 公积 积金 金贷 贷款 款额 额度".
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# runs of letters/digits (CJK included); everything else separates runs
+_RUN_RE = re.compile(r"[^\W_]+")
+
+FTS_TABLE = "chunks_fts"
+
+CREATE_FTS_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+  chunk_id UNINDEXED,
+  doc_id UNINDEXED,
+  collection_id UNINDEXED,
+  title,
+  section_path,
+  content,
+  tokenize = 'unicode61 remove_diacritics 0'
+)
+"""
+
+
+def _run_tokens(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    grams = [run[i:i + 2] for i in range(len(run) - 1)]
+    # trailing unigram lets single-character prefix queries hit the last char of a run
+    grams.append(run[-1])
+    return grams
+
+
+def cjk_bigrams(text: Optional[str]) -> str:
+    """Tokenize text into space separated character bigrams for indexing."""
+    if not text:
+        return ""
+    tokens: List[str] = []
+    for run in _RUN_RE.findall(text.lower()):
+        tokens.extend(_run_tokens(run))
+    return " ".join(tokens)
+
+
+def _phrase(tokens: Sequence[str]) -> str:
+    return '"' + " ".join(t.replace('"', '""') for t in tokens) + '"'
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Turn a user query into an FTS5 MATCH expression; every whitespace separated term must match."""
+    parts: List[str] = []
+    for run in _RUN_RE.findall((query or "").lower()):
+        if len(run) == 1:
+            parts.append(_phrase([run]) + "*")
+        else:
+            # drop the trailing unigram: the bigram phrase alone is the substring match
+            parts.append(_phrase(_run_tokens(run)[:-1]))
+    if not parts:
+        return None
+    return " AND ".join(parts)
+
+
+def _section_text(section_path: Any) -> str:
+    if isinstance(section_path, str):
+        try:
+            section_path = json.loads(section_path)
+        except Exception:
+            return section_path
+    if isinstance(section_path, (list, tuple)):
+        return " ".join(str(p) for p in section_path)
+    return ""
+
+
+def _cache(conn: sqlite3.Connection, enabled: bool) -> None:
+    try:
+        conn.fts_enabled = enabled  # type: ignore[attr-defined]
+    except AttributeError:
+        # plain sqlite3.Connection (not opened via storage.db.connect) cannot carry attributes
+        pass
+
+
+def is_enabled(conn: sqlite3.Connection) -> bool:
+    """Whether chunks_fts exists on this connection's database (cached per connection)."""
+    cached = getattr(conn, "fts_enabled", None)
+    if cached is not None:
+        return cached
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone()
+    enabled = row is not None
+    _cache(conn, enabled)
+    return enabled
+
+
+def create_table(conn: sqlite3.Connection) -> bool:
+    """Create chunks_fts. Returns False when this sqlite build lacks FTS5."""
+    try:
+        conn.execute(CREATE_FTS_SQL)
+    except sqlite3.OperationalError as error:
+        print(f"[storage] FTS5 unavailable, local full-text search disabled: {error}")
+        return False
+    _cache(conn, True)
+    return True
+
+
+def _row(chunk: Dict[str, Any]) -> tuple:
+    return (
+        str(chunk["id"]),
+        chunk.get("doc_id"),
+        chunk.get("collection_id"),
+        cjk_bigrams(chunk.get("title")),
+        cjk_bigrams(_section_text(chunk.get("section_path"))),
+        cjk_bigrams(chunk.get("content")),
+    )
+
+
+def index_chunks(conn: sqlite3.Connection, chunks: Iterable[Dict[str, Any]]) -> None:
+    if not is_enabled(conn):
+        return
+    conn.executemany(
+        f"""
+        INSERT INTO {FTS_TABLE} (chunk_id, doc_id, collection_id, title, section_path, content)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [_row(ch) for ch in chunks],
+    )
+
+
+def reindex_chunk(conn: sqlite3.Connection, chunk_id: str) -> None:
+    if not is_enabled(conn):
+        return
+    conn.execute(f"DELETE FROM {FTS_TABLE} WHERE chunk_id = ?", (chunk_id,))
+    row = conn.execute(
+        "SELECT id, doc_id, collection_id, title, section_path, content FROM chunks WHERE id = ?",
+        (chunk_id,),
+    ).fetchone()
+    if row is not None:
+        index_chunks(conn, [dict(row)])
+
+
+def delete_where(conn: sqlite3.Connection, column: str, value: str) -> None:
+    if column not in ("chunk_id", "doc_id", "collection_id"):
+        raise ValueError(f"unsupported column: {column}")
+    if not is_enabled(conn):
+        return
+    conn.execute(f"DELETE FROM {FTS_TABLE} WHERE {column} = ?", (value,))
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Repopulate chunks_fts from chunks; used when the table is first created on an existing db."""
+    if not is_enabled(conn):
+        return 0
+    conn.execute(f"DELETE FROM {FTS_TABLE}")
+    rows = conn.execute(
+        "SELECT id, doc_id, collection_id, title, section_path, content FROM chunks"
+    ).fetchall()
+    index_chunks(conn, (dict(r) for r in rows))
+    return len(rows)
+
+
+def search(
+    conn: sqlite3.Connection,
+    query: str,
+    *,
+    collection_id: Optional[str] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    limit: int = 10,
+) -> List[Dict[str, Any]]:
+    """BM25-ranked local search. Results follow the WeaviateEngine.search payload shape."""
+    match = build_match_query(query)
+    if not match or not is_enabled(conn):
+        return []
+    where = [f"{FTS_TABLE} MATCH ?"]
+    params: List[Any] = [match]
+    if collection_id:
+        where.append(f"{FTS_TABLE}.collection_id = ?")
+        params.append(collection_id)
+    if doc_ids:
+        where.append(f"{FTS_TABLE}.doc_id IN ({', '.join('?' for _ in doc_ids)})")
+        params.extend(doc_ids)
+    params.append(int(limit))
+    rows = conn.execute(
+        f"""
+        SELECT c.id, c.doc_id, c.collection_id, c.chunk_index, c.title, c.section_path,
+               c.content, c.weaviate_id, bm25({FTS_TABLE}) AS rank
+        FROM {FTS_TABLE}
+        JOIN chunks AS c ON c.id = {FTS_TABLE}.chunk_id
+        WHERE {' AND '.join(where)}
+        ORDER BY rank
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+
+    results: List[Dict[str, Any]] = []
+    for r in rows:
+        try:
+            section_path = json.loads(r["section_path"]) if r["section_path"] else []
+        except Exception:
+            section_path = []
+        results.append({
+            "uuid": r["weaviate_id"] or r["id"],
+            "text": r["content"] or "",
+            "title": r["title"],
+            "metadata": {
+                "collection_id": r["collection_id"],
+                "doc_id": r["doc_id"],
+                "chunk_id": r["id"],
+                "chunk_index": int(r["chunk_index"] or 0),
+                "section_path": section_path,
+            },
+            "source_id": r["id"],
+            # bm25() is lower-is-better; flip so larger means more relevant like Weaviate's score
+            "_score": -float(r["rank"]),
+        })
+    return results
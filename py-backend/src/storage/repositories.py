@@ -0,0 +1,1023 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from . import fulltext
+from .article_no import parse_article_no
+from .db import commit, connect
+
+_IN_CLAUSE_BATCH = 500
+# 大于任何实际字符的码位，前缀 p 的匹配范围为 [p, p + _MAX_CHAR)
+_MAX_CHAR = "\U0010ffff"
+
+
+def _json_dump(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _json_load(value: Optional[str]) -> Any:
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except Exception:
+        return value
+
+
+def _encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析分页游标；格式非法时抛出 ValueError。"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    return values
+
+
+def _project(requested: Optional[Sequence[str]], allowed: Sequence[str], required: Sequence[str]) -> List[str]:
+    """按白名单筛选列，并补齐分页所需的列；未指定时返回全部列。"""
+    if not requested:
+        return list(allowed)
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys([*required, *requested]))
+
+
+class CollectionsRepo:
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn or connect()
+
+    def create(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        provider: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        is_active: int | bool = 1,
+        *,
+        id: Optional[str] = None,
+    ) -> str:
+        cid = id or uuid4().hex
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO collections (id, name, description, provider, config, is_active)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                cid,
+                name,
+                description,
+                provider,
+                _json_dump(config),
+                1 if bool(is_active) else 0,
+            ),
+        )
+        commit(self.conn)
+        return cid
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM collections WHERE id = ?", (id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        data = dict(row)
+        data["config"] = _json_load(data.get("config"))
+        data["is_active"] = int(data.get("is_active") or 0)
+        return data
+
+    # 新增：按名称查询与确保存在
+    def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM collections WHERE name = ? LIMIT 1", (name,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        d = dict(row)
+        d["config"] = _json_load(d.get("config"))
+        d["is_active"] = int(d.get("is_active") or 0)
+        return d
+
+    def ensure(self, name: str, **kwargs: Any) -> Dict[str, Any]:
+        existing = self.get_by_name(name)
+        if existing:
+            return existing
+        try:
+            cid = self.create(name=name, **kwargs)
+        except sqlite3.IntegrityError:
+            # idx_collections_name is unique: a concurrent request created it first
+            existing = self.get_by_name(name)
+            if existing:
+                return existing
+            raise
+        return self.get(cid) or {"id": cid, "name": name}
+
+    def list(self, active: Optional[bool] = None) -> List[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        if active is None:
+            cur.execute("SELECT * FROM collections ORDER BY created_at DESC")
+        else:
+            cur.execute("SELECT * FROM collections WHERE is_active = ? ORDER BY created_at DESC", (1 if active else 0,))
+        rows = cur.fetchall() or []
+        results: List[Dict[str, Any]] = []
+        for r in rows:
+            d = dict(r)
+            d["config"] = _json_load(d.get("config"))
+            d["is_active"] = int(d.get("is_active") or 0)
+            results.append(d)
+        return results
+
+    def update(self, id: str, **fields: Any) -> bool:
+        if not fields:
+            return False
+        mapping: Dict[str, Any] = {}
+        for k, v in fields.items():
+            if k == "config":
+                mapping[k] = _json_dump(v)
+            elif k == "is_active":
+                mapping[k] = 1 if bool(v) else 0
+            else:
+                mapping[k] = v
+        set_clause = ", ".join([f"{k} = ?" for k in mapping.keys()])
+        sql = f"UPDATE collections SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+        cur = self.conn.cursor()
+        cur.execute(sql, [*mapping.values(), id])
+        commit(self.conn)
+        return cur.rowcount > 0
+
+    def delete(self, id: str) -> bool:
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM collections WHERE id = ?", (id,))
+        fulltext.delete_where(self.conn, "collection_id", id)
+        commit(self.conn)
+        return cur.rowcount > 0
+
+
+class DocumentsRepo:
+    COLUMNS = (
+        "id", "collection_id", "source_filename", "storage_path", "original_mime", "status",
+        "page_count", "word_count", "summary", "keywords", "parsing_payload", "last_error",
+        "version", "created_at", "updated_at",
+    )
+    SORT_COLUMNS = ("created_at", "updated_at", "source_filename")
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn or connect()
+
+    def create(
+        self,
+        collection_id: str,
+        source_filename: str,
+        storage_path: str,
+        *,
+        original_mime: Optional[str] = None,
+        status: Optional[str] = "uploaded",
+        page_count: Optional[int] = None,
+        word_count: Optional[int] = None,
+        summary: Optional[str] = None,
+        keywords: Optional[Any] = None,
+        parsing_payload: Optional[Any] = None,
+        last_error: Optional[str] = None,
+        version: int = 1,
+        id: Optional[str] = None,
+    ) -> str:
+        did = id or uuid4().hex
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO documents (
+              id, collection_id, source_filename, storage_path, original_mime, status,
+              page_count, word_count, summary, keywords, parsing_payload, last_error, version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                did,
+                collection_id,
+                source_filename,
+                storage_path,
+                original_mime,
+                status,
+                page_count,
+                word_count,
+                summary,
+                _json_dump(keywords),
+                _json_dump(parsing_payload),
+                last_error,
+                version,
+            ),
+        )
+        commit(self.conn)
+        return did
+
+    def bulk_create(self, documents: Sequence[Dict[str, Any]]) -> List[str]:
+        """批量写入文档记录（executemany，单次提交）。每项字段同 create()。"""
+        ids: List[str] = []
+        rows = []
+        for doc in documents:
+            did = doc.get("id") or uuid4().hex
+            ids.append(did)
+            rows.append((
+                did,
+                doc["collection_id"],
+                doc["source_filename"],
+                doc["storage_path"],
+                doc.get("original_mime"),
+                doc.get("status", "uploaded"),
+                doc.get("page_count"),
+                doc.get("word_count"),
+                doc.get("summary"),
+                _json_dump(doc.get("keywords")),
+                _json_dump(doc.get("parsing_payload")),
+                doc.get("last_error"),
+                doc.get("version", 1),
+            ))
+        if not rows:
+            return ids
+        self.conn.executemany(
+            """
+            INSERT INTO documents (
+              id, collection_id, source_filename, storage_path, original_mime, status,
+              page_count, word_count, summary, keywords, parsing_payload, last_error, version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        commit(self.conn)
+        return ids
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM documents WHERE id = ?", (id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        d = dict(row)
+        d["keywords"] = _json_load(d.get("keywords"))
+        d["parsing_payload"] = _json_load(d.get("parsing_payload"))
+        return d
+
+    def get_version(self, id: str) -> Optional[Tuple[int, str]]:
+        """(version, updated_at)，用于生成 ETag；只读主键对应的一行两列。"""
+        row = self.conn.execute("SELECT version, updated_at FROM documents WHERE id = ?", (id,)).fetchone()
+        if not row:
+            return None
+        return int(row[0] or 1), str(row[1] or "")
+
+    def list_by_collection(self, collection_id: str) -> List[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM documents WHERE collection_id = ? ORDER BY created_at DESC", (collection_id,))
+        rows = cur.fetchall() or []
+        results: List[Dict[str, Any]] = []
+        for r in rows:
+            d = dict(r)
+            d["keywords"] = _json_load(d.get("keywords"))
+            d["parsing_payload"] = _json_load(d.get("parsing_payload"))
+            results.append(d)
+        return results
+
+    def list_page(
+        self,
+        collection_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+        status: Optional[str] = None,
+        filename: Optional[str] = None,
+        sort: str = "created_at",
+        order: str = "desc",
+        limit: Optional[int] = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按 (sort, id) 做 keyset 分页，只查询 fields 指定的列。
+
+        返回 (documents, next_cursor)；limit 为 None 时返回全部且 next_cursor 为 None。
+        """
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError(f"unsupported sort field: {sort}")
+        desc = str(order).lower() != "asc"
+        cols = _project(fields, self.COLUMNS, ("id", sort))
+
+        where, params = self._filters(collection_id, status, filename)
+        if cursor:
+            last_value, last_id = _decode_cursor(cursor, 2)
+            where.append(f"({sort}, id) {'<' if desc else '>'} (?, ?)")
+            params.extend([last_value, last_id])
+
+        direction = "DESC" if desc else "ASC"
+        sql = (
+            f"SELECT {', '.join(cols)} FROM documents WHERE {' AND '.join(where)} "
+            f"ORDER BY {sort} {direction}, id {direction}"
+        )
+        if limit is not None:
+            # 多取一行用于判断是否还有下一页
+            sql += " LIMIT ?"
+            params.append(int(limit) + 1)
+
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall() or []
+        next_cursor: Optional[str] = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor([rows[-1][sort], rows[-1]["id"]])
+
+        results: List[Dict[str, Any]] = []
+        for r in rows:
+            d = dict(r)
+            if "keywords" in d:
+                d["keywords"] = _json_load(d.get("keywords"))
+            if "parsing_payload" in d:
+                d["parsing_payload"] = _json_load(d.get("parsing_payload"))
+            results.append(d)
+        return results, next_cursor
+
+    @staticmethod
+    def _filters(
+        collection_id: str, status: Optional[str], filename: Optional[str]
+    ) -> Tuple[List[str], List[Any]]:
+        where = ["collection_id = ?"]
+        params: List[Any] = [collection_id]
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if filename:
+            # 文件名前缀（区分大小写）：写成范围条件才能走 idx_documents_collection_filename；
+            # LIKE 默认不区分大小写，对 BINARY 列无法使用索引，包含匹配更是只能扫描整个集合
+            where.append("source_filename >= ? AND source_filename < ?")
+            params.extend([filename, filename + _MAX_CHAR])
+        return where, params
+
+    def count(self, collection_id: str, *, status: Optional[str] = None, filename: Optional[str] = None) -> int:
+        where, params = self._filters(collection_id, status, filename)
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM documents WHERE {' AND '.join(where)}", params)
+        return int(cur.fetchone()[0])
+
+    def update(self, id: str, **fields: Any) -> bool:
+        if not fields:
+            return False
+        mapping: Dict[str, Any] = {}
+        for k, v in fields.items():
+            if k in ("keywords", "parsing_payload"):
+                mapping[k] = _json_dump(v)
+            else:
+                mapping[k] = v
+        set_clause = ", ".join([f"{k} = ?" for k in mapping.keys()])
+        sql = f"UPDATE documents SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+        cur = self.conn.cursor()
+        cur.execute(sql, [*mapping.values(), id])
+        commit(self.conn)
+        return cur.rowcount > 0
+
+    def delete(self, id: str) -> bool:
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM documents WHERE id = ?", (id,))
+        # chunks 随外键级联删除，全文索引需手动清理
+        fulltext.delete_where(self.conn, "doc_id", id)
+        commit(self.conn)
+        return cur.rowcount > 0
+
+
+class ChunksRepo:
+    COLUMNS = (
+        "id", "doc_id", "collection_id", "chunk_index", "title", "section_path", "content",
+        "token_count", "metadata", "weaviate_id", "embedding_status", "last_error", "article_no",
+        "created_at", "updated_at",
+    )
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn or connect()
+
+    # 分块列表带出嵌入状态，其变化要使文档 ETag（documents.version）失效。
+    # 每条语句 / 每批只对涉及的文档各加一次版本号，不随分块行数放大写入。
+    def _bump_doc_versions(self, doc_ids: Sequence[str]) -> None:
+        ids = sorted({str(d) for d in doc_ids if d})
+        for start in range(0, len(ids), _IN_CLAUSE_BATCH):
+            part = ids[start:start + _IN_CLAUSE_BATCH]
+            placeholders = ", ".join("?" for _ in part)
+            self.conn.execute(
+                f"UPDATE documents SET version = COALESCE(version, 1) + 1 WHERE id IN ({placeholders})",
+                part,
+            )
+
+    def _bump_doc_versions_of_chunks(self, chunk_ids: Sequence[str]) -> None:
+        ids = [str(i) for i in chunk_ids]
+        doc_ids: List[str] = []
+        for start in range(0, len(ids), _IN_CLAUSE_BATCH):
+            part = ids[start:start + _IN_CLAUSE_BATCH]
+            placeholders = ", ".join("?" for _ in part)
+            rows = self.conn.execute(
+                f"SELECT DISTINCT doc_id FROM chunks WHERE id IN ({placeholders})", part
+            ).fetchall()
+            doc_ids.extend(r[0] for r in rows)
+        self._bump_doc_versions(doc_ids)
+
+    def create(
+        self,
+        doc_id: str,
+        collection_id: str,
+        chunk_index: int,
+        title: Optional[str],
+        content: str,
+        *,
+        section_path: Optional[Any] = None,
+        token_count: Optional[int] = None,
+        metadata: Optional[Any] = None,
+        weaviate_id: Optional[str] = None,
+        embedding_status: Optional[str] = None,
+        last_error: Optional[str] = None,
+        article_no: Optional[int] = None,
+        id: Optional[str] = None,
+    ) -> str:
+        cid = id or uuid4().hex
+        if article_no is None:
+            article_no = parse_article_no(title)
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO chunks (
+              id, doc_id, collection_id, chunk_index, title, section_path,
+              content, token_count, metadata, weaviate_id, embedding_status, last_error, article_no
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                cid,
+                doc_id,
+                collection_id,
+                chunk_index,
+                title,
+                _json_dump(section_path),
+                content,
+                token_count,
+                _json_dump(metadata),
+                weaviate_id,
+                embedding_status,
+                last_error,
+                article_no,
+            ),
+        )
+        fulltext.index_chunks(self.conn, [{
+            "id": cid,
+            "doc_id": doc_id,
+            "collection_id": collection_id,
+            "title": title,
+            "section_path": section_path,
+            "content": content,
+        }])
+        self._bump_doc_versions([doc_id])
+        commit(self.conn)
+        return cid
+
+    def bulk_create(
+        self,
+        chunks: Sequence[Dict[str, Any]],
+        *,
+        doc_id: Optional[str] = None,
+        collection_id: Optional[str] = None,
+    ) -> List[str]:
+        """批量写入分块（executemany，单次提交）。
+
+        每项字段同 create()；doc_id / collection_id 可统一传入，作为各项缺省值。
+        在 transaction() 块内调用时与外层事务一起提交或回滚。
+        """
+        ids: List[str] = []
+        rows = []
+        for ch in chunks:
+            cid = ch.get("id") or uuid4().hex
+            ids.append(cid)
+            title = ch.get("title")
+            article_no = ch.get("article_no")
+            if article_no is None:
+                article_no = parse_article_no(title)
+            rows.append((
+                cid,
+                ch.get("doc_id") or doc_id,
+                ch.get("collection_id") or collection_id,
+                ch["chunk_index"],
+                title,
+                _json_dump(ch.get("section_path")),
+                ch.get("content") or "",
+                ch.get("token_count"),
+                _json_dump(ch.get("metadata")),
+                ch.get("weaviate_id"),
+                ch.get("embedding_status"),
+                ch.get("last_error"),
+                article_no,
+            ))
+        if not rows:
+            return ids
+        self.conn.executemany(
+            """
+            INSERT INTO chunks (
+              id, doc_id, collection_id, chunk_index, title, section_path,
+              content, token_count, metadata, weaviate_id, embedding_status, last_error, article_no
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        fulltext.index_chunks(self.conn, [
+            {
+                "id": row[0],
+                "doc_id": row[1],
+                "collection_id": row[2],
+                "title": row[4],
+                "section_path": row[5],
+                "content": row[6],
+            }
+            for row in rows
+        ])
+        self._bump_doc_versions([row[1] for row in rows])
+        commit(self.conn)
+        return ids
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        d["section_path"] = _json_load(d.get("section_path"))
+        d["metadata"] = _json_load(d.get("metadata"))
+        return d
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM chunks WHERE id = ?", (id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return self._decode(row)
+
+    def list_by_doc(self, doc_id: str) -> List[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM chunks WHERE doc_id = ? ORDER BY chunk_index ASC", (doc_id,))
+        rows = cur.fetchall() or []
+        return [self._decode(r) for r in rows]
+
+    def list_page(
+        self,
+        doc_id: str,
+        *,
+        fields: Optional[Sequence[str]] = None,
+        embedding_status: Optional[str] = None,
+        limit: Optional[int] = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按 chunk_index 做 keyset 分页（走 idx_chunks_doc_index），只查询 fields 指定的列。
+
+        每行额外返回 content_length（字符数），便于列表视图在不取正文时展示字数。
+        """
+        cols = _project(fields, self.COLUMNS, ("id", "chunk_index"))
+        where = ["doc_id = ?"]
+        params: List[Any] = [doc_id]
+        if embedding_status:
+            where.append("embedding_status = ?")
+            params.append(embedding_status)
+        if cursor:
+            (after_index,) = _decode_cursor(cursor, 1)
+            where.append("chunk_index > ?")
+            params.append(int(after_index))
+        sql = (
+            f"SELECT {', '.join(cols)}, length(content) AS content_length FROM chunks "
+            f"WHERE {' AND '.join(where)} ORDER BY chunk_index ASC"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit) + 1)
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall() or []
+        next_cursor: Optional[str] = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor([rows[-1]["chunk_index"]])
+        results: List[Dict[str, Any]] = []
+        for r in rows:
+            d = dict(r)
+            if "section_path" in d:
+                d["section_path"] = _json_load(d.get("section_path"))
+            if "metadata" in d:
+                d["metadata"] = _json_load(d.get("metadata"))
+            results.append(d)
+        return results, next_cursor
+
+    def count_by_doc(self, doc_id: str, *, embedding_status: Optional[str] = None) -> int:
+        cur = self.conn.cursor()
+        if embedding_status:
+            cur.execute(
+                "SELECT COUNT(*) FROM chunks WHERE doc_id = ? AND embedding_status = ?",
+                (doc_id, embedding_status),
+            )
+        else:
+            cur.execute("SELECT COUNT(*) FROM chunks WHERE doc_id = ?", (doc_id,))
+        return int(cur.fetchone()[0])
+
+    # 按条号定位（走 idx_chunks_doc_article 索引）
+    def get_by_article(self, doc_id: str, article_no: int) -> List[Dict[str, Any]]:
+        """返回指定文档中条号为 article_no 的分块；同一条号可能被拆成多个分块，按 chunk_index 排序。"""
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT * FROM chunks WHERE doc_id = ? AND article_no = ? ORDER BY chunk_index ASC",
+            (doc_id, int(article_no)),
+        )
+        return [self._decode(r) for r in cur.fetchall() or []]
+
+    def list_by_article_range(self, doc_id: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """返回条号位于 [start, end] 闭区间内的分块。"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            SELECT * FROM chunks
+            WHERE doc_id = ? AND article_no BETWEEN ? AND ?
+            ORDER BY article_no ASC, chunk_index ASC
+            """,
+            (doc_id, int(start), int(end)),
+        )
+        return [self._decode(r) for r in cur.fetchall() or []]
+
+    def update(self, id: str, **fields: Any) -> bool:
+        if not fields:
+            return False
+        mapping: Dict[str, Any] = {}
+        for k, v in fields.items():
+            if k in ("section_path", "metadata"):
+                mapping[k] = _json_dump(v)
+            else:
+                mapping[k] = v
+        # 标题变化时同步条号索引
+        if "title" in mapping and "article_no" not in mapping:
+            mapping["article_no"] = parse_article_no(mapping["title"])
+        set_clause = ", ".join([f"{k} = ?" for k in mapping.keys()])
+        sql = f"UPDATE chunks SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+        cur = self.conn.cursor()
+        cur.execute(sql, [*mapping.values(), id])
+        updated = cur.rowcount > 0
+        # 检索相关字段变化时同步全文索引
+        if updated and {"title", "section_path", "content", "doc_id", "collection_id"} & mapping.keys():
+            fulltext.reindex_chunk(self.conn, id)
+        if updated:
+            self._bump_doc_versions_of_chunks([id])
+        commit(self.conn)
+        return updated
+
+    # 批量状态流转：每批一条语句、一次提交，避免逐条 UPDATE + commit
+    def mark_embedded(self, ids: Sequence[str], weaviate_ids: Sequence[str]) -> int:
+        """将一批分块标记为 embedded 并回写对应的 weaviate_id。"""
+        if len(ids) != len(weaviate_ids):
+            raise ValueError("ids and weaviate_ids must be the same length")
+        if not ids:
+            return 0
+        cur = self.conn.cursor()
+        cur.executemany(
+            """
+            UPDATE chunks
+            SET weaviate_id = ?, embedding_status = 'embedded', last_error = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            [(str(wid), str(cid)) for cid, wid in zip(ids, weaviate_ids)],
+        )
+        updated = cur.rowcount or 0
+        if updated:
+            self._bump_doc_versions_of_chunks(ids)
+        commit(self.conn)
+        return updated
+
+    def mark_failed(self, ids: Sequence[str], error: Optional[str]) -> int:
+        """将一批分块标记为 failed 并记录错误信息。"""
+        return self._set_status_where_ids(ids, "failed", error)
+
+    def reset_embedding(self, doc_id: str) -> int:
+        """将文档全部分块回滚为 pending，清空 weaviate_id 与错误信息。"""
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            UPDATE chunks
+            SET embedding_status = 'pending', weaviate_id = NULL, last_error = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE doc_id = ?
+            """,
+            (doc_id,),
+        )
+        updated = cur.rowcount or 0
+        if updated:
+            self._bump_doc_versions([doc_id])
+        commit(self.conn)
+        return updated
+
+    def _set_status_where_ids(self, ids: Sequence[str], status: str, error: Optional[str]) -> int:
+        if not ids:
+            return 0
+        cur = self.conn.cursor()
+        updated = 0
+        # 控制 IN 列表长度，远低于 SQLite 变量上限
+        for start in range(0, len(ids), _IN_CLAUSE_BATCH):
+            part = [str(i) for i in ids[start:start + _IN_CLAUSE_BATCH]]
+            placeholders = ", ".join("?" for _ in part)
+            cur.execute(
+                f"""
+                UPDATE chunks
+                SET embedding_status = ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders})
+                """,
+                [status, error, *part],
+            )
+            updated += cur.rowcount or 0
+        if updated:
+            self._bump_doc_versions_of_chunks(ids)
+        commit(self.conn)
+        return updated
+
+    def delete(self, id: str) -> bool:
+        cur = self.conn.cursor()
+        row = cur.execute("SELECT doc_id FROM chunks WHERE id = ?", (id,)).fetchone()
+        cur.execute("DELETE FROM chunks WHERE id = ?", (id,))
+        deleted = cur.rowcount > 0
+        fulltext.delete_where(self.conn, "chunk_id", id)
+        if deleted and row:
+            self._bump_doc_versions([row[0]])
+        commit(self.conn)
+        return deleted
+
+    def delete_by_doc(self, doc_id: str) -> int:
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        deleted = cur.rowcount or 0
+        fulltext.delete_where(self.conn, "doc_id", doc_id)
+        if deleted:
+            self._bump_doc_versions([doc_id])
+        commit(self.conn)
+        return deleted
+
+    def search_fulltext(
+        self,
+        query: str,
+        *,
+        collection_id: Optional[str] = None,
+        doc_ids: Optional[Sequence[str]] = None,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """本地 FTS5 检索（字符二元组分词），结果结构与 WeaviateEngine.search 一致。"""
+        return fulltext.search(self.conn, query, collection_id=collection_id, doc_ids=doc_ids, limit=limit)
+
+
+class AnalysisCacheRepo:
+    """LLM 条款对比结果缓存（analysis_cache）。"""
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn or connect()
+
+    @staticmethod
+    def make_key(prompt_version: str, model: str, clause: str, candidates: Sequence[Any]) -> str:
+        """sha256(提示词版本, 模型, 地方条款原文, 候选国家条款)；候选按内容排序，与检索返回顺序无关。"""
+        normalized = sorted(json.dumps(c, ensure_ascii=False, sort_keys=True) for c in candidates)
+        payload = json.dumps([prompt_version, model, clause, normalized], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str, *, ttl_seconds: int = 0) -> Optional[Dict[str, Any]]:
+        """命中时返回缓存的结构化结果并记录访问；ttl_seconds<=0 表示不过期。"""
+        cur = self.conn.cursor()
+        if ttl_seconds > 0:
+            cur.execute(
+                "SELECT result FROM analysis_cache WHERE cache_key = ? AND created_at >= datetime('now', ?)",
+                (cache_key, f"-{int(ttl_seconds)} seconds"),
+            )
+        else:
+            cur.execute("SELECT result FROM analysis_cache WHERE cache_key = ?", (cache_key,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        cur.execute(
+            """
+            UPDATE analysis_cache
+            SET hit_count = hit_count + 1, accessed_at = CURRENT_TIMESTAMP
+            WHERE cache_key = ?
+            """,
+            (cache_key,),
+        )
+        commit(self.conn)
+        return _json_load(row[0])
+
+    def put(
+        self,
+        cache_key: str,
+        result: Dict[str, Any],
+        *,
+        prompt_version: str,
+        model: str,
+        local_doc_id: Optional[str] = None,
+    ) -> None:
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO analysis_cache (cache_key, prompt_version, model, local_doc_id, result)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+              result = excluded.result,
+              prompt_version = excluded.prompt_version,
+              model = excluded.model,
+              local_doc_id = excluded.local_doc_id,
+              created_at = CURRENT_TIMESTAMP,
+              accessed_at = CURRENT_TIMESTAMP
+            """,
+            (cache_key, prompt_version, model, local_doc_id, _json_dump(result)),
+        )
+        commit(self.conn)
+
+    def invalidate(
+        self,
+        *,
+        local_doc_id: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_keys: Optional[Sequence[str]] = None,
+    ) -> int:
+        """按条件删除缓存（条件之间为 AND）；不传任何条件时清空全部。"""
+        where: List[str] = []
+        params: List[Any] = []
+        if local_doc_id:
+            where.append("local_doc_id = ?")
+            params.append(local_doc_id)
+        if prompt_version:
+            where.append("prompt_version = ?")
+            params.append(prompt_version)
+        if model:
+            where.append("model = ?")
+            params.append(model)
+        cur = self.conn.cursor()
+        sql = "DELETE FROM analysis_cache"
+        if cache_keys is not None:
+            deleted = 0
+            keys = [str(k) for k in cache_keys]
+            for start in range(0, len(keys), _IN_CLAUSE_BATCH):
+                part = keys[start:start + _IN_CLAUSE_BATCH]
+                clause = where + [f"cache_key IN ({', '.join('?' for _ in part)})"]
+                cur.execute(f"{sql} WHERE {' AND '.join(clause)}", [*params, *part])
+                deleted += cur.rowcount or 0
+            commit(self.conn)
+            return deleted
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        cur.execute(sql, params)
+        commit(self.conn)
+        return cur.rowcount or 0
+
+    def evict(self, *, ttl_seconds: int = 0, max_entries: int = 0) -> int:
+        """删除过期条目，并按最近访问时间只保留 max_entries 条（<=0 表示不限制）。"""
+        cur = self.conn.cursor()
+        evicted = 0
+        if ttl_seconds > 0:
+            cur.execute(
+                "DELETE FROM analysis_cache WHERE created_at < datetime('now', ?)",
+                (f"-{int(ttl_seconds)} seconds",),
+            )
+            evicted += cur.rowcount or 0
+        if max_entries > 0:
+            cur.execute(
+                """
+                DELETE FROM analysis_cache WHERE cache_key IN (
+                  SELECT cache_key FROM analysis_cache
+                  ORDER BY accessed_at DESC, cache_key
+                  LIMIT -1 OFFSET ?
+                )
+                """,
+                (int(max_entries),),
+            )
+            evicted += cur.rowcount or 0
+        commit(self.conn)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            SELECT COUNT(*) AS entries, COALESCE(SUM(hit_count), 0) AS hits,
+                   MIN(created_at) AS oldest, MAX(accessed_at) AS last_access
+            FROM analysis_cache
+            """
+        )
+        summary = dict(cur.fetchone())
+        cur.execute(
+            """
+            SELECT prompt_version, model, COUNT(*) AS entries, COALESCE(SUM(hit_count), 0) AS hits
+            FROM analysis_cache GROUP BY prompt_version, model ORDER BY prompt_version, model
+            """
+        )
+        summary["by_version"] = [dict(r) for r in cur.fetchall()]
+        return summary
+
+
+class ProcessLogsRepo:
+    """流水线各阶段耗时记录（process_logs），由 src.stages.StageRecorder 写入。"""
+
+    _COLUMNS = ("doc_id", "stage", "status", "message", "extra", "duration_ms", "input_size", "output_size")
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn or connect()
+
+    def bulk_create(self, records: Sequence[Dict[str, Any]]) -> int:
+        if not records:
+            return 0
+        self.conn.executemany(
+            f"""
+            INSERT INTO process_logs ({', '.join(self._COLUMNS)})
+            VALUES ({', '.join('?' for _ in self._COLUMNS)})
+            """,
+            [
+                (
+                    r.get("doc_id"),
+                    r.get("stage"),
+                    r.get("status"),
+                    r.get("message"),
+                    _json_dump(r.get("extra") or None),
+                    r.get("duration_ms"),
+                    r.get("input_size"),
+                    r.get("output_size"),
+                )
+                for r in records
+            ],
+        )
+        commit(self.conn)
+        return len(records)
+
+    def _filters(
+        self, *, since_minutes: int = 0, stage: Optional[str] = None, doc_id: Optional[str] = None
+    ) -> Tuple[str, List[Any]]:
+        where = ["duration_ms IS NOT NULL"]
+        params: List[Any] = []
+        if since_minutes > 0:
+            where.append("created_at >= datetime('now', ?)")
+            params.append(f"-{int(since_minutes)} minutes")
+        if stage:
+            where.append("stage = ?")
+            params.append(stage)
+        if doc_id:
+            where.append("doc_id = ?")
+            params.append(doc_id)
+        return " WHERE " + " AND ".join(where), params
+
+    def durations(
+        self, *, since_minutes: int = 0, stage: Optional[str] = None, doc_id: Optional[str] = None
+    ) -> List[Tuple[str, str, float]]:
+        """返回 (stage, status, duration_ms) 列表，用于计算分位数。"""
+        where, params = self._filters(since_minutes=since_minutes, stage=stage, doc_id=doc_id)
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT stage, status, duration_ms FROM process_logs{where}", params)
+        return [(r[0], r[1], float(r[2])) for r in cur.fetchall()]
+
+    def slowest(
+        self,
+        *,
+        since_minutes: int = 0,
+        stage: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        where, params = self._filters(since_minutes=since_minutes, stage=stage, doc_id=doc_id)
+        cur = self.conn.cursor()
+        cur.execute(
+            f"""
+            SELECT id, doc_id, stage, status, message, extra, duration_ms, input_size, output_size, created_at
+            FROM process_logs{where} ORDER BY duration_ms DESC LIMIT ?
+            """,
+            [*params, int(limit)],
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+        for row in rows:
+            row["extra"] = _json_load(row["extra"])
+        return rows
+
+    def slowest_documents(self, *, since_minutes: int = 0, stage: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """按文档汇总耗时，找出整体最慢的文档。"""
+        where, params = self._filters(since_minutes=since_minutes, stage=stage)
+        cur = self.conn.cursor()
+        cur.execute(
+            f"""
+            SELECT doc_id, COUNT(*) AS records, ROUND(SUM(duration_ms), 1) AS total_ms, MAX(duration_ms) AS max_ms,
+                   SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) AS errors
+            FROM process_logs{where} AND doc_id IS NOT NULL
+            GROUP BY doc_id ORDER BY total_ms DESC LIMIT ?
+            """,
+            [*params, int(limit)],
+        )
+        return [dict(r) for r in cur.fetchall()]
+
+    def prune(self, *, retention_days: int) -> int:
+        if retention_days <= 0:
+            return 0
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM process_logs WHERE created_at < datetime('now', ?)", (f"-{int(retention_days)} days",))
+        commit(self.conn)
+        return cur.rowcount or 0
@@ -0,0 +1,407 @@
+"""轻量级请求追踪：span 通过 contextvars 传递，一次 HTTP 请求为一条 trace。
+
+- TracingMiddleware 为 /api/ 下的业务请求创建根 span（trace id 取自 W3C `traceparent` 请求头，没有则新生成），
+  响应头 `X-Trace-Id` 返回 trace id。/api/system/ 下的运维接口不追踪。
+- span(name, **attrs)：在当前 span 下创建子 span；没有活动 trace 时为空操作（只读一次 contextvar）。
+  run_blocking / run_ingest 会复制上下文，线程池中的 span 自动挂到发起请求的 trace 上，asyncio.gather
+  的子任务同理。
+- 已埋点：处理阶段（src/stages.py 的每个 stage 同时是一个 span）、SQLite 语句（storage.db 的语句钩子）、
+  上游 HTTP 请求（resilience.send，每次尝试一个 span）、嵌入请求、向量检索、
+  LLM 调用（每次尝试）与对比接口的各个环节。
+- 只向 TRACING_PROPAGATE_HOSTS 中的内部主机（默认本机，即模拟服务）透传 traceparent（traceparent_for），
+  不把内部 trace / span id 发给 SiliconFlow、LLM 等第三方服务。
+- 请求结束时整条 trace 放入进程内环形缓冲（最近 TRACING_BUFFER_SIZE 条，短于 TRACING_MIN_DURATION_MS 的不保留），
+  配置 TRACING_FILE 时另由后台线程追加写入 JSONL。查看：GET /api/system/traces、
+  GET /api/system/traces/{trace_id}（含关键路径；format=text 为文本瀑布图）。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.settings import (
+    TRACING_BUFFER_SIZE,
+    TRACING_FILE,
+    TRACING_MAX_SPANS,
+    TRACING_MIN_DURATION_MS,
+    TRACING_PROPAGATE_HOSTS,
+)
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_SQL_LABEL_CHARS = 160
+_PROPAGATE_HOSTS = frozenset(h.strip().lower() for h in TRACING_PROPAGATE_HOSTS.split(",") if h.strip())
+
+_CURRENT: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+_BUFFER: Deque[Dict[str, Any]] = deque(maxlen=max(1, TRACING_BUFFER_SIZE))
+_buffer_lock = threading.Lock()
+_writer_queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _new_id(bits: int) -> str:
+    # random 而非 os.urandom / uuid4：不进系统调用，span 很多时开销更小
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    """一次请求内收集的 span；span 结束时加入，超过 TRACING_MAX_SPANS 的只计数。"""
+
+    __slots__ = ("trace_id", "started_at", "t0", "spans", "dropped", "_lock")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started_at = datetime.now(timezone.utc)
+        self.t0 = time.perf_counter()
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            if len(self.spans) >= TRACING_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "status", "error", "start", "end", "thread")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def fail(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"[:300]
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.t0) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attrs": {k: v for k, v in self.attrs.items() if v is not None},
+        }
+
+
+class _NoopSpan:
+    """没有活动 trace 时 span() 返回的占位对象。"""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def fail(self, exc: BaseException) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def current() -> Optional[Span]:
+    return _CURRENT.get()
+
+
+def active() -> bool:
+    return _CURRENT.get() is not None
+
+
+def trace_id() -> Optional[str]:
+    span = _CURRENT.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def traceparent() -> Optional[str]:
+    """当前 span 的 W3C traceparent，用于透传给上游；没有活动 trace 时返回 None。"""
+    span = _CURRENT.get()
+    if span is None:
+        return None
+    return f"00-{span.trace.trace_id}-{span.span_id}-01"
+
+
+def traceparent_for(url: str) -> Optional[str]:
+    """发往 url 的请求应携带的 traceparent：只对 TRACING_PROPAGATE_HOSTS 中的主机返回，其余返回 None。"""
+    host = (urlsplit(url).hostname or "").lower()
+    if host not in _PROPAGATE_HOSTS:
+        return None
+    return traceparent()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """在当前 trace 下记录一个 span；异常时标记为 error 并继续抛出。"""
+    parent = _CURRENT.get()
+    if parent is None:
+        yield _NOOP
+        return
+    child = Span(parent.trace, name, parent.span_id, attrs)
+    token = _CURRENT.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.fail(exc)
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _CURRENT.reset(token)
+        parent.trace.add(child)
+
+
+def _statement_span(sql: str):
+    """storage.db 语句钩子：有活动 trace 时为每条 SQL 记录一个 span。"""
+    if _CURRENT.get() is None:
+        return None
+    return span("sqlite", statement=" ".join(sql.split())[:_SQL_LABEL_CHARS])
+
+
+def instrument_storage() -> None:
+    from src.storage.db import set_statement_hook
+
+    set_statement_hook(_statement_span)
+
+
+# ---- 完成的 trace ----
+def _finish(trace: Trace, root: Span) -> None:
+    duration_ms = ((root.end or time.perf_counter()) - root.start) * 1000
+    if duration_ms < TRACING_MIN_DURATION_MS:
+        return
+    with trace._lock:
+        spans = list(trace.spans)
+        dropped = trace.dropped
+    record = {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "started_at": trace.started_at.isoformat(timespec="milliseconds"),
+        "duration_ms": round(duration_ms, 3),
+        "status": root.status,
+        "span_count": len(spans),
+        "dropped_spans": dropped,
+        "spans": sorted((s.to_dict() for s in spans), key=lambda s: s["start_ms"]),
+    }
+    with _buffer_lock:
+        _BUFFER.append(record)
+    if TRACING_FILE:
+        _ensure_writer()
+        _writer_queue.put(record)
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+            _writer.start()
+
+
+def _write_loop() -> None:
+    path = Path(TRACING_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        record = _writer_queue.get()
+        try:
+            with path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as exc:
+            print(f"[tracing] failed to write {path}: {exc}")
+
+
+def recent(
+    limit: int = 50,
+    *,
+    min_duration_ms: float = 0,
+    name: Optional[str] = None,
+    errors_only: bool = False,
+) -> List[Dict[str, Any]]:
+    """最近的 trace 摘要（新的在前，不含 span 明细）。"""
+    with _buffer_lock:
+        records = list(_BUFFER)
+    result: List[Dict[str, Any]] = []
+    for record in reversed(records):
+        if record["duration_ms"] < min_duration_ms:
+            continue
+        if name and name not in record["name"]:
+            continue
+        if errors_only and record["status"] == "ok" and not any(s["status"] != "ok" for s in record["spans"]):
+            continue
+        result.append({k: v for k, v in record.items() if k != "spans"})
+        if len(result) >= limit:
+            break
+    return result
+
+
+def get_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    with _buffer_lock:
+        for record in reversed(_BUFFER):
+            if record["trace_id"] == trace_id:
+                return record
+    return None
+
+
+def clear() -> None:
+    with _buffer_lock:
+        _BUFFER.clear()
+
+
+def _root_of(spans: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    ids = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s["parent_id"] not in ids]
+    return min(roots, key=lambda s: s["start_ms"]) if roots else None
+
+
+def critical_path(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """关键路径：从根 span 起，每层取在当前时间窗口内最晚结束的子 span，再向前回溯其开始之前结束的兄弟 span。
+
+    返回按开始时间排序的 span 列表，self_ms 为该 span 在关键路径上未被子 span 覆盖的时间。
+    """
+    spans = record["spans"]
+    root = _root_of(spans)
+    if root is None:
+        return []
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+
+    path: List[Dict[str, Any]] = []
+
+    def _walk(node: Dict[str, Any], window_end: float) -> None:
+        node_end = min(node["start_ms"] + node["duration_ms"], window_end)
+        cursor = node_end
+        covered = 0.0
+        kids = sorted(children.get(node["span_id"], []), key=lambda s: s["start_ms"] + s["duration_ms"], reverse=True)
+        picked: List[Tuple[Dict[str, Any], float]] = []
+        for kid in kids:
+            kid_end = kid["start_ms"] + kid["duration_ms"]
+            # 子 span 在其他线程中可能略晚于父 span 结束，按父 span 窗口截断
+            if kid_end <= cursor + 1e-6 or not picked and kid["start_ms"] < cursor:
+                end = min(kid_end, cursor)
+                picked.append((kid, end))
+                covered += max(0.0, end - max(kid["start_ms"], node["start_ms"]))
+                cursor = kid["start_ms"]
+                if cursor <= node["start_ms"]:
+                    break
+        path.append({
+            "span_id": node["span_id"],
+            "name": node["name"],
+            "start_ms": node["start_ms"],
+            "duration_ms": node["duration_ms"],
+            "self_ms": round(max(0.0, node_end - node["start_ms"] - covered), 3),
+        })
+        for kid, end in picked:
+            _walk(kid, end)
+
+    _walk(root, root["start_ms"] + root["duration_ms"])
+    return sorted(path, key=lambda s: s["start_ms"])
+
+
+def render_text(record: Dict[str, Any], *, max_spans: int = 500) -> str:
+    """文本瀑布图：每行一个 span（按开始时间、缩进表示层级），关键路径上的 span 以 * 标记。"""
+    spans = record["spans"]
+    on_path = {s["span_id"] for s in critical_path(record)}
+    depth: Dict[str, int] = {}
+    by_id = {s["span_id"]: s for s in spans}
+
+    def _depth(s: Dict[str, Any]) -> int:
+        if s["span_id"] not in depth:
+            parent = by_id.get(s["parent_id"])
+            depth[s["span_id"]] = 0 if parent is None else _depth(parent) + 1
+        return depth[s["span_id"]]
+
+    total = max(record["duration_ms"], 1e-6)
+    width = 40
+    lines = [
+        f"{record['name']}  trace={record['trace_id']}  {record['duration_ms']:.1f} ms  "
+        f"spans={record['span_count']} dropped={record['dropped_spans']}"
+    ]
+    for s in spans[:max_spans]:
+        begin = int(s["start_ms"] / total * width)
+        length = max(1, int(s["duration_ms"] / total * width))
+        bar = " " * min(begin, width - 1) + "=" * min(length, width - min(begin, width - 1))
+        mark = "*" if s["span_id"] in on_path else " "
+        status = "" if s["status"] == "ok" else f"  [{s['status']}: {s['error']}]"
+        lines.append(
+            f"{mark} |{bar:<{width}}| {s['start_ms']:>9.1f} {s['duration_ms']:>9.1f}  {'  ' * _depth(s)}{s['name']}{status}"
+        )
+    if len(spans) > max_spans:
+        lines.append(f"... {len(spans) - max_spans} more spans")
+    return "\n".join(lines) + "\n"
+
+
+def _parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class TracingMiddleware:
+    """ASGI 中间件：为业务请求创建 trace 与根 span，结束时按路由模板命名并存入环形缓冲。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/") or path.startswith("/api/system/"):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        incoming_trace, remote_parent = _parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace = Trace(incoming_trace or _new_id(128))
+        method = scope.get("method", "")
+        root = Span(trace, f"{method} {path}", remote_parent, {"http.method": method, "http.path": path})
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                root.attrs["http.status"] = message["status"]
+                if message["status"] >= 500:
+                    root.status = "error"
+                message["headers"] = list(message.get("headers") or []) + [(b"x-trace-id", trace.trace_id.encode())]
+            await send(message)
+
+        token = _CURRENT.set(root)
+        try:
+            await self.app(scope, receive, _send)
+        except BaseException as exc:
+            root.fail(exc)
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _CURRENT.reset(token)
+            template = getattr(scope.get("route"), "path", None)
+            if template:
+                root.name = f"{method} {template}"
+            trace.add(root)
+            _finish(trace, root)
@@ -4,6 +4,8 @@ import csv
 from datetime import datetime
 from typing import List, Optional, Union
 
+from src.storage.article_no import ARTICLE_NUMERALS
+
 def save_segments2csv(format_segments, file_name=None, output_dir="output"):
     """
     保存为CSV格式，方便知识库的批量导入
@@ -58,7 +60,7 @@ def build_toc(segments: Union[List, dict]) -> tuple[dict, dict]:
 
     def parse_article(line: str) -> dict:
         text_line = (line or "").strip()
-        m = re.match(r"^\s*(第[一二三四五六七八九十百千零O0-9０-９]+条)\s*(.*)$", text_line)
+        m = re.match(rf"^\s*(第[{ARTICLE_NUMERALS}]+条)\s*(.*)$", text_line)
         label = None
         body = text_line
         if m:
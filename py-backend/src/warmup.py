@@ -0,0 +1,251 @@
+"""预热：提前加载按需导入的重型依赖并建立外部连接，避免首个对比 / 检索请求承担这些开销。
+
+weaviate 客户端（含 grpc / protobuf）与 Agently 在模块级不再导入（见 weaviateEngine、agents_factory），
+只提供文档库接口的实例启动时不会加载它们。需要时可调用 POST /api/system/warmup 提前加载。
+
+启动预热（WARMUP_ENABLED，run_startup 由 lifespan 作为后台任务运行）依次完成：
+  sqlite     打开连接池的全部连接
+  modules    导入 Agently / weaviate（preload_modules）
+  vector     为 WARMUP_COLLECTIONS 中的集合建立并缓存引擎（连接 + 集合存在性检查）
+  embedding  可选（WARMUP_EMBEDDING），一次极小的 embedding 请求，建立到 SiliconFlow 的 keep-alive 连接
+  llm        可选（WARMUP_LLM），经共享连接池请求 LLM 的 /models，不消耗 token
+必需项（REQUIRED_CHECKS）全部成功后 /health/ready 即返回 200，失败时状态为 degraded，每隔
+WARMUP_RETRY_SECONDS 重试失败项。必需项默认只有 sqlite；WARMUP_REQUIRE_VECTOR=true 时 vector 也是必需项
+（只提供文档库接口的实例不应因向量库故障被摘除）。其余各项与必需项并行、尽力执行，失败只记录，
+不影响就绪：依赖导入不拖慢就绪（保留按需导入带来的冷启动收益），上游故障时也不应摘掉全部实例。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+
+from src.settings import (
+    SILICONFLOW_API_TOKEN,
+    VECTOR_BACKEND,
+    WARMUP_COLLECTIONS,
+    WARMUP_EMBEDDING,
+    WARMUP_LLM,
+    WARMUP_REQUIRE_VECTOR,
+    WARMUP_RETRY_SECONDS,
+    WARMUP_TIMEOUT_SECONDS,
+)
+
+_lock = threading.Lock()
+
+
+def _configure_agents() -> None:
+    from src.agents.agents_factory import AgentFactory
+
+    AgentFactory.configure()
+
+
+def _import(*modules: str) -> Callable[[], None]:
+    def _run() -> None:
+        for name in modules:
+            importlib.import_module(name)
+
+    return _run
+
+
+def _targets() -> List[Tuple[str, str, Callable[[], None]]]:
+    """(名称, 判断是否已加载的模块, 加载函数)。"""
+    targets = [("agently", "agently", _configure_agents)]
+    if VECTOR_BACKEND == "weaviate":
+        targets.append(("weaviate", "weaviate.classes.query", _import("weaviate", "weaviate.classes.config", "weaviate.classes.query")))
+    return targets
+
+
+def preload_modules() -> Dict[str, Dict[str, object]]:
+    """导入尚未加载的重型依赖，返回每项的耗时（毫秒）与是否此前已加载；失败只记录错误。"""
+    result: Dict[str, Dict[str, object]] = {}
+    with _lock:
+        for name, probe, load in _targets():
+            loaded = probe in sys.modules
+            started = time.perf_counter()
+            entry: Dict[str, object] = {"already_loaded": loaded}
+            try:
+                load()
+            except Exception as exc:
+                entry["error"] = str(exc)
+            entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            result[name] = entry
+    return result
+
+
+PENDING = "pending"
+READY = "ready"
+DEGRADED = "degraded"
+STOPPING = "stopping"
+
+REQUIRED_CHECKS = ("sqlite", "vector") if WARMUP_REQUIRE_VECTOR else ("sqlite",)
+
+_state: Dict[str, Any] = {"status": PENDING, "attempts": 0, "warmup_ms": None, "checks": {}}
+_state_lock = threading.Lock()
+
+
+def check_sqlite() -> Dict[str, Any]:
+    from src.storage import get_pool, pooled_connection
+
+    opened = get_pool().prefill()
+    with pooled_connection() as conn:
+        conn.execute("SELECT 1").fetchone()
+    return {"connections": opened}
+
+
+def check_modules() -> Dict[str, Any]:
+    modules = preload_modules()
+    errors = [f"{name}: {entry['error']}" for name, entry in modules.items() if "error" in entry]
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    return {"modules": modules}
+
+
+def warmup_collections() -> List[str]:
+    return [name.strip() for name in WARMUP_COLLECTIONS.split(",") if name.strip()]
+
+
+def check_vector() -> Dict[str, Any]:
+    from api.weaivateApi import _init_engine, release_engine
+
+    names = warmup_collections()
+    for name in names:
+        engine = _init_engine(name)
+        if engine is None:
+            raise RuntimeError(f"集合 {name} 的向量库引擎初始化失败")
+        release_engine(engine)
+    return {"backend": VECTOR_BACKEND, "collections": names}
+
+
+def check_embedding() -> Dict[str, Any]:
+    from api.embeddingApi import get_embeddings_from_siliconflow
+
+    get_embeddings_from_siliconflow("预热", SILICONFLOW_API_TOKEN)
+    return {}
+
+
+async def check_llm() -> Dict[str, Any]:
+    from src.agents.agents_factory import AgentFactory
+
+    status_code = await AgentFactory.ping(timeout=WARMUP_TIMEOUT_SECONDS)
+    if status_code >= 500:
+        raise RuntimeError(f"LLM 服务返回 {status_code}")
+    return {"status_code": status_code}
+
+
+Check = Callable[[], Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+
+
+def _checks() -> List[Tuple[str, Check]]:
+    checks: List[Tuple[str, Check]] = [("sqlite", check_sqlite), ("modules", check_modules), ("vector", check_vector)]
+    if WARMUP_EMBEDDING:
+        checks.append(("embedding", check_embedding))
+    if WARMUP_LLM:
+        checks.append(("llm", check_llm))
+    return checks
+
+
+async def _run_check(func: Check) -> Dict[str, Any]:
+    """执行单项检查；同步检查放到线程中执行（超时后不再等待该线程）。"""
+    started = time.perf_counter()
+    entry: Dict[str, Any] = {"ok": False}
+    try:
+        if asyncio.iscoroutinefunction(func):
+            detail = await asyncio.wait_for(func(), WARMUP_TIMEOUT_SECONDS)
+        else:
+            detail = await asyncio.wait_for(asyncio.to_thread(func), WARMUP_TIMEOUT_SECONDS)
+        entry.update(detail or {})
+        entry["ok"] = True
+    except asyncio.TimeoutError:
+        entry["error"] = f"超时（{WARMUP_TIMEOUT_SECONDS:g}s）"
+    except Exception as exc:
+        entry["error"] = str(exc) or type(exc).__name__
+    entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return entry
+
+
+def _set_status(status: str) -> None:
+    with _state_lock:
+        # 进入 stopping 后不再变回其他状态
+        if _state["status"] != STOPPING:
+            _state["status"] = status
+
+
+def _record(name: str, entry: Dict[str, Any]) -> None:
+    with _state_lock:
+        _state["checks"][name] = entry
+
+
+async def _run_required(pending: List[Tuple[str, Check]], started: float) -> None:
+    """重试必需项直到全部成功（期间状态为 pending / degraded），随后标记就绪。"""
+    # 至少间隔 1 秒，避免配置为 0 时空转
+    delay = max(1.0, WARMUP_RETRY_SECONDS)
+    while True:
+        results = await asyncio.gather(*(_run_check(func) for _, func in pending))
+        for (name, _), entry in zip(pending, results):
+            _record(name, entry)
+        failed = [(name, func) for (name, func), entry in zip(pending, results) if not entry["ok"]]
+        with _state_lock:
+            _state["attempts"] += 1
+            _state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if not failed:
+            _set_status(READY)
+            print(f"[warmup] ready in {_state['warmup_ms']:.0f} ms")
+            return
+        _set_status(DEGRADED)
+        errors = ", ".join(f"{name}: {_state['checks'][name].get('error')}" for name, _ in failed)
+        print(f"[warmup] not ready ({errors}); retrying in {delay:g}s")
+        pending = failed
+        await asyncio.sleep(delay)
+
+
+async def _run_best_effort(name: str, func: Check) -> None:
+    entry = await _run_check(func)
+    _record(name, entry)
+    if not entry["ok"]:
+        print(f"[warmup] {name} skipped: {entry.get('error')}")
+
+
+async def run_startup() -> Dict[str, Any]:
+    """启动预热：必需项成功即就绪，尽力项并行执行、不阻塞就绪；全部结束后返回状态快照。"""
+    started = time.perf_counter()
+    with _state_lock:
+        _state.update(status=PENDING, attempts=0, warmup_ms=None, checks={})
+    checks = _checks()
+    required = [(name, func) for name, func in checks if name in REQUIRED_CHECKS]
+    await asyncio.gather(
+        _run_required(required, started),
+        *(_run_best_effort(name, func) for name, func in checks if name not in REQUIRED_CHECKS),
+    )
+    return snapshot()
+
+
+def mark_ready() -> None:
+    """不做预热（WARMUP_ENABLED=false）时，启动完成即视为就绪。"""
+    _set_status(READY)
+
+
+def mark_stopping() -> None:
+    """应用开始退出：/health/ready 立即返回 503，负载均衡不再分配新请求。"""
+    with _state_lock:
+        _state["status"] = STOPPING
+
+
+def snapshot() -> Dict[str, Any]:
+    with _state_lock:
+        return {
+            "status": _state["status"],
+            "required": list(REQUIRED_CHECKS),
+            "attempts": _state["attempts"],
+            "warmup_ms": _state["warmup_ms"],
+            "checks": {name: dict(entry) for name, entry in _state["checks"].items()},
+        }
+
+
+def is_ready() -> bool:
+    with _state_lock:
+        return _state["status"] == READY
@@ -0,0 +1,236 @@
+"""In-process vector store with the WeaviateEngine interface, for offline runs and load tests.
+
+Selected with VECTOR_BACKEND=memory. Objects live in a process-wide dict keyed by
+collection name, so the short-lived engines created per call by `api.weaivateApi`
+all see the same data; nothing is persisted across restarts. Embeddings still go
+through SiliconFlow (point SILICONFLOW_API_BASE_URL at the mock service to stay
+offline).
+
+Search mirrors the Weaviate payloads: `_distance` is cosine distance for vector
+search, `_score` is a bigram BM25 score for keyword search and a relative-score
+fusion in [0, 1] for hybrid search. Like Weaviate, hybrid results carry no vector
+distance (`_distance` is None), so code gating on distance behaves the same offline.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+from uuid import UUID
+
+from src.storage.fulltext import cjk_bigrams
+from src.weaviate.weaviateEngine import WeaviateEngine
+
+# collection name -> uuid -> object
+_COLLECTIONS: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_LOCK = threading.RLock()
+
+# Weaviate defaults
+_DEFAULT_ALPHA = 0.75
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def _norm(vector: Sequence[float]) -> List[float]:
+    length = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / length for v in vector]
+
+
+def _get_path(data: Dict[str, Any], path: Sequence[str]) -> Any:
+    value: Any = data
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _matches(obj: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the dict payload produced by WeaviateEngine.build_filter (Equal/NotEqual, And/Or)."""
+    if not filters:
+        return True
+    operands = filters.get("operands")
+    if operands is not None:
+        results = [_matches(obj, op) for op in operands]
+        return any(results) if filters.get("operator") == "Or" else all(results)
+    path = list(filters.get("path") or [])
+    # metadata.* filters address the JSON metadata; other paths address properties
+    if path and path[0] == "metadata":
+        actual = _get_path(obj["metadata"], path[1:])
+    else:
+        actual = _get_path(obj, path)
+    expected = next(
+        (filters[k] for k in ("valueString", "valueText", "valueNumber", "valueInt", "valueBoolean") if k in filters),
+        None,
+    )
+    equal = str(actual) == str(expected) if not isinstance(expected, (bool, int, float)) else actual == expected
+    return not equal if filters.get("operator") == "NotEqual" else equal
+
+
+class MemoryEngine(WeaviateEngine):
+    """Drop-in replacement for WeaviateEngine backed by a process-local dict."""
+
+    def __init__(
+        self,
+        collection_name: str,
+        siliconflow_api_token: str,
+        client_params: Optional[Dict[str, Any]] = None,
+        weaviate_api_key: Optional[str] = None,
+    ) -> None:
+        if not collection_name:
+            raise ValueError("collection_name is required")
+        if not siliconflow_api_token:
+            raise ValueError("siliconflow_api_token is required")
+        self.collection_name = collection_name
+        self._siliconflow_api_token = siliconflow_api_token
+        self.client = None
+        if not self._collection_exists():
+            self.create_collection()
+
+    def _collection_exists(self) -> bool:
+        with _LOCK:
+            return self.collection_name in _COLLECTIONS
+
+    def create_collection(self) -> None:
+        with _LOCK:
+            _COLLECTIONS.setdefault(self.collection_name, {})
+
+    def close(self) -> None:
+        pass
+
+    def _objects(self) -> Dict[str, Dict[str, Any]]:
+        with _LOCK:
+            return _COLLECTIONS.setdefault(self.collection_name, {})
+
+    def _upsert_with_vectors(
+        self,
+        *,
+        vectors: Sequence[Sequence[float]],
+        documents: Sequence[Dict[str, Any]],
+        text_key: str,
+        title_key: str,
+        metadata_key: str,
+        batch_size: int,
+    ) -> int:
+        if len(vectors) != len(documents):
+            raise ValueError("vectors and documents sequences must be the same length")
+        objects = self._objects()
+        with _LOCK:
+            for doc, vector in zip(documents, vectors):
+                content = doc.get(text_key, "")
+                objects[self._ensure_uuid(doc)] = {
+                    "content": content,
+                    "title": doc.get(title_key, "") or doc.get("id", ""),
+                    "metadata": json.loads(json.dumps(doc.get(metadata_key, {}), ensure_ascii=False)),
+                    "source_id": str(doc.get("id") or ""),
+                    "vector": _norm([float(v) for v in vector]),
+                    "terms": Counter(cjk_bigrams(content).split()),
+                }
+        return len(documents)
+
+    def delete_document_by_id(self, uuid_value: Union[str, UUID]) -> bool:
+        try:
+            normalized_uuid = str(UUID(str(uuid_value)))
+        except ValueError as error:
+            print(f"Invalid UUID provided: {error}")
+            return False
+        with _LOCK:
+            return self._objects().pop(normalized_uuid, None) is not None
+
+    def delete_collection(self, collection_name: Optional[str] = None) -> bool:
+        with _LOCK:
+            return _COLLECTIONS.pop(collection_name or self.collection_name, None) is not None
+
+    # ---- search ----
+    def _bm25(self, query: str, candidates: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        terms = set(cjk_bigrams(query).split())
+        if not terms or not candidates:
+            return {}
+        n = len(candidates)
+        avg_len = sum(sum(o["terms"].values()) for o in candidates.values()) / n or 1.0
+        df = {t: sum(1 for o in candidates.values() if t in o["terms"]) for t in terms}
+        scores: Dict[str, float] = {}
+        for uid, obj in candidates.items():
+            length = sum(obj["terms"].values())
+            score = 0.0
+            for t in terms:
+                tf = obj["terms"].get(t, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                score += idf * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_len))
+            if score > 0:
+                scores[uid] = score
+        return scores
+
+    def _distances(self, vector: Sequence[float], candidates: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        q = _norm([float(v) for v in vector])
+        return {uid: 1.0 - sum(a * b for a, b in zip(q, obj["vector"])) for uid, obj in candidates.items()}
+
+    @staticmethod
+    def _payload(uid: str, obj: Dict[str, Any], **scores: Optional[float]) -> Dict[str, Any]:
+        payload = {
+            "uuid": uid,
+            "text": obj["content"],
+            "title": obj["title"],
+            "metadata": obj["metadata"],
+            "source_id": obj["source_id"],
+        }
+        payload.update({f"_{k}": v for k, v in scores.items()})
+        return payload
+
+    def search(
+        self,
+        query: str,
+        *,
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        search_type: str = "hybrid",
+        alpha: Optional[float] = None,
+        fusion_type: Optional[str] = None,
+        max_vector_distance: Optional[float] = None,
+        bm25_properties: Optional[Sequence[str]] = None,
+        bm25_search_operator: Optional[int] = None,
+        vector: Optional[Sequence[float]] = None,
+    ) -> List[Dict[str, Any]]:
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("query must be a non-empty string")
+        with _LOCK:
+            candidates = {uid: obj for uid, obj in self._objects().items() if _matches(obj, filters)}
+        st = (search_type or "hybrid").lower()
+
+        if st == "keyword":
+            scores = self._bm25(query, candidates)
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            return [self._payload(uid, candidates[uid], score=score) for uid, score in ranked]
+
+        vec = list(vector) if vector is not None else self._embed_texts([query])[0]
+        distances = self._distances(vec, candidates)
+        if st == "vector":
+            ranked = sorted(distances.items(), key=lambda kv: kv[1])[:limit]
+            return [self._payload(uid, candidates[uid], distance=d) for uid, d in ranked]
+
+        # hybrid: relative score fusion of BM25 and vector similarity, both min-max normalized
+        if max_vector_distance is not None:
+            distances = {uid: d for uid, d in distances.items() if d <= float(max_vector_distance)}
+        a = _DEFAULT_ALPHA if alpha is None else float(alpha)
+        bm25 = self._bm25(query, {uid: candidates[uid] for uid in distances})
+
+        def _scaled(values: Dict[str, float], invert: bool = False) -> Dict[str, float]:
+            if not values:
+                return {}
+            lo, hi = min(values.values()), max(values.values())
+            span = (hi - lo) or 1.0
+            return {k: ((hi - v) if invert else (v - lo)) / span for k, v in values.items()}
+
+        vec_scores = _scaled(distances, invert=True)
+        kw_scores = _scaled(bm25)
+        fused = {uid: a * vec_scores.get(uid, 0.0) + (1 - a) * kw_scores.get(uid, 0.0) for uid in distances}
+        ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [self._payload(uid, candidates[uid], distance=None, score=s) for uid, s in ranked]
+
+
+__all__ = ["MemoryEngine"]
@@ -7,21 +7,21 @@ import os
 import sys
 from collections.abc import Iterable
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Union
 from uuid import UUID, NAMESPACE_DNS, uuid4, uuid5
 
-import weaviate
-import weaviate.classes.config as wc
-from weaviate import WeaviateClient
-from weaviate.auth import AuthApiKey
-from weaviate.classes.query import MetadataQuery
-import weaviate.classes.query as wq
-from weaviate.collections import Collection
+# The weaviate client (with grpc and protobuf) takes ~0.7s to import, so it is imported
+# inside the methods that talk to Weaviate. Instances running VECTOR_BACKEND=memory or only
+# serving the document library never load it.
+if TYPE_CHECKING:
+    from weaviate import WeaviateClient
+    from weaviate.collections import Collection
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 from api.embeddingApi import get_embeddings_from_siliconflow
+from src import metrics
 from src.settings import (
     WEAVIATE_HTTP_HOST as DEFAULT_WEAVIATE_HTTP_HOST,
     WEAVIATE_HTTP_PORT as DEFAULT_WEAVIATE_HTTP_PORT,
@@ -51,6 +51,8 @@ class WeaviateEngine:
         self.collection_name = collection_name
         self._siliconflow_api_token = siliconflow_api_token
 
+        import weaviate
+
         params = self._build_client_params(client_params, weaviate_api_key)
         self.client: WeaviateClient = weaviate.connect_to_custom(
             skip_init_checks=False,
@@ -78,6 +80,8 @@ class WeaviateEngine:
 
         api_key = weaviate_api_key or base_params.pop("api_key", DEFAULT_WEAVIATE_API_KEY)
         if "auth_credentials" not in base_params:
+            from weaviate.auth import AuthApiKey
+
             base_params["auth_credentials"] = AuthApiKey(api_key)
 
         return base_params
@@ -90,6 +94,8 @@ class WeaviateEngine:
             return False
 
     def create_collection(self) -> None:
+        import weaviate.classes.config as wc
+
         try:
             self.client.collections.create(
                 name=self.collection_name,
@@ -114,6 +120,8 @@ class WeaviateEngine:
         if not texts:
             raise ValueError("texts collection must not be empty")
 
+        metrics.EMBEDDINGS_REQUESTED.inc(len(texts))
+        metrics.EMBEDDING_BATCH_SIZE.observe(len(texts))
         payload = get_embeddings_from_siliconflow(inputs=list(texts), api_token=self._siliconflow_api_token)
         data = payload.get("data", []) if isinstance(payload, dict) else []
         if len(data) != len(texts):
@@ -326,6 +334,8 @@ class WeaviateEngine:
     ) -> List[Dict[str, Any]]:
         if not isinstance(query, str) or not query.strip():
             raise ValueError("query must be a non-empty string")
+        import weaviate.classes.query as wq
+
         collection = self._get_collection()
         st = (search_type or "hybrid").lower()
         payloads: List[Dict[str, Any]] = []
@@ -365,7 +375,7 @@ class WeaviateEngine:
 
         if st == "vector":
             vec = list(vector) if vector is not None else self._embed_texts([query])[0]
-            meta = MetadataQuery(distance=True)
+            meta = wq.MetadataQuery(distance=True)
             results = collection.query.near_vector(
                 near_vector=vec,
                 limit=limit,
@@ -33,68 +33,13 @@ def get_db_connection():
 
 
 def initialize_schema(conn: sqlite3.Connection) -> None:
-    """创建数据库表结构（与 src/storage/db.py 保持一致）"""
-    cur = conn.cursor()
-    cur.executescript(
-        """
-        PRAGMA foreign_keys = ON;
-
-        -- collections 表
-        CREATE TABLE IF NOT EXISTS collections (
-          id TEXT PRIMARY KEY,
-          name TEXT,
-          description TEXT,
-          provider TEXT,
-          config TEXT,
-          is_active INTEGER DEFAULT 1,
-          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- documents 表
-        CREATE TABLE IF NOT EXISTS documents (
-          id TEXT PRIMARY KEY,
-          collection_id TEXT,
-          source_filename TEXT,
-          storage_path TEXT,
-          original_mime TEXT,
-          status TEXT,
-          page_count INTEGER,
-          word_count INTEGER,
-          summary TEXT,
-          keywords TEXT,
-          parsing_payload TEXT,
-          last_error TEXT,
-          version INTEGER DEFAULT 1,
-          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-          FOREIGN KEY (collection_id) REFERENCES collections(id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_documents_collection ON documents(collection_id);
+    """创建/升级数据库表结构（直接复用 src/storage/db.py，避免两份建表语句不一致）"""
+    backend_root = Path(__file__).parent.parent
+    if str(backend_root) not in sys.path:
+        sys.path.append(str(backend_root))
+    from src.storage.db import initialize_schema as _initialize_schema
 
-        -- chunks 表
-        CREATE TABLE IF NOT EXISTS chunks (
-          id TEXT PRIMARY KEY,
-          doc_id TEXT,
-          collection_id TEXT,
-          chunk_index INTEGER,
-          title TEXT,
-          section_path TEXT,
-          content TEXT,
-          token_count INTEGER,
-          metadata TEXT,
-          weaviate_id TEXT,
-          embedding_status TEXT,
-          last_error TEXT,
-          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-          updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-          FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE
-        );
-        CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id);
-        CREATE INDEX IF NOT EXISTS idx_chunks_weaviate ON chunks(weaviate_id);
-        """
-    )
-    conn.commit()
+    _initialize_schema(conn)
 
 
 def clean_all_tables():
@@ -0,0 +1,142 @@
+"""压测：上传解析进行中时 /api/rag/documents 的延迟是否保持平稳。
+
+需要先启动后端服务（python app.py），然后：
+    python tests/load_test_documents.py --base-url http://127.0.0.1:10010 --file ./sample.md
+
+两个阶段各持续 --duration 秒：
+  1) baseline：仅有 --readers 个线程循环请求 /api/rag/documents
+  2) under ingest：同时有 --ingests 个线程循环调用 /api/rag/ingest-and-index
+输出两阶段的 p50 / p95 / p99；under ingest 的 p99 超过 baseline 的 --max-ratio 倍时以非 0 退出。
+"""
+
+import argparse
+import math
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def reader_loop(base_url: str, params: Dict[str, str], stop: threading.Event, out: List[float], errors: List[str]):
+    session = requests.Session()
+    url = f"{base_url}/api/rag/documents"
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            resp = session.get(url, params=params, timeout=30)
+            resp.raise_for_status()
+        except Exception as exc:
+            errors.append(str(exc))
+            continue
+        out.append(time.perf_counter() - started)
+
+
+def ingest_loop(base_url: str, file_path: Path, collection: str, stop: threading.Event, done: List[int], errors: List[str]):
+    session = requests.Session()
+    url = f"{base_url}/api/rag/ingest-and-index"
+    payload = file_path.read_bytes()
+    while not stop.is_set():
+        try:
+            resp = session.post(
+                url,
+                files={"file": (file_path.name, payload)},
+                data={"collection_name": collection},
+                timeout=600,
+            )
+            resp.raise_for_status()
+            done.append(1)
+        except Exception as exc:
+            errors.append(str(exc))
+            time.sleep(0.5)
+
+
+def run_phase(args, with_ingest: bool) -> Dict[str, float]:
+    stop = threading.Event()
+    latencies: List[float] = []
+    read_errors: List[str] = []
+    ingested: List[int] = []
+    ingest_errors: List[str] = []
+    params = {"limit": str(args.limit)}
+    if args.collection:
+        params["collection_name"] = args.collection
+
+    threads = [
+        threading.Thread(target=reader_loop, args=(args.base_url, params, stop, latencies, read_errors), daemon=True)
+        for _ in range(args.readers)
+    ]
+    if with_ingest:
+        threads += [
+            threading.Thread(
+                target=ingest_loop,
+                args=(args.base_url, Path(args.file), args.ingest_collection, stop, ingested, ingest_errors),
+                daemon=True,
+            )
+            for _ in range(args.ingests)
+        ]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    stats = summarize(latencies)
+    stats["read_errors"] = len(read_errors)
+    if with_ingest:
+        stats["ingests_completed"] = len(ingested)
+        stats["ingest_errors"] = len(ingest_errors)
+        if ingest_errors:
+            print(f"  first ingest error: {ingest_errors[0]}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/rag/documents latency under concurrent ingests")
+    parser.add_argument("--base-url", default="http://127.0.0.1:10010")
+    parser.add_argument("--file", required=True, help="上传用的样例文档（.md/.txt/.pdf/.docx）")
+    parser.add_argument("--collection", default=None, help="读取的集合名，默认 DEFAULT_COLLECTION_NAME")
+    parser.add_argument("--ingest-collection", default="loadtest_ingest")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--ingests", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print("phase 1: baseline")
+    baseline = run_phase(args, with_ingest=False)
+    print(f"  {baseline}")
+    print("phase 2: under ingest")
+    loaded = run_phase(args, with_ingest=True)
+    print(f"  {loaded}")
+
+    ratio = loaded["p99_ms"] / baseline["p99_ms"] if baseline["p99_ms"] else float("inf")
+    print(f"p99 ratio (under ingest / baseline): {ratio:.2f}")
+    if not loaded["count"] or ratio > args.max_ratio:
+        print("FAIL: /api/rag/documents p99 degraded while ingests were running")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add src to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = BASE_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="analysis_cache_"))
+
+from storage import init_storage_and_db, AnalysisCacheRepo  # noqa: E402
+
+
+def main():
+    init_storage_and_db()
+    repo = AnalysisCacheRepo()
+
+    candidates = [{"nation_name": "国家文件A", "clause": "条款一"}, {"nation_name": "国家文件B", "clause": "条款二"}]
+    key = AnalysisCacheRepo.make_key("v1", "qwen3-max", "地方条款", candidates)
+    # 候选顺序不影响 key；提示词版本 / 模型 / 条款变化都会产生新 key
+    assert key == AnalysisCacheRepo.make_key("v1", "qwen3-max", "地方条款", list(reversed(candidates)))
+    assert key != AnalysisCacheRepo.make_key("v2", "qwen3-max", "地方条款", candidates)
+    assert key != AnalysisCacheRepo.make_key("v1", "other-model", "地方条款", candidates)
+    assert key != AnalysisCacheRepo.make_key("v1", "qwen3-max", "地方条款（修改）", candidates)
+
+    result = {"差异类型": "细化", "差异描述": "...", "差异关键词": "交易申报", "相似国家条款": []}
+    assert repo.get(key) is None
+    repo.put(key, result, prompt_version="v1", model="qwen3-max", local_doc_id="doc-1")
+    assert repo.get(key) == result
+    assert repo.get(key, ttl_seconds=3600) == result
+
+    # TTL：把条目改为 2 小时前写入
+    repo.conn.execute("UPDATE analysis_cache SET created_at = datetime('now', '-7200 seconds')")
+    repo.conn.commit()
+    assert repo.get(key, ttl_seconds=3600) is None
+    assert repo.evict(ttl_seconds=3600) == 1
+
+    # 容量淘汰：保留最近访问的条目
+    for i in range(5):
+        repo.put(f"k{i}", {"i": i}, prompt_version="v1", model="m", local_doc_id="doc-2")
+    repo.conn.execute("UPDATE analysis_cache SET accessed_at = datetime('now', '-1 day') WHERE cache_key != 'k0'")
+    repo.conn.commit()
+    assert repo.evict(max_entries=2) == 3
+    assert repo.get("k0") == {"i": 0}
+
+    assert repo.stats()["entries"] == 2
+    assert repo.invalidate(local_doc_id="doc-2") == 2
+    assert repo.stats()["entries"] == 0
+    print("test_analysis_cache: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add src to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = BASE_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="article_index_"))
+
+from storage import (  # noqa: E402
+    init_storage_and_db,
+    parse_article_no,
+    chinese_numeral_to_int,
+    CollectionsRepo,
+    DocumentsRepo,
+    ChunksRepo,
+)
+from storage.pipeline import flatten_segments_to_chunks  # noqa: E402
+
+
+def check_parser():
+    cases = {
+        "第一条": 1,
+        "第十条": 10,
+        "第十二条": 12,
+        "第二十三条 本办法所称...": 23,
+        "第一百零五条": 105,
+        "第一〇五条": 105,
+        "第23条": 23,
+        "第２３条": 23,
+        "第二十3条": 23,
+        "第1O条": 10,
+    }
+    for label, expected in cases.items():
+        assert parse_article_no(label) == expected, (label, parse_article_no(label))
+    assert parse_article_no("一、总则") is None
+    assert parse_article_no(None) is None
+    assert chinese_numeral_to_int("一千零一") == 1001
+    print("parser ok")
+
+
+def check_ingest_split():
+    # 入库拆分与解析器使用同一字符集：能解析的条号（含“〇”）也能拆出标题
+    chunks = flatten_segments_to_chunks(["第一〇条 本办法自发布之日起施行。", "第1O条 附则。"])
+    assert [(c["title"], c["article_no"], c["content"]) for c in chunks] == [
+        ("第一〇条", 10, "本办法自发布之日起施行。"),
+        ("第1O条", 10, "附则。"),
+    ]
+    print("ingest split ok")
+
+
+def check_lookup():
+    init_storage_and_db()
+    c_repo = CollectionsRepo()
+    col_id = c_repo.create(name="unittest_article_index")
+    d_repo = DocumentsRepo(c_repo.conn)
+    doc_id = d_repo.create(collection_id=col_id, source_filename="a.md", storage_path="docs/a.md")
+    ch_repo = ChunksRepo(c_repo.conn)
+    labels = ["第一条", "第二条", "第二十三条", "第二十四条"]
+    for i, label in enumerate(labels):
+        ch_repo.create(doc_id=doc_id, collection_id=col_id, chunk_index=i, title=label, content=f"内容{i}")
+
+    hit = ch_repo.get_by_article(doc_id, 23)
+    assert len(hit) == 1 and hit[0]["title"] == "第二十三条"
+    rng = ch_repo.list_by_article_range(doc_id, 2, 23)
+    assert [c["article_no"] for c in rng] == [2, 23]
+
+    # 修改标题后条号同步
+    ch_repo.update(hit[0]["id"], title="第三十条")
+    assert ch_repo.get_by_article(doc_id, 30)
+    print("lookup ok")
+
+
+def main():
+    check_parser()
+    check_ingest_split()
+    check_lookup()
+    print("test_article_index: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from src.agents.candidate_table import CandidateTable, compact_clause, format_candidates, resolve_candidates  # noqa: E402
+
+SEGMENTS = [
+    {"nation_name": "电力市场运行基本规则.pdf", "clause": "## 第五条\n\n  **电力市场成员**应当遵守  国家有关规定。"},
+    {"nation_name": "电力市场信息披露基本规则.pdf", "clause": "第九条 电力交易机构应当按照规定 披露信息。"},
+    {"nation_name": "电力市场运行基本规则.pdf", "clause": "第十条 市场成员应当签订 CfD contract。"},
+]
+
+
+def main():
+    assert compact_clause("## 第五条\n\n  **电力市场成员**应当遵守") == "第五条电力市场成员应当遵守"
+    assert compact_clause("签订 CfD  contract 。") == "签订CfD contract。"
+
+    text = format_candidates(SEGMENTS)
+    assert text.splitlines() == [
+        "D1=电力市场运行基本规则",
+        "D2=电力市场信息披露基本规则",
+        "[1] D1 第五条电力市场成员应当遵守国家有关规定。",
+        "[2] D2 第九条电力交易机构应当按照规定披露信息。",
+        "[3] D1 第十条市场成员应当签订CfD contract。",
+    ]
+    assert format_candidates([]) == "（无）"
+    # 序列化结果稳定，且比 Python repr 更短
+    assert format_candidates(SEGMENTS) == text and len(text) < len(str(SEGMENTS))
+
+    # 同一批次共用文件编号
+    table = CandidateTable()
+    table.format(SEGMENTS[1:2])
+    table.format(SEGMENTS[:1])
+    assert table.documents_text() == "D1=电力市场信息披露基本规则\nD2=电力市场运行基本规则"
+
+    # 候选编号还原为原文；越界、重复的编号丢弃，旧格式原样保留
+    parsed = {"差异类型": "细化", "相似国家条款": [{"候选编号": "[2]"}, {"候选编号": 2}, {"候选编号": "7"}, 1,
+                                                   {"国家政策文件": "旧", "国家政策条款": "旧条款"}]}
+    resolved = resolve_candidates(parsed, SEGMENTS)["相似国家条款"]
+    assert resolved == [
+        {"国家政策文件": SEGMENTS[1]["nation_name"], "国家政策条款": SEGMENTS[1]["clause"]},
+        {"国家政策文件": SEGMENTS[0]["nation_name"], "国家政策条款": SEGMENTS[0]["clause"]},
+        {"国家政策文件": "旧", "国家政策条款": "旧条款"},
+    ]
+    assert resolve_candidates(None, SEGMENTS) is None
+    print("test_candidate_table: OK")
+
+
+if __name__ == "__main__":
+    main()
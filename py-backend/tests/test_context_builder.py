@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from src.agents.context_builder import build_clause_context, estimate_tokens, plan_batches  # noqa: E402
+
+
+def _chunks():
+    chunks = [
+        {"chunk_index": 0, "title": "第一条", "content": "为规范电力市场交易，制定本办法。", "section_path": ["第一章 总则"]},
+        {"chunk_index": 1, "title": "第二条", "content": "本办法所称市场主体，是指发电企业、售电公司和电力用户。", "section_path": ["第一章 总则"]},
+    ]
+    for i in range(2, 40):
+        chunks.append({
+            "chunk_index": i,
+            "title": f"第{i + 1}条",
+            "content": "交易组织相关规定" * 20,
+            "section_path": ["第三章 交易组织", "第一节 集中交易"],
+        })
+    return chunks
+
+
+def main():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("市场主体") == 4
+    assert estimate_tokens("abcd efgh") == 2
+
+    chunks = _chunks()
+    full_text = "\n".join(f"{c['title']} {c['content']}" for c in chunks)
+    ctx = build_clause_context(chunks, 20, token_budget=600, neighbor_window=2)
+    assert ctx.tokens <= 600, ctx.tokens
+    assert ctx.tokens < estimate_tokens(full_text) / 5
+    assert "第三章 交易组织 > 第一节 集中交易" in ctx.text
+    # 紧邻条款与定义条款优先纳入，当前条款本身不重复发送
+    assert 19 in ctx.chunk_indexes and 21 in ctx.chunk_indexes
+    assert ctx.definition_indexes == [1]
+    assert "本办法所称市场主体" in ctx.text
+    assert 20 not in ctx.chunk_indexes
+
+    # 预算很小时只保留章节路径与截断后的片段
+    tiny = build_clause_context(chunks, 20, token_budget=80, neighbor_window=2)
+    assert tiny.truncated and tiny.tokens <= 80
+
+    # 分批：受 token 预算与条数上限约束，超预算的单条单独成批
+    assert plan_batches([100, 100, 100, 100], token_budget=250, max_items=8) == [[0, 1], [2, 3]]
+    assert plan_batches([100] * 5, token_budget=10_000, max_items=2) == [[0, 1], [2, 3], [4]]
+    assert plan_batches([50, 900, 50], token_budget=500, max_items=8) == [[0], [1], [2]]
+    assert plan_batches([100, 100], token_budget=250, max_items=8, shared_tokens=100) == [[0], [1]]
+    print("test_context_builder: OK")
+
+
+if __name__ == "__main__":
+    main()
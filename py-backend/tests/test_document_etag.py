@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="document_etag_"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from router.rag import router  # noqa: E402
+from src.doc_structure_recognition import build_segments_struct  # noqa: E402
+from src.storage import ChunksRepo, DocumentsRepo, init_storage_and_db, persist_parsed_document, pooled_connection  # noqa: E402
+from src.utils import build_toc  # noqa: E402
+
+SAMPLE = "第一章 总则\n第一条 本办法适用于电力市场。\n第二条 市场交易遵循公平原则。\n"
+
+
+def _ingest() -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".md") as tmp:
+        tmp.write(SAMPLE.encode("utf-8"))
+    segments = build_segments_struct(file_content=SAMPLE, file_name="etag.md").get("segments", [])
+    toc, _ = build_toc(segments)
+    result = persist_parsed_document(
+        temp_file_path=tmp.name,
+        filename="etag.md",
+        original_mime="text/markdown",
+        file_content=SAMPLE,
+        segments=segments,
+        toc=toc,
+        keywords=None,
+        collection_name="unittest_etag",
+    )
+    return result["doc_id"]
+
+
+def main():
+    init_storage_and_db()
+    doc_id = _ingest()
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    for path in (f"/api/rag/documents/{doc_id}/parsed", f"/api/rag/documents/{doc_id}/chunks"):
+        first = client.get(path)
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and etag.startswith('"') and "no-cache" in first.headers["cache-control"]
+        assert client.get(path).headers["etag"] == etag
+
+        cached = client.get(path, headers={"If-None-Match": f'"stale", W/{etag}'})
+        assert cached.status_code == 304 and cached.content == b"" and cached.headers["etag"] == etag
+        assert client.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    # 分段状态变化（不改 documents 行）同样使 ETag 失效
+    chunks_path = f"/api/rag/documents/{doc_id}/chunks"
+    before = client.get(chunks_path).headers["etag"]
+    with pooled_connection() as conn:
+        ch_repo = ChunksRepo(conn)
+        ch_repo.mark_failed([str(ch["id"]) for ch in ch_repo.list_by_doc(doc_id)[:1]], "boom")
+    after = client.get(chunks_path, headers={"If-None-Match": before})
+    assert after.status_code == 200 and after.headers["etag"] != before
+    assert any(seg["status"] == "error" for seg in after.json()["data"])
+
+    # 批量分块写入每条语句只加一次版本号，不随分块行数放大
+    with pooled_connection() as conn:
+        ch_repo, doc_repo = ChunksRepo(conn), DocumentsRepo(conn)
+        collection_id = doc_repo.get(doc_id)["collection_id"]
+        start = doc_repo.get_version(doc_id)[0]
+        ids = ch_repo.bulk_create(
+            [{"chunk_index": 100 + i, "title": None, "content": f"分块{i}"} for i in range(500)],
+            doc_id=doc_id,
+            collection_id=collection_id,
+        )
+        assert doc_repo.get_version(doc_id)[0] == start + 1
+        ch_repo.mark_embedded(ids, ids)
+        ch_repo.mark_failed(ids, "boom")
+        assert doc_repo.get_version(doc_id)[0] == start + 3
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'chunks' "
+                                "AND name LIKE '%doc_version'").fetchall()
+
+    parsed_path = f"/api/rag/documents/{doc_id}/parsed"
+    before = client.get(parsed_path).headers["etag"]
+    with pooled_connection() as conn:
+        DocumentsRepo(conn).update(doc_id, keywords=["市场"])
+    assert client.get(parsed_path, headers={"If-None-Match": before}).status_code == 200
+
+    assert client.get("/api/rag/documents/missing/parsed").status_code == 404
+    print("test_document_etag: OK")
+
+
+if __name__ == "__main__":
+    main()
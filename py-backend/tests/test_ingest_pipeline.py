@@ -68,6 +68,40 @@ def main():
     assert (parsed_dir / "segments.json").exists()
     assert (parsed_dir / "keywords.json").exists()
 
+    # 持久化失败时应整体回滚：不留文档记录、分块与落盘目录
+    original_bulk_create = ChunksRepo.bulk_create
+
+    def failing_bulk_create(self, *args, **kwargs):
+        original_bulk_create(self, *args, **kwargs)
+        raise RuntimeError("simulated failure after chunk insert")
+
+    ChunksRepo.bulk_create = failing_bulk_create
+    try:
+        persist_parsed_document(
+            temp_file_path=temp_path,
+            filename="unittest_policy_failed.md",
+            original_mime="text/markdown",
+            file_content=sample_content,
+            segments=segments,
+            toc=toc_tree,
+            keywords=None,
+            collection_name="unittest_collection",
+        )
+        raise AssertionError("persist should have failed")
+    except RuntimeError:
+        pass
+    finally:
+        ChunksRepo.bulk_create = original_bulk_create
+    failed_docs = [
+        d for d in doc_repo.list_by_collection(result["collection_id"])
+        if d.get("source_filename") == "unittest_policy_failed.md"
+    ]
+    assert not failed_docs, "failed ingest left a document row behind"
+    orphan = chunk_repo.conn.execute(
+        "SELECT COUNT(*) FROM chunks WHERE doc_id NOT IN (SELECT id FROM documents)"
+    ).fetchone()[0]
+    assert orphan == 0, "failed ingest left chunks behind"
+
     print("test_ingest_pipeline: OK")
 
     # 清理临时原始上传文件
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from mock_services.server import embed  # noqa: E402
+from src.weaviate.memoryEngine import MemoryEngine  # noqa: E402
+
+DOCS = [
+    {"id": "c1", "title": "第一条", "content": "售电公司应当按照规定向电力交易机构提交履约保函。", "metadata": {"doc_id": "D1"}},
+    {"id": "c2", "title": "第二条", "content": "电网企业应当按月披露结算依据。", "metadata": {"doc_id": "D1"}},
+    {"id": "c3", "title": "第三条", "content": "发电企业不得擅自变更市场注册材料。", "metadata": {"doc_id": "D2"}},
+]
+
+
+class _OfflineEngine(MemoryEngine):
+    """使用模拟 embedding，不访问网络。"""
+
+    def _embed_texts(self, texts):
+        return [embed(t) for t in texts]
+
+
+def main():
+    engine = _OfflineEngine("test_memory_engine", siliconflow_api_token="mock")
+    assert engine.index_documents(DOCS) == 3
+
+    query = "售电公司应当向电力交易机构提交履约保函"
+    hybrid = engine.search(query, limit=2)
+    assert hybrid[0]["source_id"] == "c1" and hybrid[0]["metadata"] == {"doc_id": "D1"}
+    assert set(hybrid[0]) >= {"uuid", "text", "title", "metadata", "source_id", "_distance", "_score"}
+    # 与 Weaviate 一致：混合检索只有融合得分，没有向量距离
+    assert all(r["_distance"] is None and 0 <= r["_score"] <= 1 for r in hybrid)
+
+    vector = engine.search(query, search_type="vector", limit=3)
+    assert [r["_distance"] for r in vector] == sorted(r["_distance"] for r in vector)
+    assert vector[0]["_distance"] < 0.5 < vector[-1]["_distance"]
+
+    keyword = engine.search("结算依据", search_type="keyword")
+    assert [r["source_id"] for r in keyword] == ["c2"] and keyword[0]["_score"] > 0
+
+    # 过滤条件结构与 WeaviateEngine.build_filter 一致
+    only_d2 = engine.build_filter([{"key": "metadata.doc_id", "match": "D2"}])
+    assert [r["source_id"] for r in engine.search(query, filters=only_d2)] == ["c3"]
+    assert engine.search(query, max_vector_distance=0.01) == []
+
+    # 同一 id 重复写入为更新；按 uuid 删除
+    engine.index_documents([dict(DOCS[1], content="电网企业应当按日披露结算依据。")])
+    assert len(engine.search("披露", search_type="keyword")) == 1
+    assert engine.delete_document_by_id(hybrid[0]["uuid"])
+    # 新建引擎实例可见同一集合
+    assert len(_OfflineEngine("test_memory_engine", siliconflow_api_token="mock").search(query, limit=10)) == 2
+    assert engine.drop_collection()
+    print("test_memory_engine: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from src.metrics import Counter, Histogram, Registry  # noqa: E402
+from src.agents.agents_factory import _extract_usage  # noqa: E402
+
+
+def test_prometheus_text():
+    registry = Registry()
+    requests_total = registry.register(Counter("t_requests_total", "Requests.", ("route",)))
+    latency = registry.register(Histogram("t_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)))
+    requests_total.inc(1, "/a")
+    requests_total.inc(2, '/b"x')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "/a")
+    text = registry.render()
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{route="/a"} 1' in text
+    assert 't_requests_total{route="/b\\"x"} 2' in text
+    # 桶为累计计数，最后是 +Inf
+    assert 't_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{route="/a"} 3' in text
+    try:
+        requests_total.inc(1)
+        raise AssertionError("missing labels should raise")
+    except ValueError:
+        pass
+    print("test_prometheus_text: OK")
+
+
+def test_extract_usage():
+    body = b'{"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}'
+    assert _extract_usage(body)["prompt_tokens"] == 12
+    sse = (
+        b'data: {"choices": [{"delta": {"content": "a"}}]}\n\n'
+        b'data: {"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": 2}}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    assert _extract_usage(sse)["completion_tokens"] == 2
+    assert _extract_usage(b'data: {"choices": []}\n\n') is None
+    print("test_extract_usage: OK")
+
+
+def main():
+    test_prometheus_text()
+    test_extract_usage()
+
+
+if __name__ == "__main__":
+    main()
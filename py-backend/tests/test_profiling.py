@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="profiling_"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from router.system import router as system_router  # noqa: E402
+from src import profiling  # noqa: E402
+from src.concurrency import run_blocking  # noqa: E402
+
+
+def _busy(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+    return n
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/work")
+    async def work():
+        return {"n": await run_blocking(_busy, 0.05)}
+
+    app.include_router(system_router)
+    app.add_middleware(profiling.ProfilingMiddleware)
+    return TestClient(app)
+
+
+def test_requested_mode():
+    assert profiling.requested_mode({}, "") is None
+    assert profiling.requested_mode({"x-profile": "cprofile"}, "") == "cprofile"
+    assert profiling.requested_mode({}, "profile=1") == "sample"
+    assert profiling.requested_mode({}, "profile=bogus") is None
+
+
+def test_profiled_requests():
+    profiling.PROFILING_TOKEN = "secret"
+    client = _client()
+    auth = {"X-Profile-Token": "secret"}
+
+    # 未带标记：不剖析；令牌错误：照常响应但跳过
+    assert "x-profile-id" not in client.get("/api/work").headers
+    resp = client.get("/api/work", headers={"X-Profile": "1", "X-Profile-Token": "wrong"})
+    assert resp.status_code == 200 and resp.headers["x-profile-skipped"] == "forbidden"
+
+    resp = client.get("/api/work?profile=sample", headers={**auth, "X-Request-ID": "req-1"})
+    assert resp.headers["x-profile-id"] == "req-1"
+    stacks = (profiling.profiles_dir() / "req-1" / "stacks.collapsed").read_text(encoding="utf-8")
+    assert "_busy" in stacks
+
+    resp = client.get("/api/work", headers={**auth, "X-Profile": "cprofile"})
+    cprofile_id = resp.headers["x-profile-id"]
+    detail = client.get(f"/api/system/profiles/{cprofile_id}", headers=auth).json()
+    assert detail["profile"]["mode"] == "cprofile" and detail["profile"]["status"] == 200
+    # 线程池中执行的函数计入请求的 pstats
+    assert "_busy" in detail["summary"]
+    raw = client.get(f"/api/system/profiles/{cprofile_id}/files/profile.pstats", headers=auth)
+    assert raw.status_code == 200 and raw.content
+
+    assert client.get("/api/system/profiles").status_code == 403
+    ids = [p["id"] for p in client.get("/api/system/profiles", headers=auth).json()["profiles"]]
+    assert ids == [cprofile_id, "req-1"]
+    assert client.get("/api/system/profiles/req-1/files/..%2Fmeta.json", headers=auth).status_code == 404
+    assert client.delete("/api/system/profiles/req-1", headers=auth).json()["success"]
+    assert client.get("/api/system/profiles/req-1", headers=auth).status_code == 404
+
+
+def main():
+    test_requested_mode()
+    print("test_requested_mode: OK")
+    test_profiled_requests()
+    print("test_profiled_requests: OK")
+
+
+if __name__ == "__main__":
+    main()
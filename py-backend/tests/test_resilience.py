@@ -0,0 +1,149 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from src.resilience import (  # noqa: E402
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Provider,
+    UpstreamError,
+)
+
+
+def _provider(**kwargs):
+    p = Provider("test", timeout=kwargs.pop("timeout", 1.0), max_attempts=kwargs.pop("max_attempts", 3), **kwargs)
+    p.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.2)
+    p._backoff = lambda attempt: 0.0
+    return p
+
+
+def test_sync_retry_and_breaker():
+    p = _provider()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise UpstreamError("503")
+        return "ok"
+
+    assert p.call(flaky) == "ok" and p.counters["retries"] == 1
+
+    # 不可重试错误直接抛出，不计入熔断
+    def bad_request():
+        raise UpstreamError("400", retryable=False)
+
+    try:
+        p.call(bad_request)
+    except UpstreamError:
+        pass
+    assert p.breaker.state == "closed" and p.breaker.consecutive_failures == 0
+
+    # 连续可重试失败：重试预算耗尽后不再重试，达到阈值后熔断并快速失败
+    def down():
+        raise UpstreamError("502")
+
+    for _ in range(3):
+        try:
+            p.call(down)
+        except CircuitOpenError:
+            break
+        except UpstreamError:
+            pass
+    assert p.breaker.state == "open"
+    started = time.monotonic()
+    try:
+        p.call(down)
+        raise AssertionError("expected CircuitOpenError")
+    except CircuitOpenError:
+        assert time.monotonic() - started < 0.05
+
+    # 到期后放行探测请求，成功则关闭
+    time.sleep(0.25)
+    assert p.call(lambda: "up") == "up" and p.breaker.state == "closed"
+    snap = p.snapshot()
+    assert snap["counters"]["short_circuited"] >= 1 and snap["counters"]["circuit_opened"] == 1
+
+
+def test_async_deadline_and_hedge():
+    async def run():
+        p = _provider(timeout=0.1, max_attempts=1)
+
+        async def stall():
+            await asyncio.sleep(1)
+
+        try:
+            await p.acall(stall)
+            raise AssertionError("expected DeadlineExceeded")
+        except DeadlineExceeded:
+            pass
+        assert p.counters["timeouts"] == 1
+
+        # 首个请求卡住时对冲请求先返回
+        h = _provider(timeout=2.0, max_attempts=1, hedge=True, hedge_min_delay=0.05)
+        attempts = []
+
+        async def slow_then_fast():
+            attempts.append(1)
+            await asyncio.sleep(1.0 if len(attempts) == 1 else 0.01)
+            return len(attempts)
+
+        started = time.monotonic()
+        assert await h.acall(slow_then_fast) == 2
+        assert time.monotonic() - started < 0.5
+        assert h.counters["hedges"] == 1 and h.counters["hedge_wins"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_releases_breaker():
+    async def run():
+        p = _provider(timeout=2.0, max_attempts=1)
+
+        async def down():
+            raise UpstreamError("502")
+
+        async def stall():
+            await asyncio.sleep(1)
+
+        async def ok():
+            return "ok"
+
+        for _ in range(3):
+            try:
+                await p.acall(down)
+            except UpstreamError:
+                pass
+        assert p.breaker.state == "open"
+        await asyncio.sleep(0.25)
+
+        # 半开状态下的探测请求被取消（如客户端断开），不应让熔断一直卡在半开
+        probe = asyncio.ensure_future(p.acall(stall))
+        await asyncio.sleep(0.01)
+        assert p.breaker.state == "half_open"
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        assert await p.acall(ok) == "ok" and p.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def main():
+    test_sync_retry_and_breaker()
+    test_async_deadline_and_hedge()
+    test_cancelled_probe_releases_breaker()
+    print("test_resilience: OK")
+
+
+if __name__ == "__main__":
+    main()
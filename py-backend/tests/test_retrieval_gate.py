@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 检索失败用例使用进程内向量库与临时存储目录，不访问网络
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="retrieval_gate_"))
+os.environ["VECTOR_BACKEND"] = "memory"
+os.environ.setdefault("SILICONFLOW_API_TOKEN", "mock")
+
+from api.weaivateApi import evict_engines, weaviate_search  # noqa: E402
+from src.agents.retrieval_gate import (  # noqa: E402
+    ROUTE_IDENTICAL,
+    ROUTE_LLM,
+    ROUTE_NO_MATCH,
+    gate_candidates,
+    no_match_analysis,
+    text_similarity,
+)
+from src.resilience import CircuitOpenError, UpstreamError  # noqa: E402
+from src.weaviate.memoryEngine import MemoryEngine  # noqa: E402
+
+CLAUSE = "第五条 售电公司应当按照规定向电力交易机构提交履约保函。"
+THRESHOLDS = dict(max_distance=0.5, min_score=0, identical_max_distance=0.05, identical_min_similarity=0.95)
+
+
+def test_search_errors():
+    # 向量化熔断时 compare 使用的 raise_errors=True 必须抛出，而不是返回空结果被判为 no_match
+    original = MemoryEngine._embed_texts
+
+    def _open(self, texts):
+        raise CircuitOpenError("siliconflow", 30)
+
+    def _refused(self, *args, **kwargs):
+        raise ConnectionError("refused")
+
+    MemoryEngine._embed_texts = _open
+    try:
+        assert weaviate_search(CLAUSE, collection_name="unittest_gate", search_type="vector") == []
+        try:
+            weaviate_search(CLAUSE, collection_name="unittest_gate", search_type="vector", raise_errors=True)
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("expected CircuitOpenError")
+
+        # 向量库自身的异常统一包装为 UpstreamError
+        MemoryEngine._embed_texts = original
+        original_search = MemoryEngine.search
+        MemoryEngine.search = _refused
+        try:
+            weaviate_search(CLAUSE, collection_name="unittest_gate", search_type="keyword", raise_errors=True)
+        except UpstreamError as exc:
+            assert isinstance(exc.__cause__, ConnectionError)
+        else:
+            raise AssertionError("expected UpstreamError")
+        finally:
+            MemoryEngine.search = original_search
+    finally:
+        MemoryEngine._embed_texts = original
+        evict_engines("unittest_gate")
+
+
+def main():
+    # 条款编号、空白与标点不影响文本相似度
+    assert text_similarity(CLAUSE, "第十二条  售电公司应当按照规定，向电力交易机构提交履约保函") == 1.0
+    assert text_similarity(CLAUSE, "") == 0.0
+
+    far = [{"text": "无关条款", "_distance": 0.8}, {"text": "无关条款二", "_distance": 0.6}]
+    decision = gate_candidates(CLAUSE, far, **THRESHOLDS)
+    assert decision.route == ROUTE_NO_MATCH and decision.rejected == 2 and decision.best_distance == 0.6
+    assert no_match_analysis(decision)["差异类型"] == "无法比较"
+
+    # 向量距离很小且字面一致 → identical，只保留最相近的候选
+    near = [{"text": "国家条款", "_distance": 0.3}, {"text": "第九条 " + CLAUSE[4:], "_distance": 0.02}]
+    decision = gate_candidates(CLAUSE, near, **THRESHOLDS)
+    assert decision.route == ROUTE_IDENTICAL and decision.candidates == [near[1]]
+
+    # 向量距离很小但文本有实质差异 → 仍交给模型
+    changed = [{"text": "售电公司应当按照规定向电力交易机构提交银行履约保函及信用承诺书。", "_distance": 0.02}]
+    decision = gate_candidates(CLAUSE, changed, **THRESHOLDS)
+    assert decision.route == ROUTE_LLM and decision.similarity < 0.95
+
+    # 阈值关闭 / 没有距离与得分时不做判断；没有检索结果时直接 no_match
+    assert gate_candidates(CLAUSE, far, **{**THRESHOLDS, "max_distance": 0}).route == ROUTE_LLM
+    assert gate_candidates(CLAUSE, [{"text": "x"}], **THRESHOLDS).route == ROUTE_LLM
+    assert gate_candidates(CLAUSE, [], **THRESHOLDS).route == ROUTE_NO_MATCH
+
+    # 关键词检索只有 _score
+    scored = [{"text": "a", "_score": 0.2}, {"text": "b", "_score": 1.5}]
+    decision = gate_candidates(CLAUSE, scored, **{**THRESHOLDS, "min_score": 1.0})
+    assert decision.route == ROUTE_LLM and decision.candidates == [scored[1]]
+
+    # Weaviate 混合检索的真实结果：_distance 为 None，只有融合得分。距离门控无法判断，
+    # 即使文本完全一致也不会判为 identical；这正是 compare 默认改用向量检索的原因
+    hybrid = [
+        {"text": CLAUSE, "_distance": None, "_score": 1.0},
+        {"text": "无关条款", "_distance": None, "_score": 0.05},
+    ]
+    decision = gate_candidates(CLAUSE, hybrid, **THRESHOLDS)
+    assert decision.route == ROUTE_LLM and decision.candidates == hybrid
+    assert decision.best_distance is None and decision.best_score == 1.0 and decision.similarity is None
+    # 只有校准过的 min_score 才能过滤混合检索结果
+    decision = gate_candidates(CLAUSE, hybrid[1:], **{**THRESHOLDS, "min_score": 0.3})
+    assert decision.route == ROUTE_NO_MATCH and decision.best_score == 0.05
+    test_search_errors()
+    print("test_retrieval_gate: OK")
+
+
+if __name__ == "__main__":
+    main()
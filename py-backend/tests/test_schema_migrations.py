@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+# add src to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = BASE_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="schema_migrations_"))
+
+from storage import (  # noqa: E402
+    connect,
+    initialize_schema,
+    get_schema_version,
+    SCHEMA_VERSION,
+    CollectionsRepo,
+    ChunksRepo,
+    DocumentsRepo,
+)
+
+
+# 旧版本（无 user_version、无 article_no、collections.name 非唯一）的建表语句
+LEGACY_SCHEMA = """
+CREATE TABLE collections (
+  id TEXT PRIMARY KEY, name TEXT, description TEXT, provider TEXT, config TEXT,
+  is_active INTEGER DEFAULT 1,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE documents (
+  id TEXT PRIMARY KEY, collection_id TEXT, source_filename TEXT, storage_path TEXT,
+  original_mime TEXT, status TEXT, page_count INTEGER, word_count INTEGER, summary TEXT,
+  keywords TEXT, parsing_payload TEXT, last_error TEXT, version INTEGER DEFAULT 1,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (collection_id) REFERENCES collections(id) ON DELETE CASCADE
+);
+CREATE INDEX idx_documents_collection ON documents(collection_id);
+CREATE TABLE chunks (
+  id TEXT PRIMARY KEY, doc_id TEXT, collection_id TEXT, chunk_index INTEGER, title TEXT,
+  section_path TEXT, content TEXT, token_count INTEGER, metadata TEXT, weaviate_id TEXT,
+  embedding_status TEXT, last_error TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+CREATE INDEX idx_chunks_doc ON chunks(doc_id);
+CREATE INDEX idx_chunks_weaviate ON chunks(weaviate_id);
+CREATE TABLE process_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT, stage TEXT, status TEXT, message TEXT, extra TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (doc_id) REFERENCES documents(id) ON DELETE CASCADE
+);
+INSERT INTO process_logs (doc_id, stage, status) VALUES ('d1', 'parse', 'ok');
+INSERT INTO collections (id, name, created_at) VALUES ('c1', 'dup', '2024-01-01 00:00:00');
+INSERT INTO collections (id, name, created_at) VALUES ('c2', 'dup', '2024-02-01 00:00:00');
+INSERT INTO documents (id, collection_id, source_filename) VALUES ('d1', 'c1', 'a.md');
+INSERT INTO documents (id, collection_id, source_filename) VALUES ('d2', 'c2', 'b.md');
+INSERT INTO chunks (id, doc_id, collection_id, chunk_index, title, content)
+  VALUES ('k1', 'd2', 'c2', 0, '第十二条', '住房公积金贷款额度');
+"""
+
+
+def _indexes(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def check_fresh_db():
+    conn = connect(Path(tempfile.mkdtemp()) / "fresh.sqlite3")
+    initialize_schema(conn)
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    assert {"idx_collections_name", "idx_chunks_doc_status", "idx_documents_status"} <= _indexes(conn)
+    # 重复执行保持幂等
+    initialize_schema(conn)
+    assert get_schema_version(conn) == SCHEMA_VERSION
+
+    repo = CollectionsRepo(conn)
+    first = repo.ensure("policy")
+    assert repo.ensure("policy")["id"] == first["id"]
+    try:
+        repo.create(name="policy")
+    except sqlite3.IntegrityError:
+        pass
+    else:
+        raise AssertionError("collections.name should be unique")
+
+    # 文件名过滤为前缀匹配，走 (collection_id, source_filename, id) 索引
+    d_repo = DocumentsRepo(conn)
+    for name in ("2024年售电办法.pdf", "2024年细则.md", "售电办法2024.pdf"):
+        d_repo.create(first["id"], name, f"docs/{name}")
+    docs, _ = d_repo.list_page(first["id"], filename="2024年", sort="source_filename", order="asc")
+    assert [d["source_filename"] for d in docs] == ["2024年售电办法.pdf", "2024年细则.md"]
+    assert d_repo.count(first["id"], filename="售电") == 1
+    where, params = d_repo._filters(first["id"], None, "2024年")
+    plan = " ".join(str(r[3]) for r in conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT id FROM documents WHERE {' AND '.join(where)}", params
+    ))
+    assert "idx_documents_collection_filename" in plan and "source_filename>?" in plan, plan
+    conn.close()
+    print("fresh db ok")
+
+
+def check_legacy_upgrade():
+    db_path = Path(tempfile.mkdtemp()) / "legacy.sqlite3"
+    raw = sqlite3.connect(str(db_path))
+    raw.executescript(LEGACY_SCHEMA)
+    raw.close()
+
+    conn = connect(db_path)
+    initialize_schema(conn)
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    # 重名集合合并到最早创建的一条，子记录随之迁移
+    rows = conn.execute("SELECT id FROM collections WHERE name = 'dup'").fetchall()
+    assert [r[0] for r in rows] == ["c1"]
+    assert conn.execute("SELECT COUNT(*) FROM documents WHERE collection_id = 'c1'").fetchone()[0] == 2
+    chunk = ChunksRepo(conn).get("k1")
+    assert chunk["collection_id"] == "c1" and chunk["article_no"] == 12
+    # process_logs 重建为无外键的表，旧记录保留
+    assert conn.execute("PRAGMA foreign_key_list(process_logs)").fetchall() == []
+    assert [tuple(r) for r in conn.execute("SELECT doc_id, stage, duration_ms FROM process_logs")] == [("d1", "parse", None)]
+    assert "idx_process_logs_doc_created" in _indexes(conn)
+    # 全文索引已回填
+    hits = ChunksRepo(conn).search_fulltext("公积金", collection_id="c1")
+    assert [h["metadata"]["chunk_id"] for h in hits] == ["k1"]
+    assert "idx_chunks_doc" not in _indexes(conn)
+    conn.close()
+    print("legacy upgrade ok")
+
+
+def main():
+    check_fresh_db()
+    check_legacy_upgrade()
+    print("test_schema_migrations: OK")
+
+
+if __name__ == "__main__":
+    main()
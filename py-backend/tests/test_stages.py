@@ -0,0 +1,121 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="stages_"))
+
+from src import metrics  # noqa: E402
+from src.stages import StageRecorder, activate, recording, stage, summarize  # noqa: E402
+from src.storage import (  # noqa: E402
+    CollectionsRepo,
+    DocumentsRepo,
+    ProcessLogsRepo,
+    init_storage_and_db,
+    pooled_connection,
+)
+
+
+def test_nested_stages_and_errors():
+    recorder = StageRecorder()
+    with activate(recorder):
+        with stage("segment", input_size=100) as outer:
+            with stage("normalize", input_size=100) as inner:
+                inner.output_size = 90
+            outer.output_size = 3
+        try:
+            with stage("parse"):
+                raise RuntimeError("upstream down")
+        except RuntimeError:
+            pass
+    rows = {r["stage"]: r for r in recorder.records}
+    assert rows["normalize"]["extra"]["parent"] == "segment"
+    assert "parent" not in rows["segment"]["extra"]
+    assert rows["segment"]["output_size"] == 3
+    assert rows["parse"]["status"] == "error" and "upstream down" in rows["parse"]["message"]
+    assert len({r["extra"]["run_id"] for r in recorder.records}) == 1
+
+    # 没有活动记录器时只计时，不报错
+    with stage("retrieve") as st:
+        pass
+    assert st.duration_ms is not None
+    print("test_nested_stages_and_errors: OK")
+
+
+def test_flush_and_summary():
+    init_storage_and_db()
+    with recording() as rec:
+        for i in range(10):
+            with stage("embed_batch", input_size=8) as st:
+                st.output_size = 8
+        # 嵌套的 recording 复用外层记录器
+        with recording() as inner:
+            assert inner is rec
+    assert rec.records == []
+    with pooled_connection() as conn:
+        repo = ProcessLogsRepo(conn)
+        durations = repo.durations(stage="embed_batch")
+        assert len(durations) == 10
+        assert repo.slowest(stage="embed_batch", limit=3)[0]["input_size"] == 8
+
+    summary = summarize([("llm_analyze", "ok", float(ms)) for ms in range(1, 101)] + [("llm_analyze", "error", 500.0)])
+    s = summary["llm_analyze"]
+    assert s["count"] == 101 and s["errors"] == 1
+    assert s["p50_ms"] == 51.0 and s["max_ms"] == 500.0
+    print("test_flush_and_summary: OK")
+
+
+def test_retention_and_dropped_rows():
+    init_storage_and_db()
+    with pooled_connection() as conn:
+        collection_id = CollectionsRepo(conn).create("unittest_stages")
+        doc_id = DocumentsRepo(conn).create(collection_id, "stages.md", "stages.md")
+
+    # 耗时记录不随文档删除；文档先被删除时写入也不会因外键失败
+    with recording(doc_id):
+        with stage("parse", input_size=1):
+            pass
+    with pooled_connection() as conn:
+        assert DocumentsRepo(conn).delete(doc_id)
+    late = StageRecorder(doc_id)
+    with activate(late), stage("persist"):
+        pass
+    assert late.flush() == 1
+    with pooled_connection() as conn:
+        assert {s for s, _, _ in ProcessLogsRepo(conn).durations(doc_id=doc_id)} == {"parse", "persist"}
+
+    # 写库失败计入 stage_log_rows_dropped_total
+    before = metrics.STAGE_LOG_DROPPED.value()
+    original = ProcessLogsRepo.bulk_create
+
+    def _locked(self, records):
+        raise RuntimeError("database is locked")
+
+    ProcessLogsRepo.bulk_create = _locked
+    try:
+        failing = StageRecorder(doc_id)
+        with activate(failing):
+            for _ in range(3):
+                with stage("embed_batch"):
+                    pass
+        assert failing.flush() == 0
+    finally:
+        ProcessLogsRepo.bulk_create = original
+    assert metrics.STAGE_LOG_DROPPED.value() == before + 3
+    print("test_retention_and_dropped_rows: OK")
+
+
+def main():
+    test_nested_stages_and_errors()
+    test_flush_and_summary()
+    test_retention_and_dropped_rows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 使用临时存储目录，避免污染本地 storage/
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="tracing_"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src import tracing  # noqa: E402
+from src.concurrency import run_blocking  # noqa: E402
+from src.stages import stage  # noqa: E402
+from src.storage import init_storage_and_db, pooled_connection  # noqa: E402
+
+
+def _query() -> int:
+    with stage("load", input_size=1) as st, pooled_connection() as conn:
+        st.output_size = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    return st.output_size
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    async def item(item_id: str):
+        async def _branch(delay: float):
+            with tracing.span("branch", delay=delay):
+                await asyncio.sleep(delay)
+
+        await asyncio.gather(_branch(0.01), _branch(0.05))
+        return {"count": await run_blocking(_query)}
+
+    @app.get("/api/propagation")
+    async def propagation():
+        # 只向内部主机透传 traceparent，第三方 API 不应收到内部 trace / span id
+        return {
+            "mock": tracing.traceparent_for("http://127.0.0.1:18900/v1/embeddings"),
+            "siliconflow": tracing.traceparent_for("https://api.siliconflow.cn/v1/embeddings"),
+        }
+
+    app.add_middleware(tracing.TracingMiddleware)
+    return TestClient(app)
+
+
+def test_no_active_trace_is_noop():
+    with tracing.span("orphan") as sp:
+        sp.set("k", 1)
+    assert tracing.traceparent() is None
+
+
+def test_request_trace():
+    init_storage_and_db()
+    tracing.instrument_storage()
+    tracing.clear()
+    client = _client()
+    parent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    resp = client.get("/api/items/1", headers={"traceparent": parent})
+    assert resp.headers["x-trace-id"] == "a" * 32
+
+    record = tracing.get_trace("a" * 32)
+    assert record["name"] == "GET /api/items/{item_id}" and record["status"] == "ok"
+    by_name = {}
+    for s in record["spans"]:
+        by_name.setdefault(s["name"], []).append(s)
+    root = by_name["GET /api/items/{item_id}"][0]
+    assert root["parent_id"] == "b" * 16
+    # 线程池中的阶段与 SQL 语句挂在同一条 trace 上
+    load = by_name["load"][0]
+    assert load["parent_id"] == root["span_id"] and load["attrs"]["output_size"] == 0
+    assert any(s["parent_id"] == load["span_id"] for s in by_name["sqlite"])
+
+    # 关键路径经过较慢的分支与其后的 load
+    path = [s["name"] for s in tracing.critical_path(record)]
+    slow = max(by_name["branch"], key=lambda s: s["duration_ms"])
+    assert slow["span_id"] in {s["span_id"] for s in tracing.critical_path(record)}
+    assert path[0] == root["name"] and "load" in path
+    assert "*" in tracing.render_text(record)
+    assert tracing.recent(10)[0]["trace_id"] == "a" * 32
+
+    headers = client.get("/api/propagation", headers={"traceparent": parent}).json()
+    assert headers["mock"].startswith("00-" + "a" * 32) and headers["siliconflow"] is None
+
+
+def main():
+    test_no_active_trace_is_noop()
+    print("test_no_active_trace_is_noop: OK")
+    test_request_trace()
+    print("test_request_trace: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# add backend root to path
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+# 使用临时存储目录与进程内向量库，不访问网络
+os.environ.setdefault("STORAGE_ROOT", tempfile.mkdtemp(prefix="warmup_"))
+os.environ["VECTOR_BACKEND"] = "memory"
+os.environ.setdefault("SILICONFLOW_API_TOKEN", "mock")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app as app_module  # noqa: E402
+from api.weaivateApi import _init_engine, evict_engines, release_engine  # noqa: E402
+from src import warmup  # noqa: E402
+
+
+def test_engine_cache():
+    engine = _init_engine("warmup_cache")
+    release_engine(engine)
+    assert _init_engine("warmup_cache") is engine
+    assert evict_engines("warmup_cache") == 1
+    assert _init_engine("warmup_cache") is not engine
+    evict_engines("warmup_cache")
+
+
+def test_ready_after_warmup():
+    with TestClient(app_module.app) as client:
+        assert client.get("/health/live").status_code == 200
+        deadline = time.monotonic() + 30
+        resp = client.get("/health/ready")
+        while resp.status_code != 200 and time.monotonic() < deadline:
+            assert resp.json()["status"] in {warmup.PENDING, warmup.DEGRADED}
+            time.sleep(0.05)
+            resp = client.get("/health/ready")
+        body = resp.json()
+        assert resp.status_code == 200 and body["status"] == warmup.READY
+        assert body["required"] == ["sqlite"]
+        assert all(body["checks"][name]["ok"] for name in warmup.REQUIRED_CHECKS)
+        assert body["checks"]["sqlite"]["connections"] >= 1
+        # 尽力项在就绪之后继续完成
+        while "vector" not in body["checks"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+            body = client.get("/health/ready").json()
+        assert body["checks"]["vector"]["collections"] == warmup.warmup_collections()
+    # 退出后不再就绪
+    assert not warmup.is_ready() and warmup.snapshot()["status"] == warmup.STOPPING
+
+
+def test_best_effort_checks_do_not_block_ready():
+    original_vector, original_modules = warmup.check_vector, warmup.check_modules
+
+    def _down():
+        raise RuntimeError("weaviate unavailable")
+
+    warmup.check_vector, warmup.check_modules = _down, _down
+    try:
+        state = asyncio.run(warmup.run_startup())
+    finally:
+        warmup.check_vector, warmup.check_modules = original_vector, original_modules
+    assert state["status"] == warmup.READY and state["attempts"] == 1
+    assert not state["checks"]["vector"]["ok"] and not state["checks"]["modules"]["ok"]
+
+
+def test_required_check_retried():
+    calls = []
+    original = warmup.check_vector
+
+    def _flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("weaviate unavailable")
+        return original()
+
+    # WARMUP_REQUIRE_VECTOR=true：向量库成为必需项，失败后重试
+    warmup.check_vector = _flaky
+    warmup.REQUIRED_CHECKS = ("sqlite", "vector")
+    warmup.WARMUP_RETRY_SECONDS = 0
+    try:
+        state = asyncio.run(warmup.run_startup())
+    finally:
+        warmup.check_vector = original
+        warmup.REQUIRED_CHECKS = ("sqlite",)
+    assert state["status"] == warmup.READY and state["attempts"] == 2 and len(calls) == 2
+    assert state["checks"]["vector"]["ok"] and state["required"] == ["sqlite", "vector"]
+
+
+def main():
+    test_engine_cache()
+    print("test_engine_cache: OK")
+    test_ready_after_warmup()
+    print("test_ready_after_warmup: OK")
+    test_best_effort_checks_do_not_block_ready()
+    print("test_best_effort_checks_do_not_block_ready: OK")
+    test_required_check_retried()
+    print("test_required_check_retried: OK")
+
+
+if __name__ == "__main__":
+    main()